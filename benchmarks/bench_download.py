@@ -0,0 +1,75 @@
+"""
+Measure the throughput of `pipdownload.utils.download` against a local http server.
+
+    $ python -m benchmarks.bench_download --size 256 --repeat 3
+
+The legacy loop (1 KiB chunks and a progress line rendered for every chunk) is measured as the baseline.
+"""
+import argparse
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+
+import click
+import requests
+from pipdownload.utils import download
+
+from benchmarks.timing import best_of
+from tests.server import serve_directory
+
+
+def legacy_download(url, dest_dir):
+    file_url = url.split("#")[0]
+    response = requests.get(file_url, stream=True)
+    content_size = int(response.headers["content-length"])
+    size = 0
+    with open(os.path.join(dest_dir, os.path.basename(file_url)), "wb") as file:
+        for data in response.iter_content(chunk_size=1024):
+            file.write(data)
+            size += len(data)
+            click.echo(
+                "\r"
+                + "[Processing]:%s%.2f%%"
+                % (">" * int(size * 50 / content_size), float(size / content_size * 100)),
+                nl=False,
+            )
+
+
+def measure(function, url, size, repeat):
+    with tempfile.TemporaryDirectory() as dest_dir:
+
+        def clean():
+            for name in os.listdir(dest_dir):
+                os.remove(os.path.join(dest_dir, name))
+
+        def run():
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                function(url, dest_dir)
+
+        return size / 1024 / 1024 / best_of(run, repeat, setup=clean)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=256, help="The size of the file in MiB.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of runs, the best one is reported.")
+    args = parser.parse_args()
+    logging.getLogger("pipdownload").setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as directory:
+        content = os.urandom(args.size * 1024 * 1024)
+        with open(os.path.join(directory, "demo-1.0.tar.gz"), "wb") as f:
+            f.write(content)
+        size = len(content)
+        sha256 = hashlib.sha256(content).hexdigest()
+        del content
+        with serve_directory(directory) as base_url:
+            url = "%s/demo-1.0.tar.gz#sha256=%s" % (base_url, sha256)
+            for name, function in (("legacy", legacy_download), ("download", download)):
+                print("%-10s %8.1f MiB/s" % (name, measure(function, url, size, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Measure `resolve_package_file` on a corpus of file names.
+
+    $ python -m benchmarks.bench_filenames --corpus 100000
+
+The regex chain used before the cached parser is measured as the baseline. The cached parser is measured
+cold, with its cache cleared before every run, and warm, as every name is looked up again.
+"""
+import argparse
+import re
+
+from pipdownload.utils import PythonPackage
+from pipdownload.utils import resolve_package_file
+
+from benchmarks.index import project_files
+from benchmarks.timing import best_of
+
+
+def legacy_resolve_package_file(name: str) -> PythonPackage:
+    result = None
+    if name.endswith(".tar.gz"):
+        result = re.search(r"(?<=-)[^-]+?(?=\.tar\.gz)", name)
+
+    if name.endswith(".tar.bz2"):
+        result = re.search(r"(?<=-)[^-]+?(?=\.tar\.bz2)", name)
+
+    if name.endswith(".zip"):
+        result = re.search(r"(?<=-)[^-]+?(?=\.zip)", name)
+
+    if name.endswith(".whl"):
+
+        result = re.search(r"(?<=-)[^-]+?(?=-p|-c)", name)
+    if result is not None:
+        return PythonPackage(name[: result.start() - 1], result.group(0))
+    else:
+        return PythonPackage(None, None)
+
+
+def make_corpus(size: int) -> list:
+    corpus = []
+    i = 0
+    while len(corpus) < size:
+        corpus.extend(project_files("project_%d" % (i % 1000), "%d.%d.%d" % (i // 1000, i % 100, i % 7), 5))
+        i += 1
+    return corpus[:size]
+
+
+def measure(function, corpus, repeat, setup=None):
+    def run():
+        for filename in corpus:
+            function(filename)
+
+    return best_of(run, repeat, setup=setup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", type=int, default=100000, help="The number of file names.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of runs, the best one is reported.")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.corpus)
+    mismatches = sum(
+        legacy_resolve_package_file(filename) != resolve_package_file(filename) for filename in corpus
+    )
+    legacy = measure(legacy_resolve_package_file, corpus, args.repeat)
+    cold = measure(resolve_package_file, corpus, args.repeat, setup=resolve_package_file.cache_clear)
+    warm = measure(resolve_package_file, corpus, args.repeat)
+    print("%-8s %8.3f s" % ("legacy", legacy))
+    print("%-8s %8.3f s  %5.1fx" % ("cold", cold, legacy / cold))
+    print("%-8s %8.3f s  %5.1fx" % ("warm", warm, legacy / warm))
+    print("%d of %d names are resolved differently from the legacy parser." % (mismatches, len(corpus)))
+
+
+if __name__ == "__main__":
+    main()
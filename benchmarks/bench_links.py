@@ -0,0 +1,66 @@
+"""
+Measure the extraction of file links from a synthetic simple index page.
+
+    $ python -m benchmarks.bench_links --links 50000
+
+The regex scan of the original get_file_links is measured as the baseline.
+"""
+import argparse
+import re
+
+from pipdownload.index import parse_links
+from pipdownload.utils import PythonPackage
+from pipdownload.utils import get_file_links
+from pipdownload.utils import make_absolute
+from pipdownload.utils import resolve_package_file
+
+from benchmarks.timing import best_of
+
+
+def make_page(num_links: int) -> str:
+    anchors = []
+    for i in range(num_links):
+        version = "1.%d.%d" % (i // 20, i % 20)
+        for filename in ("demo-%s-py3-none-any.whl" % version, "demo-%s.tar.gz" % version):
+            anchors.append(
+                '<a href="../../packages/ab/cd/%s#sha256=%064x" data-requires-python="&gt;=3.7">%s</a><br/>'
+                % (filename, i, filename)
+            )
+            if len(anchors) == num_links:
+                break
+        if len(anchors) == num_links:
+            break
+    return "<!DOCTYPE html><html><body>\n%s\n</body></html>" % "\n".join(anchors)
+
+
+def legacy_get_file_links(html_doc, base_url, python_package_local):
+    version = re.escape(python_package_local.version)
+    links = set()
+    for link in re.finditer(rf'<a.*?href="(.+?)".*?>(.+{version}.+?)</a>', html_doc):
+        link_href, link_text = link.groups()
+        if python_package_local == resolve_package_file(link_text) and link_href.strip():
+            links.add(make_absolute(link_href.strip(), base_url))
+    return links
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--links", type=int, default=50000, help="The number of links on the page.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of runs, the best one is reported.")
+    args = parser.parse_args()
+
+    page = make_page(args.links)
+    base_url = "https://example.com/simple/demo/"
+    python_package = PythonPackage("demo", "1.%d.7" % (args.links // 80))
+    cases = (
+        ("legacy regex", lambda: legacy_get_file_links(page, base_url, python_package)),
+        ("get_file_links", lambda: get_file_links(page, base_url, python_package)),
+        ("parse_links", lambda: parse_links(page, base_url)),
+    )
+    for name, function in cases:
+        elapsed = best_of(function, args.repeat)
+        print("%-16s %8.3f s  %d links" % (name, elapsed, len(function())))
+
+
+if __name__ == "__main__":
+    main()
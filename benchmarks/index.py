@@ -0,0 +1,82 @@
+"""
+Build a synthetic simple index for the benchmarks.
+
+The index has one root project `bench-root` which depends on `bench-0` ... `bench-<n-1>`. Every project has
+`versions` versions, and every version has a pure python wheel, platform wheels and a source package. The
+content of the files is generated from a seed, so the same arguments always build the same index.
+"""
+import random
+from typing import List
+
+from tests import server
+from tests.server import metadata
+
+# The platform wheels of every version, besides the pure python wheel and the source package.
+PLATFORM_TAGS = (
+    "cp311-cp311-manylinux_2_17_x86_64.manylinux2014_x86_64",
+    "cp311-cp311-win_amd64",
+    "cp311-cp311-macosx_11_0_arm64",
+)
+
+
+def project_files(name: str, version: str, files_per_version: int) -> List[str]:
+    """Return the names of the files of a version, the pure python wheel first and the source package last."""
+    normalized = name.replace("-", "_")
+    filenames = ["%s-%s-py3-none-any.whl" % (normalized, version)]
+    for tag in PLATFORM_TAGS[: max(files_per_version - 2, 0)]:
+        filenames.append("%s-%s-%s.whl" % (normalized, version, tag))
+    if files_per_version >= 2:
+        filenames.append("%s-%s.tar.gz" % (normalized, version))
+    return filenames
+
+
+def write_project(directory: str, name: str, versions: dict, rng: random.Random) -> int:
+    """
+    Write the files, the metadata and the HTML and JSON pages of a project, see `tests.server.write_project`.
+    :param versions: A dict of versions pointing to a tuple of (file names, requires_dist, file size).
+    :return: The number of bytes of the files written.
+    """
+    files = []
+    for version, (filenames, requires_dist, file_size) in versions.items():
+        core_metadata = metadata(name, version, *requires_dist)
+        for filename in filenames:
+            files.append({
+                "filename": filename,
+                "content": rng.getrandbits(8 * file_size).to_bytes(file_size, "little"),
+                "requires_python": ">=3.7",
+                "metadata": core_metadata if filename.endswith(".whl") else None,
+            })
+    server.write_project(directory, name, files, json_page=True)
+    return sum(len(file["content"]) for file in files)
+
+
+def build_index(directory: str, projects: int, versions: int, files_per_version: int, file_size: int,
+                seed: int = 0) -> List[str]:
+    """
+    Build the synthetic index in directory, the index url is `<base_url>/simple`.
+    :param projects: The number of dependencies of the root project.
+    :param versions: The number of versions of every project.
+    :param files_per_version: The number of files of every version, between 1 and 5.
+    :param file_size: The size of every file of the newest versions in bytes. The files of the older versions,
+        which are never downloaded, take 1 KiB.
+    :return: The file names of the newest version of every project, which are the files pip-download selects
+        for `bench-root` without any filter.
+    """
+    rng = random.Random(seed)
+    version_names = ["1.%d.0" % i for i in range(versions)]
+    sizes = [1024] * (versions - 1) + [file_size]
+    newest = []
+    dependencies = []
+    for i in range(projects + 1):
+        if i < projects:
+            name, count, requires_dist = "bench-%d" % i, files_per_version, []
+            dependencies.append(name)
+        else:
+            name, count, requires_dist = "bench-root", 1, dependencies
+        project_versions = {
+            version: (project_files(name, version, count), requires_dist, size)
+            for version, size in zip(version_names, sizes)
+        }
+        write_project(directory, name, project_versions, rng)
+        newest.extend(project_versions[version_names[-1]][0])
+    return newest
@@ -0,0 +1,230 @@
+"""
+Run the offline benchmark suite and save the results.
+
+    $ python -m benchmarks.suite
+    $ python -m benchmarks.suite --compare benchmarks/results/<previous>.json
+
+A synthetic simple index (see `benchmarks.index`) is served on localhost, with and without the JSON pages,
+and whole `pip-download` runs are measured in subprocesses with empty config and cache directories: cold into
+an empty destination directory, warm into a complete one, both resolving the packages again, and warm with the
+resolution of the previous run reused.
+The startup of `pip-download --help` is measured in subprocesses too.
+Micro-benchmarks measure get_file_links, resolve_package_file, Hashes.check_against_chunks, JSON page parsing
+and download. Every case runs `--repeat` times and the best time is kept. The results are saved as JSON in
+`--output`, named after the time and the commit, so that runs of different commits can be compared.
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from pipdownload.index import iter_json_links
+from pipdownload.utils import Hashes
+from pipdownload.utils import PythonPackage
+from pipdownload.utils import download
+from pipdownload.utils import get_file_links
+from pipdownload.utils import resolve_package_file
+
+from benchmarks.bench_links import make_page
+from benchmarks.index import build_index
+from benchmarks.index import project_files
+from benchmarks.timing import best_of
+from tests.server import serve_directory
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def run_pipdownload(args, home: str) -> None:
+    env = dict(os.environ, XDG_DATA_HOME=os.path.join(home, "data"), XDG_CACHE_HOME=os.path.join(home, "cache"))
+    subprocess.run(
+        [sys.executable, "-m", "pipdownload", "-q", "--no-index-cache"] + args,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def end_to_end(args, results: OrderedDict) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        expected = build_index(directory, args.projects, args.versions, args.files_per_version, args.file_size * 1024)
+        size = args.file_size * 1024 * len(expected)
+        for json_api in (True, False):
+            variant = "json" if json_api else "html"
+            with serve_directory(directory, json_api=json_api) as base_url, tempfile.TemporaryDirectory() as work:
+                dest_dir = os.path.join(work, "dest")
+                command = ["bench-root", "-i", base_url + "/simple", "-d", dest_dir, "-j", str(args.jobs)]
+                # Every repeat resolves the packages again, or all but the first one would reuse its resolution.
+                resolve_command = command + ["--refresh-resolution"]
+
+                def clean():
+                    shutil.rmtree(dest_dir, ignore_errors=True)
+
+                cold = best_of(lambda: run_pipdownload(resolve_command, work), args.repeat, setup=clean)
+                missing = set(expected) - set(os.listdir(dest_dir))
+                if missing:
+                    raise RuntimeError("The files %s are not downloaded." % sorted(missing))
+                results["e2e.%s.cold" % variant] = {"seconds": cold, "bytes": size}
+                warm = best_of(lambda: run_pipdownload(resolve_command, work), args.repeat)
+                results["e2e.%s.warm" % variant] = {"seconds": warm, "bytes": size}
+                warm_resolution = best_of(lambda: run_pipdownload(command, work), args.repeat)
+                results["e2e.%s.warm_resolution" % variant] = {"seconds": warm_resolution, "bytes": size}
+                if json_api:
+                    run_pipdownload(resolve_command + ["--incremental"], work)
+                    incremental = best_of(
+                        lambda: run_pipdownload(resolve_command + ["--incremental"], work), args.repeat
+                    )
+                    results["e2e.json.incremental"] = {"seconds": incremental, "bytes": size}
+
+
+def startup(args, results: OrderedDict) -> None:
+    for name, command in (("startup.help", ["--help"]), ("startup.verify_help", ["verify", "--help"])):
+        results[name] = {
+            "seconds": best_of(
+                lambda: subprocess.run(
+                    [sys.executable, "-m", "pipdownload"] + command, check=True, stdout=subprocess.DEVNULL
+                ),
+                args.repeat,
+            )
+        }
+
+
+def micro(args, results: OrderedDict) -> None:
+    page = make_page(args.links)
+    python_package = PythonPackage("demo", "1.%d.7" % (args.links // 80))
+    base_url = "https://example.com/simple/demo/"
+    results["get_file_links"] = {
+        "seconds": best_of(lambda: get_file_links(page, base_url, python_package), args.repeat),
+        "items": args.links,
+    }
+
+    corpus = [
+        filename
+        for i in range(args.corpus // 5 + 1)
+        for filename in project_files("bench-%d" % (i % 100), "1.%d.0" % i, 5)
+    ][: args.corpus]
+    results["resolve_package_file"] = {
+        "seconds": best_of(lambda: [resolve_package_file(filename) for filename in corpus], args.repeat),
+        "items": len(corpus),
+    }
+
+    json_files = [
+        {"filename": filename, "url": "../../packages/%s" % filename, "hashes": {"sha256": "0" * 64},
+         "requires-python": ">=3.7", "core-metadata": {"sha256": "0" * 64}}
+        for filename in corpus[: args.links]
+    ]
+    json_page = json.dumps({"meta": {"api-version": "1.1"}, "name": "demo", "files": json_files})
+    results["iter_json_links"] = {
+        "seconds": best_of(lambda: list(iter_json_links(json_page, base_url)), args.repeat),
+        "items": len(json_files),
+    }
+
+    chunk = os.urandom(1024 * 1024)
+    chunks = [chunk] * args.hash_size
+    hashes = Hashes({"sha256": [hashlib.sha256(chunk * args.hash_size).hexdigest()]})
+    results["check_against_chunks"] = {
+        "seconds": best_of(lambda: hashes.check_against_chunks(chunks), args.repeat),
+        "bytes": len(chunk) * args.hash_size,
+    }
+
+    with tempfile.TemporaryDirectory() as directory:
+        content = os.urandom(args.download_size * 1024 * 1024)
+        with open(os.path.join(directory, "demo-1.0.tar.gz"), "wb") as f:
+            f.write(content)
+        sha256 = hashlib.sha256(content).hexdigest()
+        with serve_directory(directory) as base_url, tempfile.TemporaryDirectory() as dest_dir:
+            url = "%s/demo-1.0.tar.gz#sha256=%s" % (base_url, sha256)
+            path = os.path.join(dest_dir, "demo-1.0.tar.gz")
+
+            def clean():
+                if os.path.exists(path):
+                    os.unlink(path)
+
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                elapsed = best_of(lambda: download(url, dest_dir, quiet=True), args.repeat, setup=clean)
+        results["download"] = {"seconds": elapsed, "bytes": len(content)}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def describe(result: dict) -> str:
+    text = "%10.4f s" % result["seconds"]
+    if result.get("bytes"):
+        text += "  %10.1f MiB/s" % (result["bytes"] / 1024 / 1024 / result["seconds"])
+    elif result.get("items"):
+        text += "  %10.0f items/s" % (result["items"] / result["seconds"])
+    return text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--projects", type=int, default=20, help="The number of dependencies of the root project.")
+    parser.add_argument("--versions", type=int, default=50, help="The number of versions of every project.")
+    parser.add_argument("--files-per-version", type=int, default=5, help="The number of files of every version.")
+    parser.add_argument("--file-size", type=int, default=256, help="The size of the downloaded files in KiB.")
+    parser.add_argument("--jobs", type=int, default=4, help="The number of concurrent downloads of a run.")
+    parser.add_argument("--links", type=int, default=50000, help="The number of links of the parsed pages.")
+    parser.add_argument("--corpus", type=int, default=100000, help="The number of parsed file names.")
+    parser.add_argument("--hash-size", type=int, default=256, help="The size of the hashed data in MiB.")
+    parser.add_argument("--download-size", type=int, default=64, help="The size of the downloaded file in MiB.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of runs, the best one is reported.")
+    parser.add_argument("--skip-e2e", action="store_true", help="Run the micro-benchmarks only.")
+    parser.add_argument("--output", default=RESULTS_DIR, help="The directory the results are saved in.")
+    parser.add_argument("--compare", help="A results file of a previous run to compare with.")
+    args = parser.parse_args()
+    logging.getLogger("pipdownload").setLevel(logging.WARNING)
+
+    results = OrderedDict()
+    if not args.skip_e2e:
+        end_to_end(args, results)
+    startup(args, results)
+    micro(args, results)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf8") as f:
+            previous = json.load(f)["results"]
+    for name, result in results.items():
+        line = "%-24s %s" % (name, describe(result))
+        if name in previous:
+            line += "  %6.2fx vs %s" % (previous[name]["seconds"] / result["seconds"], args.compare)
+        print(line)
+
+    commit = git_commit()
+    os.makedirs(args.output, exist_ok=True)
+    path = os.path.join(args.output, "%s-%s.json" % (time.strftime("%Y%m%d-%H%M%S"), commit))
+    with open(path, "w", encoding="utf8") as f:
+        json.dump(
+            {
+                "meta": {
+                    "commit": commit,
+                    "time": time.time(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                },
+                "results": results,
+            },
+            f,
+            indent=2,
+        )
+    print("The results have been saved to %s." % path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+import time
+
+
+def best_of(function, repeat: int, setup=None) -> float:
+    """Return the best time of function in seconds, setup is called before every run and is not timed."""
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
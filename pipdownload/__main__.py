@@ -1,5 +1,5 @@
 import sys
 
-from pipdownload.cli import pipdownload
+from pipdownload.cli import main
 
-sys.exit(pipdownload())
+sys.exit(main())
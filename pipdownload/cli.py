@@ -3,36 +3,223 @@ import json
 import logging
 import os
 import sys
+import time
 import warnings
 from collections import OrderedDict
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING
+from typing import Optional
+from typing import Tuple
 
 import click
-import pip_api
-import requests
-from cachecontrol import CacheControl
 # from pipdownload.settings import SETTINGS_FILE
 from pipdownload import logger
 from pipdownload import settings
-from pipdownload.utils import TempDirectory
-from pipdownload.utils import download as normal_download
-from pipdownload.utils import download_package
-from pipdownload.utils import get_file_links
-from pipdownload.utils import mkurl_pypi_url
-from pipdownload.utils import quiet_download
-from pipdownload.utils import resolve_package_file
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.exceptions import MetadataResolutionError
+from pipdownload.mirror import MirrorIndex
+from pipdownload.ratelimit import TokenBucket
+from pipdownload.ratelimit import parse_rate
+from pipdownload.stats import stats
+from pipdownload.store import ArtifactStore
+from pipdownload.verify import recorded_files
+from pipdownload.verify import verify_files
 
-sess = requests.Session()
-session = CacheControl(sess)
+if TYPE_CHECKING:
+    from pipdownload.index import IndexCache
+    from pipdownload.resolutions import ResolutionCache
 
 
-@click.command()
+class DefaultCommandGroup(click.Group):
+    """A group which invokes its default command when the first argument is not a command name, so that
+    `pip-download flask` keeps working next to `pip-download gc`."""
+
+    def __init__(self, *args, default_command=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.default_command = default_command
+
+    def parse_args(self, ctx, args):
+        if not args or args[0] not in self.commands:
+            args.insert(0, self.default_command)
+        return super().parse_args(ctx, args)
+
+
+@click.group(cls=DefaultCommandGroup, default_command="download")
+def main():
+    pass
+
+
+def load_settings() -> dict:
+    """Load the config file, an empty dict is returned if it does not exist."""
+    if not Path(settings.SETTINGS_FILE).exists():
+        return {}
+    with open(settings.SETTINGS_FILE, "r") as f:
+        try:
+            return json.loads(f.read(), object_pairs_hook=OrderedDict)
+        except json.decoder.JSONDecodeError:
+            logger.error(
+                f"The config file {settings.SETTINGS_FILE} is not correct, it should be a json object."
+            )
+            sys.exit(-2)
+
+
+def load_index_cache(settings_dict: dict) -> "IndexCache":
+    """Create the index cache configured in the config file."""
+    # The modules built on packaging are imported only by the commands using them, like requests.
+    from pipdownload.index import IndexCache
+
+    return IndexCache(
+        settings_dict.get("index-cache-dir", settings.INDEX_CACHE_DIR),
+        int(settings_dict.get("index-cache-size", settings.INDEX_CACHE_SIZE) * 1024 * 1024),
+        settings_dict.get("index-cache-ttl", settings.INDEX_CACHE_TTL),
+    )
+
+
+def load_resolution_cache(settings_dict: dict) -> Optional["ResolutionCache"]:
+    """Create the resolution cache configured in the config file, None if it is disabled."""
+    from pipdownload.resolutions import ResolutionCache
+
+    ttl = settings_dict.get("resolution-cache-ttl", settings.RESOLUTION_CACHE_TTL)
+    if ttl <= 0:
+        return None
+    return ResolutionCache(settings_dict.get("resolution-cache-dir", settings.RESOLUTION_CACHE_DIR), ttl)
+
+
+def parse_rate_option(ctx, param, value: Optional[str]) -> Optional[float]:
+    """Parse the value of '--limit-rate'."""
+    if value is None:
+        return None
+    try:
+        return parse_rate(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def load_rate_limits(
+    settings_dict: dict, limit_rate: Optional[float], max_request_rate: Optional[float]
+) -> Tuple[Optional[TokenBucket], Optional[float]]:
+    """
+    Apply the rate limits of the config file to the ones of the options which are not specified.
+    :return: The `TokenBucket` of the downloads, or None if the bandwidth is not limited, and the maximum number
+        of requests per second sent to one host.
+    """
+    if limit_rate is None and settings_dict.get("limit-rate"):
+        try:
+            limit_rate = parse_rate(str(settings_dict["limit-rate"]))
+        except ValueError as e:
+            logger.error("The 'limit-rate' in the config file is not correct: %s" % e)
+            sys.exit(-2)
+    if max_request_rate is None:
+        max_request_rate = settings_dict.get("max-request-rate")
+    return (TokenBucket(limit_rate) if limit_rate else None), max_request_rate
+
+
+def report_stats(show_stats: bool, stats_json: str = None, trace: str = None) -> None:
+    if show_stats:
+        for line in stats.summary():
+            click.echo(line)
+    if stats_json:
+        stats.write_json(stats_json)
+    if trace:
+        stats.write_trace(trace)
+
+
+def report_sync(mirror_index: MirrorIndex, urls) -> None:
+    """Report the files added, unchanged and removed in the destination directory since the last run."""
+    from pipdownload.index import url_to_file_name
+
+    removed = mirror_index.removed(url_to_file_name(url) for url in urls)
+    for file_name in sorted(removed):
+        logger.info("Not in the download set anymore: %s" % file_name)
+    logger.info(
+        "%d files added, %d unchanged, %d removed from the download set since the last run."
+        % (len(mirror_index.added), len(mirror_index.unchanged), len(removed))
+    )
+
+
+def report_downloads(failed) -> None:
+    """Report the files which could not be downloaded, and exit with -7 if there is any."""
+    if not failed:
+        logger.info("All packages have been downloaded successfully!")
+        return
+    from pipdownload.index import url_to_file_name
+
+    for url in failed:
+        logger.error("Not downloaded: %s" % url_to_file_name(url))
+    logger.error("%d files could not be downloaded." % len(failed))
+    sys.exit(-7)
+
+
+# The options shared by `download` and `serve`.
+NETWORK_OPTIONS = [
+    click.option(
+        "--timeout",
+        "timeout",
+        type=click.FloatRange(min=0, min_open=True),
+        default=60,
+        show_default=True,
+        help="The timeout in seconds of connecting to and reading from the index and the file hosts.",
+    ),
+    click.option(
+        "--retries",
+        "retries",
+        type=click.IntRange(min=0),
+        default=3,
+        show_default=True,
+        help="How many times a request is retried on connection errors and server errors, with exponential backoff.",
+    ),
+    click.option(
+        "--limit-rate",
+        "limit_rate",
+        callback=parse_rate_option,
+        help="The maximum rate in bytes per second of all of the downloads together, like '500K', '20M' or '1.5G'. "
+        "It can also be set by 'limit-rate' in the config file.",
+    ),
+    click.option(
+        "--max-request-rate",
+        "max_request_rate",
+        type=click.FloatRange(min=0, min_open=True),
+        help="The maximum number of requests per second sent to one host, shared by the index requests and the "
+        "downloads. Responses '429 Too Many Requests' pause the host for their 'Retry-After' delay. It can also be "
+        "set by 'max-request-rate' in the config file.",
+    ),
+]
+NO_INDEX_CACHE_OPTION = click.option(
+    "--no-index-cache",
+    "no_index_cache",
+    is_flag=True,
+    help="When specified, index pages are neither read from nor written to the index cache.",
+)
+USE_STORE_OPTION = click.option(
+    "--use-store",
+    "use_store",
+    is_flag=True,
+    help="When specified, files are kept in a content-addressed artifact store shared by all destination "
+    "directories, and materialized into the destination directory by hardlink, reflink or copy instead of being "
+    "downloaded again. It can also be enabled by 'use-store' in the config file.",
+)
+
+
+def add_options(options):
+    """Apply a list of click options to a command, in the order they are listed."""
+    def decorator(function):
+        for option in reversed(options):
+            function = option(function)
+        return function
+
+    return decorator
+
+
+@main.command("download", epilog="Run 'pip-download gc --help' to see how to clean up the artifact store.")
 @click.argument("packages", nargs=-1)
 @click.option(
     "-i",
     "--index-url",
     "index_url",
     type=click.STRING,
+    default="https://pypi.org/simple",
+    show_default=True,
     help="Pypi index.",
 )
 @click.option(
@@ -85,6 +272,16 @@ session = CacheControl(sess)
     is_flag=True,
     help="When specified, logs and progress bar will not be shown.",
 )
+@click.option(
+    "-t",
+    "--target",
+    "targets",
+    multiple=True,
+    help="A (python version, platform tag) target like 'cp311-manylinux2014_x86_64', '3.10-win_amd64' or "
+    "'cp38-macosx_11_0_arm64'. It can be used multiple times, the packages are resolved for every target in "
+    "parallel processes with its environment markers, and the wheels of all targets are downloaded. It can not be "
+    "used with '--python-version' or '--platform-tag'.",
+)
 @click.option(
     "--no-source",
     "no_source",
@@ -98,6 +295,94 @@ session = CacheControl(sess)
     help="When specified, the source package is downloaded if no wheel package exists, "
          "even if the --no-source option is set.",
 )
+@click.option(
+    "--resolver",
+    "resolver",
+    type=click.Choice(["metadata", "batch", "legacy"]),
+    default="metadata",
+    show_default=True,
+    help="How to resolve the packages and their dependencies. 'metadata' only fetches the metadata files "
+    "published by the index (PEP 658) and falls back to 'batch' when they are not available, 'batch' resolves "
+    "all of the packages with one pip invocation without downloading them, 'legacy' downloads every package "
+    "with pip download one by one.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="The number of files to be downloaded at the same time.",
+)
+@click.option(
+    "--per-host-connections",
+    "per_host_connections",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The maximum number of connections opened to one host at the same time. Defaults to the value of "
+    "'--jobs'.",
+)
+@add_options(NETWORK_OPTIONS)
+@click.option(
+    "--offline-index",
+    "offline_index",
+    is_flag=True,
+    help="When specified, index pages are served from the index cache only and never requested.",
+)
+@NO_INDEX_CACHE_OPTION
+@click.option(
+    "--refresh-resolution",
+    "refresh_resolution",
+    is_flag=True,
+    help="When specified, the cached resolution of the requirements is dropped and they are resolved again. "
+    "Resolutions are cached for 'resolution-cache-ttl' seconds in the config file, 0 disables the cache.",
+)
+@USE_STORE_OPTION
+@click.option(
+    "--incremental",
+    "incremental",
+    is_flag=True,
+    help="When specified, a sidecar index of the files in the destination directory is kept, so that existing "
+    "files whose size and modification time have not changed are skipped without being hashed again, and the "
+    "files added, unchanged and removed since the last run are reported. It can also be enabled by "
+    "'incremental' in the config file.",
+)
+@click.option(
+    "--plan",
+    "plan",
+    type=click.Path(dir_okay=False, writable=True),
+    help="When specified, the packages are resolved and the files to download are written into this manifest "
+    "instead of being downloaded. The manifest is written as JSON Lines if the path ends with '.jsonl' and as JSON "
+    "otherwise.",
+)
+@click.option(
+    "--from-manifest",
+    "from_manifest",
+    type=click.Path(exists=True, dir_okay=False),
+    help="When specified, the files listed in this manifest, which is written by '--plan', are downloaded without "
+    "resolving any package.",
+)
+@click.option(
+    "--stats",
+    "show_stats",
+    is_flag=True,
+    help="When specified, the time spent in every stage of the run, like resolution, index requests, hashing and "
+    "transfer, and the counters of the run are shown at the end.",
+)
+@click.option(
+    "--stats-json",
+    "stats_json",
+    type=click.Path(dir_okay=False, writable=True),
+    help="When specified, the timers and counters of the run are written into this JSON file.",
+)
+@click.option(
+    "--trace",
+    "trace",
+    type=click.Path(dir_okay=False, writable=True),
+    help="When specified, every timed call of the run is written into this file in the Chrome trace format, "
+    "which can be opened in chrome://tracing or Perfetto.",
+)
 @click.option(
     "--show-config",
     "show_config",
@@ -119,9 +404,27 @@ def pipdownload(
         whl_suffixes,
         platform_tags,
         python_versions,
+        targets,
         quiet,
         no_source,
         source_as_fallback,
+        resolver,
+        jobs,
+        per_host_connections,
+        timeout,
+        retries,
+        limit_rate,
+        max_request_rate,
+        offline_index,
+        no_index_cache,
+        refresh_resolution,
+        use_store,
+        incremental,
+        plan,
+        from_manifest,
+        show_stats,
+        stats_json,
+        trace,
         show_config,
         show_urls
 ):
@@ -139,25 +442,45 @@ def pipdownload(
         click.echo(f"The config file is {settings.SETTINGS_FILE}.")
         sys.exit(0)
 
-    if Path(settings.SETTINGS_FILE).exists():
-        with open(settings.SETTINGS_FILE, "r") as f:
-            try:
-                settings_dict = json.loads(f.read(), object_pairs_hook=OrderedDict)
-            except json.decoder.JSONDecodeError:
-                logger.error(
-                    f"The config file {settings.SETTINGS_FILE} is not correct, it should be a json object."
-                )
-                sys.exit(-2)
+    # requests, packaging and the modules built on them are imported only by the commands using the network,
+    # so that `--help`, `--show-config`, `gc` and `verify` start quickly.
+    import requests
+    from pipdownload.index import IndexClient
+    from pipdownload.index import ProjectIndex
+    from pipdownload.manifest import entry_url
+    from pipdownload.manifest import make_entry
+    from pipdownload.manifest import read_manifest
+    from pipdownload.manifest import write_manifest
+    from pipdownload.resolver import MetadataResolver
+    from pipdownload.session import make_session
+    from pipdownload.tags import WheelTagMatcher
+    from pipdownload.targets import Target
+    from pipdownload.targets import resolve_targets
+    from pipdownload.targets import resolve_targets_with_pip
+    from pipdownload.utils import TempDirectory
+    from pipdownload.utils import download_all
+    from pipdownload.utils import download_package
+    from pipdownload.utils import group_resolved_files
+    from pipdownload.utils import requirement_names
+    from pipdownload.utils import requirement_satisfied
+    from pipdownload.utils import resolve_package_files
+    from pipdownload.utils import resolve_packages
+    from pipdownload.utils import select_downloads
+
+    stats.reset(trace=bool(trace))
+    # The stats are reported however the run ends.
+    click.get_current_context().call_on_close(partial(report_stats, show_stats, stats_json, trace))
 
-        if not python_versions:
-            python_versions = settings_dict.get("python-versions", None)
-            if python_versions:
-                click.echo(f"Using `python-versions` in config file.")
+    settings_dict = load_settings()
+    if not python_versions:
+        python_versions = settings_dict.get("python-versions", None)
+        if python_versions:
+            click.echo(f"Using `python-versions` in config file.")
 
-        if not (platform_tags or whl_suffixes):
-            platform_tags = settings_dict.get("platform-tags", None)
-            if platform_tags:
-                click.echo(f"Using `platform-tags` in config file.")
+    if not (platform_tags or whl_suffixes):
+        platform_tags = settings_dict.get("platform-tags", None)
+        if platform_tags:
+            click.echo(f"Using `platform-tags` in config file.")
 
 
     if whl_suffixes:
@@ -166,11 +489,39 @@ def pipdownload(
         )
         platform_tags = whl_suffixes
 
+    if targets and (python_versions or platform_tags):
+        logger.error("Option '--target' can not be used with option '--python-version' or '--platform-tag'.")
+        sys.exit(-2)
+    if targets and resolver == "legacy":
+        logger.error("Option '--target' can not be used with the legacy resolver.")
+        sys.exit(-2)
+    try:
+        targets = [Target(spec) for spec in targets]
+    except ValueError as e:
+        logger.error(e)
+        sys.exit(-2)
+
+    if offline_index and no_index_cache:
+        logger.error("Option '--offline-index' can not be used with option '--no-index-cache'.")
+        sys.exit(-2)
+    if offline_index and resolver != "metadata":
+        # pip resolves the packages with the index, it can not be served from the index cache.
+        logger.error("Option '--offline-index' can only be used with the metadata resolver.")
+        sys.exit(-2)
+    index_cache = None if no_index_cache else load_index_cache(settings_dict)
+    bandwidth, max_request_rate = load_rate_limits(settings_dict, limit_rate, max_request_rate)
+    session = make_session(pool_size=jobs, timeout=timeout, retries=retries, max_request_rate=max_request_rate)
+    index = IndexClient(session, index_url, cache=index_cache, offline=offline_index)
+    # The pages fetched during the resolution are reused to select the files to download.
+    projects = ProjectIndex(index)
+
+    if use_store or settings_dict.get("use-store", False):
+        store = ArtifactStore(settings_dict.get("store-dir", settings.STORE_DIR))
+    else:
+        store = None
+
     if quiet:
         logger.setLevel(logging.ERROR)
-        download = quiet_download
-    else:
-        download = normal_download
 
     url_list = []
 
@@ -180,91 +531,215 @@ def pipdownload(
         if not os.path.exists(dest_dir):
             os.makedirs(dest_dir)
     # dest_dir = os.path.abspath(dest_dir)
+    if incremental or settings_dict.get("incremental", False):
+        mirror_index = MirrorIndex(dest_dir)
+    else:
+        mirror_index = None
+
+    if plan and from_manifest:
+        logger.error("Option '--plan' can not be used with option '--from-manifest'.")
+        sys.exit(-2)
+    if from_manifest:
+        try:
+            entries = read_manifest(from_manifest)
+        except (OSError, ValueError) as e:
+            logger.error(e)
+            sys.exit(-4)
+        logger.info("Downloading %d files of manifest %s with %d jobs." % (len(entries), from_manifest, jobs))
+        urls = [entry_url(entry) for entry in entries]
+        with stats.timer("download_all"):
+            failed = download_all(
+                urls,
+                dest_dir,
+                jobs=jobs,
+                per_host=per_host_connections,
+                quiet=quiet,
+                store=store,
+                session=session,
+                mirror_index=mirror_index,
+                bandwidth=bandwidth,
+                retries=retries,
+                timeout=timeout,
+            )
+        if mirror_index is not None:
+            report_sync(mirror_index, urls)
+        report_downloads(failed)
+        return
+
     if requirement_file:
+        # pip_api runs `pip --version` when it is imported, so it is imported only to parse a requirements file.
+        import pip_api
+
         packages_extra_dict = pip_api.parse_requirements(requirement_file)
         packages_extra = {str(value) for value in packages_extra_dict.values()}
     else:
         packages_extra = set()
-    for package in itertools.chain(packages_extra, packages):
-        with TempDirectory(delete=True) as directory:
+    requirements = list(itertools.chain(packages_extra, packages))
+    tag_matcher = WheelTagMatcher(python_versions, platform_tags)
+    file_names = None
+    # The resolved files, every one with the matcher of the wheels to download for it.
+    resolved_files = None
+    resolve_start = time.perf_counter()
+    # The number of requirements which are not resolved as they have been resolved with another one.
+    skipped = 0
+    resolution_cache = load_resolution_cache(settings_dict)
+    resolution_key = None
+    if resolution_cache is not None:
+        resolution_key = resolution_cache.key(
+            requirements, [target.spec for target in targets], index_url, resolver=resolver
+        )
+        if refresh_resolution:
+            resolution_cache.invalidate(resolution_key)
+        else:
+            # The index can not tell whether a resolution is outdated when it is offline, so any one is used.
+            cached = resolution_cache.get(resolution_key, expired=offline_index)
+            if cached is not None:
+                logger.info("The packages are resolved as in a previous run, use '--refresh-resolution' to resolve "
+                            "them again.")
+                matchers = {target.spec: target for target in targets}
+                resolved_files = [(file_name, matchers.get(spec, tag_matcher)) for file_name, spec in cached]
+                file_names = [file_name for file_name, _ in resolved_files]
+                stats.count("resolve.cache_hits")
+                # The resolution is not stored again.
+                resolution_key = None
+    if file_names is None and offline_index:
+        missing = [name for name in requirement_names(requirements) if not index.is_cached(name)]
+        if missing:
+            logger.error(
+                "The index pages of %s are not in the index cache, run without '--offline-index' once to cache them."
+                % ", ".join(missing)
+            )
+            sys.exit(-3)
+    if file_names is None and targets:
+        logger.info("We are resolving the packages for %d targets in parallel." % len(targets))
+        logger.info("-" * 50)
+        if resolver == "metadata":
+            cache = (index_cache.directory, index_cache.max_size, index_cache.ttl) if index_cache else None
+            results = resolve_targets(
+                targets,
+                requirements,
+                index_url,
+                cache=cache,
+                offline=offline_index,
+                timeout=timeout,
+                retries=retries,
+                # The targets are resolved at the same time, every process gets its share of the requests.
+                max_request_rate=max_request_rate / len(targets) if max_request_rate else None,
+            )
+        else:
+            results = [None] * len(targets)
+        pending = [target for target, target_file_names in zip(targets, results) if target_file_names is None]
+        if pending and offline_index:
+            # pip would resolve the packages with the index, which must not be requested.
+            logger.error("Can not resolve the packages for target %s from the index cache." % pending[0])
+            sys.exit(-6)
+        if pending:
             logger.info(
-                "We are using pip download command to download package %s" % package
+                "We are using pip to resolve all of the packages for targets %s in parallel."
+                % ", ".join(str(target) for target in pending)
             )
-            logger.info("-" * 50)
-            if download_package(
-                index_url, directory, package, quiet, "original"
-            ) or download_package(index_url, directory, package, quiet, "linux_x86_64"):
-                pass
-            else:
-                raise Exception
-            file_names = os.listdir(directory.path)
-
-            for file_name in file_names:
-                python_package = resolve_package_file(file_name)
-                url_list.append(python_package)
-                if python_package.name is None:
-                    logger.warning(
-                        "Can not resolve a package's name and version from a downloaded package. You shuold "
-                        "create an issue maybe."
-                    )
-                    continue
-                url = mkurl_pypi_url(index_url, python_package.name)
-                try:
-                    r = session.get(url)
-                    file_links = get_file_links(r.text, url, python_package)
-                    for file in file_links:
-                        url_list.append(file)
-                        if "none-any" in file:
-                            if "py2.py3" in file_name or not python_versions:
-                                download(file, dest_dir)
-                            elif [1 for x in python_versions if "-"+x+"-" in file]:
-                                download(file, dest_dir)
-                            continue
-
-                        if ".tar.gz" in file or ".zip" in file:
-                            download_source = False
-                            if no_source:
-                                if source_as_fallback and not wheel_package_exists(file_links):
-                                    download_source = True
-                                else:
-                                    continue
-                            else:
-                                download_source = True
-
-                            if download_source:
-                                download(file, dest_dir)
-                                continue
-
-                        eligible = True
-                        if platform_tags:
-                            for tag in platform_tags:
-                                if tag in file:
-                                    eligible = True
-                                    break
-                                else:
-                                    eligible = False
-                        if not eligible:
-                            continue
-
-                        if python_versions:
-                            for version in python_versions:
-                                if version in file:
-                                    eligible = True
-                                    break
-                                else:
-                                    eligible = False
-
-                        if eligible:
-                            download(file, dest_dir)
-
-                except ConnectionError as e:
-                    logger.error(
-                        "Can not get information about package %s, and the Exception is below.",
-                        python_package.name,
-                    )
-                    logger.error(e)
-                    raise
-            logger.info("All packages have been downloaded successfully!")
+            fallback = dict(zip(pending, resolve_targets_with_pip(pending, requirements, index_url, quiet)))
+            results = [fallback.get(target, target_file_names) for target, target_file_names in zip(targets, results)]
+        resolved_files = []
+        for target, target_file_names in zip(targets, results):
+            if target_file_names is None:
+                logger.error("Can not resolve the packages for target %s." % target)
+                sys.exit(-6)
+            resolved_files.extend((file_name, target) for file_name in target_file_names)
+        file_names = [file_name for file_name, _ in resolved_files]
+    if file_names is None and resolver == "metadata":
+        logger.info("We are resolving the packages with the metadata published by the index.")
+        logger.info("-" * 50)
+        try:
+            file_names = MetadataResolver(index, projects=projects).resolve(requirements)
+        except (MetadataResolutionError, IndexPageNotCached, requests.RequestException) as e:
+            if offline_index:
+                # pip would resolve the packages with the index, which must not be requested.
+                logger.error(e)
+                logger.error("Can not resolve the packages from the index cache.")
+                sys.exit(-3 if isinstance(e, IndexPageNotCached) else -6)
+            logger.warning(e)
+            logger.warning("Falling back to resolve the packages with pip.")
+    if file_names is None and resolver in ("metadata", "batch"):
+        logger.info("We are using pip to resolve all of the packages at once.")
+        logger.info("-" * 50)
+        file_names = resolve_packages(index_url, requirements, quiet)
+        if file_names is None:
+            logger.warning("Falling back to resolve the packages one by one.")
+    if file_names is None:
+        file_names = []
+        for package in requirements:
+            if requirement_satisfied(package, resolve_package_files(file_names)):
+                logger.info("Package %s is satisfied by the packages resolved already." % package)
+                skipped += 1
+                continue
+            with TempDirectory(delete=True) as directory:
+                logger.info(
+                    "We are using pip download command to download package %s" % package
+                )
+                logger.info("-" * 50)
+                if download_package(
+                    index_url, directory, package, quiet, "original"
+                ) or download_package(index_url, directory, package, quiet, "linux_x86_64"):
+                    pass
+                else:
+                    logger.error("Can not resolve the package %s." % package)
+                    sys.exit(-6)
+                file_names.extend(os.listdir(directory.path))
+    if resolved_files is None:
+        resolved_files = [(file_name, tag_matcher) for file_name in file_names]
+    # Only a successful resolution is stored, a failed one would be reused until it expires.
+    if resolution_key is not None and file_names:
+        resolution_cache.set(
+            resolution_key,
+            [(file_name, matcher.spec if isinstance(matcher, Target) else None) for file_name, matcher in resolved_files],
+            requirements,
+        )
+    stats.add_time("resolve", time.perf_counter() - resolve_start, resolve_start)
+
+    # The same package is resolved once for every requirement depending on it when the packages are resolved one
+    # by one, so the resolved files are grouped by package and every package is looked up only once.
+    resolved_packages, unresolved = group_resolved_files(resolved_files)
+    url_list.extend(unresolved)
+    redundant = len(file_names) - len(resolved_packages) - len(unresolved) + skipped
+    logger.info(
+        "%d packages resolved for %d requirements, %d redundant resolutions eliminated."
+        % (len(resolved_packages), len(requirements), redundant)
+    )
+
+    try:
+        download_urls = select_downloads(projects, resolved_packages, no_source, source_as_fallback, url_list)
+    except IndexPageNotCached as e:
+        logger.error(e)
+        sys.exit(-3)
+
+    if plan:
+        write_manifest(
+            plan,
+            (make_entry(python_package.name, python_package.version, link)
+             for python_package, link in download_urls.values()),
+        )
+        logger.info("The manifest of %d files has been written to %s." % (len(download_urls), plan))
+        return
+
+    logger.info("Downloading %d files with %d jobs." % (len(download_urls), jobs))
+    with stats.timer("download_all"):
+        failed = download_all(
+            list(download_urls),
+            dest_dir,
+            jobs=jobs,
+            per_host=per_host_connections,
+            quiet=quiet,
+            store=store,
+            session=session,
+            mirror_index=mirror_index,
+            bandwidth=bandwidth,
+            retries=retries,
+            timeout=timeout,
+        )
+    if mirror_index is not None:
+        report_sync(mirror_index, download_urls)
+    report_downloads(failed)
 
     if show_urls:
         logger.setLevel(logging.INFO)
@@ -274,5 +749,237 @@ def pipdownload(
         return url_list
 
 
+@main.command("gc")
+@click.option(
+    "--max-size",
+    "max_size",
+    type=click.FloatRange(min=0),
+    default=0,
+    show_default=True,
+    help="The size in MiB that unreferenced files are allowed to take in the artifact store.",
+)
+@click.option(
+    "--dry-run",
+    "dry_run",
+    is_flag=True,
+    help="When specified, the files to be removed are listed but not removed.",
+)
+def gc(max_size, dry_run):
+    """
+    Remove the files in the artifact store which are not referenced by any destination directory anymore,
+    least recently used first, until they fit in the size budget.
+    """
+    settings_dict = load_settings()
+    store = ArtifactStore(settings_dict.get("store-dir", settings.STORE_DIR))
+    removed = store.gc(int(max_size * 1024 * 1024), dry_run=dry_run)
+    for sha256 in removed:
+        logger.info(("Would remove %s" if dry_run else "Removed %s") % store.path(sha256))
+    logger.info(
+        "%d files %s, the artifact store %s takes %.2f MiB now."
+        % (len(removed), "to be removed" if dry_run else "removed", store.directory, store.size() / 1024 / 1024)
+    )
+
+
+@main.command("verify")
+@click.argument("dest_dir", type=click.Path(exists=True, file_okay=False), default=".")
+@click.option(
+    "-m",
+    "--manifest",
+    "manifest",
+    type=click.Path(exists=True, dir_okay=False),
+    help="When specified, the files are checked against the sha256 in this manifest, which is written by '--plan', "
+    "instead of the sidecar index of the directory, which is written by '--incremental'.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The number of processes hashing the files. Defaults to the number of CPUs.",
+)
+def verify(dest_dir, manifest, jobs):
+    """
+    Check every file in a destination directory against its recorded sha256, in a pool of processes.
+    """
+    if manifest:
+        from pipdownload.manifest import read_manifest
+
+        try:
+            entries = read_manifest(manifest)
+        except (OSError, ValueError) as e:
+            logger.error(e)
+            sys.exit(-4)
+        index_files = {entry["filename"]: entry["sha256"] for entry in entries if entry.get("sha256")}
+    else:
+        index_files = MirrorIndex(dest_dir).recorded()
+    expected, unknown = recorded_files(dest_dir, index_files)
+    if not expected:
+        logger.error("No file in %s has a recorded sha256, use '--incremental' or '--manifest'." % dest_dir)
+        sys.exit(-2)
+    for file_name in unknown:
+        logger.warning("The file %s has no recorded sha256 and is not verified." % file_name)
+
+    report = verify_files(expected, jobs=jobs)
+    for path in report.missing:
+        logger.error("The file %s is missing." % path)
+    for path in report.mismatches:
+        logger.error("The file %s does not match its sha256." % path)
+    logger.info(
+        "%d files verified, %d mismatches, %d missing, %d not recorded: %.2f MiB in %.2f s (%.2f MiB/s)."
+        % (
+            len(report.verified),
+            len(report.mismatches),
+            len(report.missing),
+            len(unknown),
+            report.total_bytes / 1024 / 1024,
+            report.elapsed,
+            report.throughput / 1024 / 1024,
+        )
+    )
+    if report.mismatches or report.missing:
+        sys.exit(-5)
+
+
+@main.command("serve")
+@click.option(
+    "-s",
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    help="The Unix socket the daemon listens on, it is only accessible to its owner. Defaults to 'daemon.sock' in "
+    "the cache directory, which is used by `pip-download-client` too.",
+)
+@click.option(
+    "--host", "host", default="127.0.0.1", show_default=True, help="The address the daemon listens on with '--port'."
+)
+@click.option(
+    "--port",
+    "port",
+    type=click.IntRange(min=0),
+    default=None,
+    help="Listen on this TCP port instead of the Unix socket. Every user who can reach the port can submit jobs, "
+    "so the requests must carry '--token'.",
+)
+@click.option(
+    "--token",
+    "token",
+    envvar="PIP_DOWNLOAD_TOKEN",
+    default=None,
+    help="The token which the requests to the TCP port must carry, as 'Authorization: Bearer <token>'. It can also "
+    "be given by PIP_DOWNLOAD_TOKEN.",
+)
+@click.option(
+    "--allowed-root",
+    "allowed_roots",
+    type=click.Path(file_okay=False),
+    multiple=True,
+    help="A directory the destinations, the plans and the requirement files of the jobs must be in. It can be "
+    "specified multiple times. By default a job can write to any path the daemon can.",
+)
+@click.option(
+    "--max-jobs",
+    "max_jobs",
+    type=click.IntRange(min=1),
+    default=2,
+    show_default=True,
+    help="The number of jobs run at the same time, the other jobs wait in a queue.",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="The number of files downloaded at the same time by a job.",
+)
+@click.option(
+    "--per-host-connections",
+    "per_host_connections",
+    type=click.IntRange(min=1),
+    default=None,
+    help="The maximum number of connections of a job opened to one host at the same time. Defaults to the value "
+    "of '--jobs'.",
+)
+@add_options(NETWORK_OPTIONS)
+@NO_INDEX_CACHE_OPTION
+@USE_STORE_OPTION
+def serve(
+    socket_path,
+    host,
+    port,
+    token,
+    allowed_roots,
+    max_jobs,
+    jobs,
+    per_host_connections,
+    timeout,
+    retries,
+    limit_rate,
+    max_request_rate,
+    no_index_cache,
+    use_store,
+):
+    """
+    Run a daemon which keeps the connections, the index pages and the resolutions warm between jobs. The jobs are
+    submitted with `pip-download-client`, or as JSON to `POST /jobs`.
+
+    A job reads and writes files as the user running the daemon. By default the daemon listens on a Unix socket
+    which only this user can connect to. With '--port' it listens on TCP and only accepts the requests carrying
+    '--token'; '--allowed-root' limits the paths the jobs can write to.
+    """
+    from pipdownload.daemon import Daemon
+    from pipdownload.daemon import make_server
+
+    settings_dict = load_settings()
+    index_cache = None if no_index_cache else load_index_cache(settings_dict)
+    bandwidth, max_request_rate = load_rate_limits(settings_dict, limit_rate, max_request_rate)
+    if use_store or settings_dict.get("use-store", False):
+        store = ArtifactStore(settings_dict.get("store-dir", settings.STORE_DIR))
+    else:
+        store = None
+    if port is not None and socket_path:
+        logger.error("'--socket' can not be used with '--port'.")
+        sys.exit(-2)
+    if port is not None and not token:
+        logger.error("A daemon listening on '--port' needs '--token'.")
+        sys.exit(-2)
+    if port is None and not socket_path:
+        socket_path = settings.DAEMON_SOCKET
+    daemon = Daemon(
+        max_jobs=max_jobs,
+        jobs=jobs,
+        per_host=per_host_connections,
+        timeout=timeout,
+        retries=retries,
+        index_cache=index_cache,
+        store=store,
+        ttl=settings_dict.get("index-cache-ttl", settings.INDEX_CACHE_TTL),
+        resolution_cache=load_resolution_cache(settings_dict),
+        bandwidth=bandwidth,
+        max_request_rate=max_request_rate,
+        allowed_roots=[os.path.abspath(root) for root in allowed_roots] or None,
+    )
+    try:
+        server = make_server(daemon, socket_path=socket_path, host=host, port=port or 0, token=token)
+    except OSError as e:
+        logger.error(e)
+        sys.exit(-2)
+    if socket_path:
+        logger.info("The daemon is listening on %s." % socket_path)
+    else:
+        logger.info("The daemon is listening on http://%s:%d." % server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.unlink(socket_path)
+        daemon.shutdown(wait=False)
+
+
 if __name__ == "__main__":
-    pipdownload()
+    main()
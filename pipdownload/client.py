@@ -0,0 +1,158 @@
+"""
+A thin client of `pip-download serve`.
+
+    $ pip-download-client -d /mirror flask
+    $ pip-download-client -r requirements.txt --plan plan.jsonl
+    $ pip-download-client -s /tmp/pip-download.sock --status
+    $ pip-download-client --url http://127.0.0.1:8642 --token "$TOKEN" --status
+
+It only imports the standard library, so submitting a job does not pay for importing pip, click and
+requests: the daemon resolves and downloads with its warm caches.
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import sys
+from typing import Tuple
+
+# The environment variables of the default daemon address.
+SOCKET_ENV = "PIP_DOWNLOAD_SOCKET"
+URL_ENV = "PIP_DOWNLOAD_DAEMON_URL"
+# The environment variable of the token of a daemon listening on a TCP port.
+TOKEN_ENV = "PIP_DOWNLOAD_TOKEN"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """An HTTP connection over a Unix socket."""
+
+    def __init__(self, socket_path: str, timeout=None) -> None:
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(method: str, path: str, data: dict = None, socket_path: str = None, url: str = None,
+            timeout: float = None, token: str = None) -> Tuple[int, dict]:
+    """
+    Send a request to a daemon.
+    :param socket_path: The Unix socket the daemon listens on.
+    :param url: The `http://host:port` the daemon listens on, when socket_path is not given.
+    :param token: The token of the daemon, see `pip-download serve --token`.
+    :return: The status and the JSON body of the response.
+    """
+    if socket_path is not None:
+        connection = UnixHTTPConnection(socket_path, timeout=timeout)
+    else:
+        connection = http.client.HTTPConnection(url.split("://", 1)[-1].rstrip("/"), timeout=timeout)
+    try:
+        body = json.dumps(data).encode() if data is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        if token:
+            headers["Authorization"] = "Bearer " + token
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read() or b"null")
+    finally:
+        connection.close()
+
+
+def make_job(args: argparse.Namespace) -> dict:
+    """Make the job of the parsed arguments, with the paths made absolute for the daemon."""
+    job = {
+        "requirements": args.packages,
+        "index_url": args.index_url,
+        "targets": args.targets,
+        "python_versions": args.python_versions,
+        "platform_tags": args.platform_tags,
+        "no_source": args.no_source,
+        "source_as_fallback": args.source_as_fallback,
+        "incremental": args.incremental,
+        "refresh_resolution": args.refresh_resolution,
+    }
+    if args.requirement_file:
+        job["requirement_file"] = os.path.abspath(args.requirement_file)
+    if args.plan:
+        job["plan"] = os.path.abspath(args.plan)
+    else:
+        job["dest_dir"] = os.path.abspath(args.dest_dir or os.getcwd())
+    return job
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="pip-download-client", description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("packages", nargs="*", help="The requirement specifiers of the packages.")
+    parser.add_argument(
+        "-s",
+        "--socket",
+        default=os.environ.get(SOCKET_ENV),
+        help="The Unix socket of the daemon, the default socket of 'pip-download serve' if no daemon is given.",
+    )
+    parser.add_argument("--url", default=os.environ.get(URL_ENV), help="The http://host:port of the daemon.")
+    parser.add_argument("--token", default=os.environ.get(TOKEN_ENV), help="The token of a daemon given by '--url'.")
+    parser.add_argument("-i", "--index-url", default="https://pypi.org/simple", help="Base URL of the index.")
+    parser.add_argument("-r", "--requirement", dest="requirement_file", help="A requirements file.")
+    parser.add_argument("-d", "--dest", dest="dest_dir", help="The destination directory.")
+    parser.add_argument("-t", "--target", dest="targets", action="append", default=[], help="A target, see '--target'.")
+    parser.add_argument("-py", "--python-version", dest="python_versions", action="append", default=[])
+    parser.add_argument("-p", "--platform-tag", dest="platform_tags", action="append", default=[])
+    parser.add_argument("--no-source", action="store_true")
+    parser.add_argument("--source-as-fallback", action="store_true")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--refresh-resolution", action="store_true", help="Resolve the packages again.")
+    parser.add_argument("--plan", help="Write the manifest of the files to this path instead of downloading them.")
+    parser.add_argument("--no-wait", action="store_true", help="Print the id of the queued job and exit.")
+    parser.add_argument("--job", type=int, help="Wait for the job with this id and print it.")
+    parser.add_argument("--status", action="store_true", help="Print the state of the daemon.")
+    args = parser.parse_args(argv)
+    if not args.socket and not args.url:
+        from pipdownload.settings import DAEMON_SOCKET
+
+        args.socket = DAEMON_SOCKET
+    connection = {"socket_path": args.socket, "url": args.url, "token": args.token}
+
+    try:
+        if args.status:
+            status, data = request("GET", "/status", **connection)
+        elif args.job is not None:
+            status, data = request("GET", "/jobs/%d?wait=0" % args.job, **connection)
+        else:
+            if not args.packages and not args.requirement_file:
+                parser.error("No package is given.")
+            path = "/jobs" if args.no_wait else "/jobs?wait=0"
+            status, data = request("POST", path, make_job(args), **connection)
+    except OSError as e:
+        print("Can not connect to the daemon: %s" % e, file=sys.stderr)
+        return 2
+
+    if status >= 400:
+        print(data.get("error") if isinstance(data, dict) else data, file=sys.stderr)
+        return 1
+    if args.status or args.no_wait:
+        print(json.dumps(data, indent=2))
+        return 0
+    if data["state"] == "failed":
+        print("Job %d has failed: %s" % (data["id"], data["error"]), file=sys.stderr)
+        return 1
+    result = data["result"]
+    for file_name in result["files"]:
+        print(file_name)
+    destination = result.get("plan") or result.get("dest_dir")
+    print(
+        "Job %d: %d files of %d packages in %s, in %.2f s."
+        % (data["id"], len(result["files"]), result["packages"], destination, data["finished"] - data["submitted"]),
+        file=sys.stderr,
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,541 @@
+import hmac
+import json
+import logging
+import math
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from socketserver import ThreadingMixIn
+from socketserver import UnixStreamServer
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import parse_qs
+from urllib.parse import urlparse
+
+import requests
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.exceptions import MetadataResolutionError
+from pipdownload.index import IndexCache
+from pipdownload.index import IndexClient
+from pipdownload.index import ProjectIndex
+from pipdownload.manifest import make_entry
+from pipdownload.manifest import write_manifest
+from pipdownload.mirror import MirrorIndex
+from pipdownload.ratelimit import TokenBucket
+from pipdownload.resolutions import ResolutionCache
+from pipdownload.resolver import MetadataResolver
+from pipdownload.session import DEFAULT_TIMEOUT
+from pipdownload.session import make_session
+from pipdownload.stats import stats
+from pipdownload.tags import WheelTagMatcher
+from pipdownload.targets import Target
+from pipdownload.targets import resolve_targets_with_pip
+from pipdownload.utils import download_all
+from pipdownload.utils import group_resolved_files
+from pipdownload.utils import resolve_packages
+from pipdownload.utils import select_downloads
+from pipdownload.utils import url_to_file_name
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_URL = "https://pypi.org/simple"
+# The keys of a job and their defaults.
+JOB_KEYS = {
+    "requirements": [],
+    "requirement_file": None,
+    "dest_dir": None,
+    "index_url": DEFAULT_INDEX_URL,
+    "targets": [],
+    "python_versions": [],
+    "platform_tags": [],
+    "no_source": False,
+    "source_as_fallback": False,
+    "plan": None,
+    "incremental": False,
+    "refresh_resolution": False,
+}
+# The number of finished jobs whose results are kept.
+MAX_FINISHED_JOBS = 1000
+
+
+class Job:
+    """A download or plan job, run by a `Daemon`."""
+
+    def __init__(self, job_id: int, spec: dict) -> None:
+        self.id = job_id
+        self.spec = spec
+        self.state = "queued"
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "state": self.state,
+            "spec": self.spec,
+            "result": self.result,
+            "error": self.error,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+def is_within(path: str, roots: List[str]) -> bool:
+    """Whether path, with its symbolic links followed, is one of the roots or in one of them."""
+    path = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        if os.path.commonpath([path, root]) == root:
+            return True
+    return False
+
+
+def parse_job(data: dict, allowed_roots: Optional[List[str]] = None) -> dict:
+    """
+    Check a job sent by a client and fill in its defaults.
+    :param allowed_roots: The directories the files read and written by a job must be in, any if it is None.
+    :raise ValueError: If the job is not valid.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("A job must be a JSON object.")
+    unknown = set(data) - set(JOB_KEYS)
+    if unknown:
+        raise ValueError("Unknown keys of the job: %s." % ", ".join(sorted(unknown)))
+    spec = dict(JOB_KEYS, **data)
+    if not spec["requirements"] and not spec["requirement_file"]:
+        raise ValueError("A job needs 'requirements' or 'requirement_file'.")
+    for key in ("dest_dir", "requirement_file", "plan"):
+        if spec[key] is not None and not os.path.isabs(spec[key]):
+            raise ValueError("The '%s' of a job must be an absolute path." % key)
+        if spec[key] is not None and allowed_roots is not None and not is_within(spec[key], allowed_roots):
+            raise ValueError("The '%s' of a job must be in %s." % (key, ", ".join(allowed_roots)))
+    if spec["plan"] is None and spec["dest_dir"] is None:
+        raise ValueError("A job needs 'dest_dir' or 'plan'.")
+    if spec["targets"] and (spec["python_versions"] or spec["platform_tags"]):
+        raise ValueError("'targets' can not be used with 'python_versions' or 'platform_tags'.")
+    for target in spec["targets"]:
+        Target(target)
+    return spec
+
+
+class Daemon:
+    """Run download and plan jobs with warm caches.
+
+    The session and its connection pools, the parsed project pages and the resolutions are kept in
+    memory between jobs. Pages and resolutions older than ttl seconds are dropped, the pages are then
+    revalidated against the on-disk index cache. At most max_jobs jobs run at the same time, the others
+    wait in a queue, and the jobs downloading into the same directory run one after another.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = 2,
+        jobs: int = 4,
+        per_host: Optional[int] = None,
+        timeout=DEFAULT_TIMEOUT,
+        retries: int = 3,
+        index_cache: Optional[IndexCache] = None,
+        store=None,
+        ttl: float = 600,
+        resolution_cache: Optional[ResolutionCache] = None,
+        bandwidth: Optional[TokenBucket] = None,
+        max_request_rate: Optional[float] = None,
+        allowed_roots: Optional[List[str]] = None,
+    ) -> None:
+        """
+        :param max_jobs: The number of jobs run at the same time.
+        :param jobs: The number of concurrent downloads of a job.
+        :param per_host: The maximum number of connections of a job opened to one host at the same time.
+        :param index_cache: The on-disk cache of the index pages, shared with the command line.
+        :param store: An instance of `ArtifactStore`, see `download`.
+        :param ttl: How long in seconds the pages and resolutions kept in memory are reused.
+        :param resolution_cache: The on-disk cache of the resolutions, shared with the command line.
+        :param bandwidth: The `TokenBucket` of bytes per second shared by the downloads of all jobs.
+        :param max_request_rate: The maximum number of requests per second sent to one host by all jobs.
+        :param allowed_roots: The directories the files read and written by the jobs must be in, any if it is None.
+        """
+        self.max_jobs = max_jobs
+        self.jobs = jobs
+        self.per_host = per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.allowed_roots = allowed_roots
+        self.index_cache = index_cache
+        self.store = store
+        self.ttl = ttl
+        self.resolution_cache = resolution_cache
+        self.bandwidth = bandwidth
+        self.session = make_session(
+            pool_size=jobs * max_jobs, timeout=timeout, retries=retries, max_request_rate=max_request_rate
+        )
+        self.started = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=max_jobs)
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._next_id = 1
+        self._projects = {}
+        self._resolutions = {}
+        self._dest_locks = {}
+
+    def submit(self, data: dict) -> Job:
+        """
+        Queue a job.
+        :param data: The job, see `JOB_KEYS`.
+        :raise ValueError: If the job is not valid.
+        """
+        spec = parse_job(data, self.allowed_roots)
+        with self._lock:
+            job = Job(self._next_id, spec)
+            self._next_id += 1
+            self._jobs[job.id] = job
+            finished = [old.id for old in self._jobs.values() if old.done.is_set()]
+            for job_id in finished[: max(len(finished) - MAX_FINISHED_JOBS, 0)]:
+                del self._jobs[job_id]
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self) -> dict:
+        with self._lock:
+            states = [job.state for job in self._jobs.values()]
+            projects = sum(len(entry[1]) for entry in self._projects.values())
+            resolutions = len(self._resolutions)
+        return {
+            "uptime": time.time() - self.started,
+            "max_jobs": self.max_jobs,
+            "jobs": {state: states.count(state) for state in ("queued", "running", "done", "failed")},
+            "cached_projects": projects,
+            "cached_resolutions": resolutions,
+            "stats": stats.to_dict(),
+        }
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        self.session.close()
+
+    def _get_projects(self, index_url: str) -> ProjectIndex:
+        """Return the project index of index_url, a new one if the pages kept in memory are too old."""
+        with self._lock:
+            entry = self._projects.get(index_url)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                index = IndexClient(self.session, index_url, cache=self.index_cache)
+                entry = self._projects[index_url] = (time.monotonic(), ProjectIndex(index))
+            return entry[1]
+
+    def _dest_lock(self, dest_dir: str) -> threading.Lock:
+        with self._lock:
+            return self._dest_locks.setdefault(os.path.realpath(dest_dir), threading.Lock())
+
+    def _resolve(self, projects: ProjectIndex, spec: dict, requirements: List[str]) -> Tuple[list, bool]:
+        """
+        Resolve the requirements of a job, or reuse the resolution of an identical job, kept in memory or in
+        the resolution cache.
+        :return: The resolved files with their matchers, see `group_resolved_files`, and whether they are reused.
+        """
+        key = (
+            spec["index_url"],
+            tuple(sorted(requirements)),
+            tuple(spec["targets"]),
+            tuple(spec["python_versions"]),
+            tuple(spec["platform_tags"]),
+        )
+        with self._lock:
+            entry = self._resolutions.get(key)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl and not spec["refresh_resolution"]:
+            return entry[1], True
+
+        targets = [Target(name) for name in spec["targets"]]
+        matcher = WheelTagMatcher(spec["python_versions"], spec["platform_tags"])
+        cache_key = None
+        if self.resolution_cache is not None:
+            # The jobs are resolved with the metadata resolver, falling back to pip.
+            cache_key = self.resolution_cache.key(requirements, spec["targets"], spec["index_url"], resolver="metadata")
+            cached = None if spec["refresh_resolution"] else self.resolution_cache.get(cache_key)
+            if cached is not None:
+                matchers = {target.spec: target for target in targets}
+                resolved_files = [(file_name, matchers.get(name, matcher)) for file_name, name in cached]
+                with self._lock:
+                    self._resolutions[key] = (time.monotonic(), resolved_files)
+                return resolved_files, True
+
+        resolved_files = []
+        if targets:
+            # The metadata resolutions share the warm pages of the daemon, they are quick and run one after
+            # another, the slow pip resolutions of the targets they can not resolve run at the same time.
+            results = [
+                self._resolve_metadata(
+                    MetadataResolver(
+                        projects.client,
+                        environment=target.environment(),
+                        tags=target.tags(),
+                        projects=projects,
+                        require_tags=True,
+                    ),
+                    requirements,
+                )
+                for target in targets
+            ]
+            pending = [target for target, file_names in zip(targets, results) if file_names is None]
+            if pending:
+                fallback = dict(zip(pending, resolve_targets_with_pip(pending, requirements, spec["index_url"], True)))
+                results = [fallback.get(target, file_names) for target, file_names in zip(targets, results)]
+            for target, file_names in zip(targets, results):
+                if file_names is None:
+                    raise MetadataResolutionError(
+                        "Can not resolve the packages %s for target %s." % (", ".join(requirements), target)
+                    )
+                resolved_files.extend((file_name, target) for file_name in file_names)
+        else:
+            resolver = MetadataResolver(projects.client, projects=projects)
+            file_names = self._resolve_metadata(resolver, requirements)
+            if file_names is None:
+                file_names = resolve_packages(spec["index_url"], requirements, True)
+            if file_names is None:
+                raise MetadataResolutionError("Can not resolve the packages %s." % ", ".join(requirements))
+            resolved_files.extend((file_name, matcher) for file_name in file_names)
+        with self._lock:
+            self._resolutions[key] = (time.monotonic(), resolved_files)
+        if cache_key is not None:
+            self.resolution_cache.set(
+                cache_key,
+                [(file_name, getattr(file_matcher, "spec", None)) for file_name, file_matcher in resolved_files],
+                requirements,
+            )
+        return resolved_files, False
+
+    @staticmethod
+    def _resolve_metadata(resolver: MetadataResolver, requirements: List[str]) -> Optional[List[str]]:
+        """Resolve the requirements with the metadata published by the index, None if it is not enough."""
+        try:
+            return resolver.resolve(requirements)
+        except (MetadataResolutionError, IndexPageNotCached, requests.RequestException) as e:
+            logger.warning(e)
+            logger.warning("Falling back to resolve the packages with pip.")
+            return None
+
+    def _run(self, job: Job) -> None:
+        job.state = "running"
+        job.started = time.time()
+        try:
+            job.result = self._execute(job.spec)
+            if job.result.get("failed"):
+                job.error = "%d files could not be downloaded: %s." % (
+                    len(job.result["failed"]), ", ".join(job.result["failed"])
+                )
+                job.state = "failed"
+            else:
+                job.state = "done"
+        except Exception as e:
+            logger.exception("Job %d has failed." % job.id)
+            job.error = "%s: %s" % (e.__class__.__name__, e)
+            job.state = "failed"
+        finally:
+            job.finished = time.time()
+            job.done.set()
+
+    def _execute(self, spec: dict) -> dict:
+        requirements = list(spec["requirements"])
+        if spec["requirement_file"]:
+            import pip_api
+
+            parsed = pip_api.parse_requirements(spec["requirement_file"])
+            requirements.extend(str(value) for value in parsed.values())
+        projects = self._get_projects(spec["index_url"])
+        with stats.timer("daemon.resolve"):
+            resolved_files, cached = self._resolve(projects, spec, requirements)
+        resolved_packages, _ = group_resolved_files(resolved_files)
+        download_urls = select_downloads(projects, resolved_packages, spec["no_source"], spec["source_as_fallback"])
+        result = {
+            "packages": len(resolved_packages),
+            "files": [url_to_file_name(url) for url in download_urls],
+            "resolution_cached": cached,
+        }
+        if spec["plan"]:
+            write_manifest(
+                spec["plan"],
+                (make_entry(python_package.name, python_package.version, link)
+                 for python_package, link in download_urls.values()),
+            )
+            result["plan"] = spec["plan"]
+            return result
+
+        dest_dir = spec["dest_dir"]
+        os.makedirs(dest_dir, exist_ok=True)
+        with self._dest_lock(dest_dir):
+            mirror_index = MirrorIndex(dest_dir) if spec["incremental"] else None
+            with stats.timer("daemon.download"):
+                failed = download_all(
+                    list(download_urls),
+                    dest_dir,
+                    jobs=self.jobs,
+                    per_host=self.per_host,
+                    quiet=True,
+                    store=self.store,
+                    session=self.session,
+                    mirror_index=mirror_index,
+                    bandwidth=self.bandwidth,
+                    retries=self.retries,
+                    timeout=self.timeout,
+                )
+        result["dest_dir"] = dest_dir
+        if failed:
+            failed_files = {url_to_file_name(url) for url in failed}
+            result["files"] = [file_name for file_name in result["files"] if file_name not in failed_files]
+            result["failed"] = [url_to_file_name(url) for url in failed]
+        if mirror_index is not None:
+            result["added"] = sorted(mirror_index.added)
+            result["unchanged"] = len(mirror_index.unchanged)
+        return result
+
+
+class DaemonRequestHandler(BaseHTTPRequestHandler):
+    """The JSON API of a daemon.
+
+    - `POST /jobs` queues the job in the body and answers 202 with it, or 200 with the finished job when
+      the query has `wait=<seconds>`, 0 to wait without a limit.
+    - `GET /jobs/<id>` answers the job, `wait=<seconds>` waits for it to finish first.
+    - `GET /status` answers the state of the daemon and the stats of all jobs.
+
+    When the server has a token, the requests without `Authorization: Bearer <token>` are answered 401.
+    """
+
+    daemon: Daemon = None
+    token: Optional[str] = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send_json(self, status: int, data: dict) -> None:
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    @staticmethod
+    def _parse_wait(query: dict) -> Optional[float]:
+        """
+        Return the seconds to wait for a job given by `wait=<seconds>` in the query, 0 to wait without a limit,
+        or None if the query has no wait.
+        :raise ValueError: If the wait is not a number of seconds.
+        """
+        if "wait" not in query:
+            return None
+        value = query["wait"][0]
+        try:
+            wait = float(value)
+        except ValueError:
+            wait = -1.0
+        if not math.isfinite(wait) or wait < 0:
+            raise ValueError("The wait %r is not a number of seconds." % value)
+        return wait
+
+    def _authorized(self) -> bool:
+        """Whether the request has the token of the server, and answer 401 if it has not."""
+        if self.token is None:
+            return True
+        authorization = self.headers.get("Authorization", "")
+        if hmac.compare_digest(authorization.encode(), ("Bearer " + self.token).encode()):
+            return True
+        # The body of the request is not read, the connection can not be reused.
+        self.close_connection = True
+        self._send_json(401, {"error": "The token of the daemon is missing or wrong."})
+        return False
+
+    def do_GET(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if parts == ["status"]:
+            return self._send_json(200, self.daemon.status())
+        if len(parts) == 2 and parts[0] == "jobs" and parts[1].isdigit():
+            job = self.daemon.get(int(parts[1]))
+            if job is None:
+                return self._send_json(404, {"error": "The job %s does not exist." % parts[1]})
+            try:
+                wait = self._parse_wait(query)
+            except ValueError as e:
+                return self._send_json(400, {"error": str(e)})
+            if wait is not None:
+                job.done.wait(wait or None)
+            return self._send_json(200, job.to_dict())
+        self._send_json(404, {"error": "Not found."})
+
+    def do_POST(self):
+        if not self._authorized():
+            return
+        url = urlparse(self.path)
+        if url.path.strip("/") != "jobs":
+            return self._send_json(404, {"error": "Not found."})
+        try:
+            data = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"null")
+            # The query is checked before the job is queued, so that a bad request does not run it.
+            wait = self._parse_wait(parse_qs(url.query))
+            job = self.daemon.submit(data)
+        except ValueError as e:
+            return self._send_json(400, {"error": str(e)})
+        if wait is not None:
+            job.done.wait(wait or None)
+        self._send_json(200 if job.done.is_set() else 202, job.to_dict())
+
+
+class UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # The handlers expect the (host, port) of the client.
+        return request, ("unix", 0)
+
+
+def make_server(daemon: Daemon, socket_path: str = None, host: str = "127.0.0.1", port: int = 0,
+                token: str = None):
+    """
+    Create the server of the daemon, on a Unix socket if socket_path is given, otherwise on a TCP port.
+    The caller runs it with `serve_forever`.
+
+    The Unix socket is only accessible to its owner. A TCP port is accessible to every user of the host, or
+    of the network, so the requests to it must carry the token.
+    :raise ValueError: If a TCP server has no token.
+    """
+    if socket_path is None and not token:
+        raise ValueError("A daemon listening on a TCP port needs a token.")
+    handler = type("Handler", (DaemonRequestHandler,), {"daemon": daemon, "token": token})
+    if socket_path is not None:
+        if os.path.exists(socket_path):
+            # A socket left by a daemon which has not been shut down cleanly.
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                os.unlink(socket_path)
+            else:
+                raise OSError("A daemon is listening on %s already." % socket_path)
+            finally:
+                probe.close()
+        directory = os.path.dirname(os.path.abspath(socket_path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        # The socket is created with the mode 0600, there is no moment at which other users could connect.
+        umask = os.umask(0o177)
+        try:
+            return UnixHTTPServer(socket_path, handler)
+        finally:
+            os.umask(umask)
+    return ThreadingHTTPServer((host, port), handler)
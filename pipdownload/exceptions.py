@@ -61,3 +61,14 @@ class HashMismatch(Exception):
             )
             prefix = "    or"
         return "\n".join(lines)
+
+
+class MetadataResolutionError(Exception):
+    """
+    The packages can not be resolved with the metadata published by the index, for example the metadata
+    of a file is not available or two requirements conflict with each other.
+    """
+
+
+class IndexPageNotCached(Exception):
+    """An index page is requested in offline mode but it is not in the index cache."""
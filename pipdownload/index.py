@@ -0,0 +1,587 @@
+import codecs
+import hashlib
+import html
+import itertools
+import json
+import logging
+import os
+import posixpath
+import re
+import threading
+import time
+import urllib
+from collections import OrderedDict
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from urllib.parse import unquote
+from urllib.parse import urljoin
+from urllib.parse import urlparse
+from urllib.parse import urlunparse
+
+from packaging.utils import InvalidSdistFilename
+from packaging.utils import InvalidWheelFilename
+from packaging.utils import canonicalize_name
+from packaging.utils import parse_sdist_filename
+from packaging.utils import parse_wheel_filename
+from packaging.version import InvalidVersion
+from packaging.version import Version
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.stats import stats
+
+logger = logging.getLogger(__name__)
+
+# The size of the pieces an index page is read and parsed in.
+CHUNK_SIZE = 64 * 1024
+
+# The content types of the simple API (PEP 691). JSON is preferred, the HTML of PEP 503 is the fallback
+# of indexes which do not support content negotiation.
+SIMPLE_JSON = "application/vnd.pypi.simple.v1+json"
+SIMPLE_HTML = "application/vnd.pypi.simple.v1+html"
+ACCEPT_HEADER = "%s, %s;q=0.2, text/html;q=0.01" % (SIMPLE_JSON, SIMPLE_HTML)
+
+
+def make_absolute(link, base_url):
+    parsed = urlparse(link)._asdict()
+    # If link is relative, then join it with base_url.
+    if not parsed["netloc"]:
+        return urljoin(base_url, link)
+
+    # Link is absolute; if it lacks a scheme, add one from base_url.
+    if not parsed["scheme"]:
+        parsed["scheme"] = urlparse(base_url).scheme
+
+        # Reconstruct the URL to incorporate the new scheme.
+        parsed = (v for v in parsed.values())
+        return urlunparse(parsed)
+    return link
+
+
+def url_to_file_name(url: str) -> str:
+    """Return the unquoted name of the file a url points to."""
+    return posixpath.basename(unquote(urlparse(url).path))
+
+
+def mkurl_pypi_url(url, project_name):
+    loc = posixpath.join(url, urllib.parse.quote(canonicalize_name(project_name)))
+    # For maximum compatibility with easy_install, ensure the path
+    # ends in a trailing slash.  Although this isn't in the spec
+    # (and PyPI can handle it without the slash) some other index
+    # implementations might break if they relied on easy_install's
+    # behavior.
+    if not loc.endswith("/"):
+        loc = loc + "/"
+    return loc
+
+
+def parse_filename(filename: str) -> Optional[tuple]:
+    """
+    Parse the name, version and tags of a wheel or a source package.
+    :return: A tuple of (name, version, tags), tags is None for a source package. None is returned when the file
+        is neither a wheel nor a source package.
+    """
+    try:
+        if filename.endswith(".whl"):
+            name, version, _, tags = parse_wheel_filename(filename)
+            return name, version, tags
+        if filename.endswith((".tar.gz", ".zip")):
+            name, version = parse_sdist_filename(filename)
+            return name, version, None
+    except (InvalidWheelFilename, InvalidSdistFilename, InvalidVersion):
+        pass
+    return None
+
+
+class Link:
+    """A file listed on the simple index page of a project.
+
+    Attributes:
+        filename
+            The name of the file.
+        url
+            The absolute url of the file, including the hash fragment if there is one.
+        requires_python
+            The value of `data-requires-python`, or None.
+        yanked
+            Whether the file has been yanked.
+        metadata
+            The value of `data-core-metadata` (PEP 714) or `data-dist-info-metadata` (PEP 658), like
+            'true' or 'sha256=...', or None if the index does not serve the metadata of the file.
+        size
+            The size of the file in bytes, which is only given by JSON pages (PEP 700), or None.
+    """
+
+    def __init__(self, filename, url, requires_python=None, yanked=False, metadata=None, size=None):
+        self.filename = filename
+        self.url = url
+        self.requires_python = requires_python
+        self.yanked = yanked
+        self.metadata = metadata
+        self.size = size
+
+    def __repr__(self):
+        return "{}<{!r}>".format(self.__class__.__name__, self.url)
+
+    @property
+    def url_without_fragment(self) -> str:
+        return self.url.split("#", 1)[0]
+
+    @property
+    def hash(self) -> Optional[Tuple[str, str]]:
+        """Return the (hash_algo, hash_value) in the url fragment, or None if there is not one."""
+        fragment = urlparse(self.url).fragment
+        if "=" not in fragment:
+            return None
+        hash_algo, hash_value = fragment.split("=", 1)
+        return hash_algo, hash_value
+
+    @property
+    def metadata_url(self) -> Optional[str]:
+        if self.metadata is None or self.metadata.lower() == "false":
+            return None
+        return self.url_without_fragment + ".metadata"
+
+    @property
+    def metadata_hash(self) -> Optional[tuple]:
+        """Return the (hash_algo, hash_value) of the metadata file if the index gives one."""
+        if self.metadata is None or "=" not in self.metadata:
+            return None
+        hash_algo, hash_value = self.metadata.split("=", 1)
+        return hash_algo, hash_value
+
+
+# An anchor and its text. Quoted attribute values may contain '>', and every alternative starts with a
+# different character, so the pattern never backtracks.
+ANCHOR_PATTERN = re.compile(r"""<a\s((?:[^>"']|"[^"]*"|'[^']*')*)>([^<]*)</a\s*>""", re.IGNORECASE)
+ATTRIBUTE_PATTERN = re.compile(r"""([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>"']+)))?""")
+
+
+def _unescape(value: str) -> str:
+    return html.unescape(value) if "&" in value else value
+
+
+def parse_anchor(attributes: str, base_url: str) -> Optional[Link]:
+    """Build a `Link` from the attributes of an anchor, or return None if it has no href."""
+    attrs = {}
+    for match in ATTRIBUTE_PATTERN.finditer(attributes):
+        name, double_quoted, single_quoted, unquoted = match.groups()
+        value = double_quoted if double_quoted is not None else single_quoted
+        if value is None:
+            value = unquoted if unquoted is not None else ""
+        attrs[name.lower()] = _unescape(value)
+    href = attrs.get("href", "").strip()
+    if not href:
+        return None
+    url = make_absolute(href, base_url)
+    return Link(
+        url_to_file_name(url),
+        url,
+        requires_python=attrs.get("data-requires-python"),
+        yanked="data-yanked" in attrs,
+        metadata=attrs.get("data-core-metadata", attrs.get("data-dist-info-metadata")),
+    )
+
+
+def iter_links(chunks: Iterable[str], base_url: str, contains: str = None) -> Iterator[Link]:
+    """
+    Parse an index page incrementally.
+    :param chunks: The text of the page, in pieces of any size.
+    :param base_url: The url of the page.
+    :param contains: When it is given, only the anchors whose text contains it are parsed, the others are
+        skipped without looking at their attributes.
+    :return: An iterator of `Link`, every link is yielded as soon as its anchor has been received.
+    """
+    buffer = ""
+    for chunk in itertools.chain(chunks, (None,)):
+        if chunk is not None:
+            buffer += chunk
+        end = 0
+        for match in ANCHOR_PATTERN.finditer(buffer):
+            end = match.end()
+            attributes, text = match.groups()
+            if contains is not None and contains not in _unescape(text):
+                continue
+            link = parse_anchor(attributes, base_url)
+            if link is not None:
+                yield link
+        # Keep only the anchor which has not been completely received yet.
+        start = max(buffer.rfind("<a", end), buffer.rfind("<A", end))
+        if start != -1:
+            buffer = buffer[start:]
+        else:
+            buffer = buffer[-1:] if buffer.endswith("<") else ""
+
+
+def parse_links(html_doc: str, base_url: str) -> List[Link]:
+    return list(iter_links((html_doc,), base_url))
+
+
+def _json_metadata(value) -> Optional[str]:
+    """Convert the `core-metadata` of a PEP 691 file into the form of the `data-core-metadata` attribute."""
+    if value is None or value is False:
+        return None
+    if isinstance(value, dict) and value:
+        hash_algo = "sha256" if "sha256" in value else sorted(value)[0]
+        return "%s=%s" % (hash_algo, value[hash_algo])
+    return "true"
+
+
+def iter_json_links(text: str, base_url: str, contains: str = None) -> Iterator[Link]:
+    """
+    Parse an index page of the JSON simple API (PEP 691).
+    :param text: The text of the page.
+    :param base_url: The url of the page, relative file urls are resolved against it.
+    :param contains: When it is given, only the files whose names contain it are yielded.
+    :return: An iterator of `Link`, the same as the ones parsed from the HTML page.
+    """
+    for file in json.loads(text).get("files", ()):
+        filename = file.get("filename")
+        if not filename or (contains is not None and contains not in filename):
+            continue
+        url = make_absolute(file["url"], base_url)
+        hashes = file.get("hashes") or {}
+        if "#" not in url and hashes:
+            hash_algo = "sha256" if "sha256" in hashes else sorted(hashes)[0]
+            url = "%s#%s=%s" % (url, hash_algo, hashes[hash_algo])
+        requires_python = file.get("requires-python")
+        metadata = file.get("core-metadata", file.get("dist-info-metadata"))
+        yield Link(
+            filename,
+            url,
+            requires_python=requires_python or None,
+            yanked=bool(file.get("yanked")),
+            metadata=_json_metadata(metadata),
+            size=file.get("size"),
+        )
+
+
+def _content_type(meta: dict) -> str:
+    # Pages cached before JSON was negotiated have no content type, they are all HTML.
+    return meta.get("content_type") or "text/html"
+
+
+class IndexCache:
+    """A size-bounded on-disk cache of index pages.
+
+    Every page is stored as two files named after the sha256 of its url: `<key>.body` holds the
+    content and `<key>.json` holds the url, the validators (`ETag`, `Last-Modified`) and the time
+    it was fetched. A page younger than `ttl` is served without any request, an older one is
+    revalidated with a conditional request. When the cache grows over `max_size`, the least
+    recently used pages are evicted.
+    """
+
+    def __init__(self, directory: str, max_size: int, ttl: int) -> None:
+        """
+        :param directory: The cache directory.
+        :param max_size: The maximum size of the cache in bytes.
+        :param ttl: The number of seconds a page is served without revalidation.
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.ttl = ttl
+        # The size of the cache, counted once when the first page is stored and kept up to date by every write,
+        # so that the directory is only scanned again when the cache is over max_size.
+        self._size = None
+        self._lock = threading.Lock()
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode("utf8")).hexdigest()
+        return (
+            os.path.join(self.directory, key + ".json"),
+            os.path.join(self.directory, key + ".body"),
+        )
+
+    def get(self, url: str) -> Optional[Tuple[dict, bytes]]:
+        """Return the (meta, content) of a cached page, or None if it is not cached."""
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        # The modification time of the meta file is the last access time used for eviction.
+        os.utime(meta_path)
+        return meta, content
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> int:
+        """Replace the file at path with data at once, so that a reader never sees it half written."""
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        temp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return len(data) - old_size
+
+    def set(self, url: str, meta: dict, content: bytes) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        meta_path, body_path = self._paths(url)
+        with self._lock:
+            if self._size is None:
+                self._size = self._scan()[1]
+        grown = self._write(body_path, content) + self._write(meta_path, json.dumps(meta).encode("utf8"))
+        with self._lock:
+            self._size += grown
+            if self._size > self.max_size:
+                self.evict()
+
+    def touch(self, url: str, meta: dict) -> None:
+        """Update the meta of a cached page after it has been revalidated."""
+        meta_path, _ = self._paths(url)
+        grown = self._write(meta_path, json.dumps(meta).encode("utf8"))
+        with self._lock:
+            if self._size is not None:
+                self._size += grown
+
+    def _scan(self) -> Tuple[List[Tuple[float, int, str, str]], int]:
+        """Return the (last access time, size, meta path, body path) of every page, and their total size."""
+        entries = []
+        total_size = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            body_path = meta_path[: -len(".json")] + ".body"
+            try:
+                size = os.path.getsize(meta_path) + os.path.getsize(body_path)
+                entries.append((os.path.getmtime(meta_path), size, meta_path, body_path))
+            except OSError:
+                continue
+            total_size += size
+        return entries, total_size
+
+    def evict(self) -> None:
+        """
+        Remove the least recently used pages until the cache fits in max_size. A tenth of max_size is freed
+        besides, so that the next writes do not scan the cache again.
+        """
+        entries, total_size = self._scan()
+        entries.sort()
+        for _, size, meta_path, body_path in entries:
+            if total_size <= self.max_size * 0.9:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            total_size -= size
+        self._size = total_size
+
+
+class IndexClient:
+    """Fetch the simple index pages of projects, through an optional `IndexCache`."""
+
+    def __init__(self, session, index_url: str, cache: IndexCache = None, offline: bool = False) -> None:
+        """
+        :param session: The session used to request the index.
+        :param index_url: The index url.
+        :param cache: The on-disk cache of index pages.
+        :param offline: When it is true, pages are served from the cache only and never requested.
+        """
+        self.session = session
+        self.index_url = index_url
+        self.cache = cache
+        self.offline = offline
+
+    def is_cached(self, project_name: str) -> bool:
+        """Return whether the index page of a project is in the cache, so that it can be served offline."""
+        return self.cache is not None and self.cache.get(mkurl_pypi_url(self.index_url, project_name)) is not None
+
+    def get_page(self, project_name: str) -> Tuple[str, str]:
+        """
+        Get the index page of a project.
+        :return: A tuple of the text and the url of the page.
+        """
+        chunks, url, _ = self.open_page(project_name)
+        return "".join(chunks), url
+
+    def open_page(self, project_name: str) -> Tuple[Iterator[str], str, str]:
+        """
+        Open the index page of a project, its body is streamed instead of being read at once.
+
+        The JSON page of PEP 691 is requested, the index answers with the HTML page if it does not
+        support it.
+        :return: A tuple of an iterator over the decoded text of the page, the url of the page and its
+            content type.
+        """
+        url = mkurl_pypi_url(self.index_url, project_name)
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None:
+            meta, content = cached
+            if self.offline or time.time() - meta["fetched_at"] < self.cache.ttl:
+                stats.count("index.cache_hits")
+                return self._iter_cached(meta, content), meta["url"], _content_type(meta)
+        elif self.offline:
+            raise IndexPageNotCached("The index page %s is not in the index cache." % url)
+
+        headers = {"Accept": ACCEPT_HEADER}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        with stats.timer("index.request"):
+            response = self.session.get(url, headers=headers, stream=True)
+        if cached is not None and response.status_code == 304:
+            stats.count("index.revalidated")
+            logger.debug("The cached index page %s is still valid." % url)
+            response.close()
+            meta["fetched_at"] = time.time()
+            self.cache.touch(url, meta)
+            return self._iter_cached(meta, content), meta["url"], _content_type(meta)
+        response.raise_for_status()
+        stats.count("index.fetched")
+        content_type = response.headers.get("Content-Type", "text/html").split(";", 1)[0].strip().lower()
+        return self._iter_response(url, response, content_type), response.url or url, content_type
+
+    def _iter_response(self, url: str, response, content_type: str) -> Iterator[str]:
+        encoding = response.encoding or "utf-8"
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        body = bytearray() if self.cache is not None else None
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if body is not None:
+                body.extend(chunk)
+            yield decoder.decode(chunk)
+        yield decoder.decode(b"", final=True)
+        if self.cache is not None:
+            meta = {
+                "url": response.url or url,
+                "encoding": encoding,
+                "content_type": content_type,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self.cache.set(url, meta, bytes(body))
+
+    @staticmethod
+    def _iter_cached(meta: dict, content: bytes) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder(meta.get("encoding") or "utf-8")(errors="replace")
+        for start in range(0, len(content), CHUNK_SIZE):
+            yield decoder.decode(content[start:start + CHUNK_SIZE])
+        yield decoder.decode(b"", final=True)
+
+    def iter_links(self, project_name: str, contains: str = None) -> Iterator[Link]:
+        """
+        Yield the files of a project listed on the index, whether the page is JSON or HTML. The links
+        of an HTML page are yielded while the page is being received.
+        :param contains: When it is given, the files whose names do not contain it may be skipped.
+        """
+        chunks, url, content_type = self.open_page(project_name)
+        if content_type == SIMPLE_JSON:
+            return iter_json_links("".join(chunks), url, contains=contains)
+        return iter_links(chunks, url, contains=contains)
+
+    def get_links(self, project_name: str) -> List[Link]:
+        """Get all of the files of a project listed on the index."""
+        return list(self.iter_links(project_name))
+
+    def get_metadata(self, link: Link) -> bytes:
+        """
+        Get the core metadata of a file published by the index (PEP 658), through the cache like the index
+        pages. The metadata of a file never changes, so a cached one with a hash is used without being revalidated.
+        :raise IndexPageNotCached: If the index is offline and the metadata is not in the cache.
+        """
+        url = link.metadata_url
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None:
+            meta, content = cached
+            if self.offline or link.metadata_hash is not None or time.time() - meta["fetched_at"] < self.cache.ttl:
+                stats.count("index.cache_hits")
+                return content
+        elif self.offline:
+            raise IndexPageNotCached("The metadata %s is not in the index cache." % url)
+
+        headers = {}
+        if cached is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        response = self.session.get(url, headers=headers)
+        if cached is not None and response.status_code == 304:
+            stats.count("index.revalidated")
+            meta["fetched_at"] = time.time()
+            self.cache.touch(url, meta)
+            return content
+        response.raise_for_status()
+        if self.cache is not None:
+            meta = {
+                "url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "fetched_at": time.time(),
+            }
+            self.cache.set(url, meta, response.content)
+        return response.content
+
+
+class ProjectIndex:
+    """The files of the projects needed by one run, grouped by version.
+
+    The page of a project is fetched and parsed the first time the project is looked up, later
+    lookups of any of its versions are answered from memory. Files whose names can not be parsed
+    are kept in every version, so that callers can still match them by other means.
+
+    It is shared by threads: every project has a lock, so a page looked up by several threads at once
+    is fetched only once.
+    """
+
+    def __init__(self, client: IndexClient) -> None:
+        self.client = client
+        self._projects = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _get_project(self, project_name: str) -> Tuple[List[Link], Dict[Optional[Version], List[Link]]]:
+        key = canonicalize_name(project_name)
+        project = self._projects.get(key)
+        if project is not None:
+            return project
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            project = self._projects.get(key)
+            if project is None:
+                # The body of the page is read while it is parsed.
+                with stats.timer("index.read_and_parse"):
+                    links = self.client.get_links(project_name)
+                versions = OrderedDict()
+                for link in links:
+                    parsed = parse_filename(link.filename)
+                    versions.setdefault(parsed[1] if parsed is not None else None, []).append(link)
+                project = self._projects[key] = (links, versions)
+        return project
+
+    def __len__(self) -> int:
+        """The number of projects looked up."""
+        return len(self._projects)
+
+    def get_links(self, project_name: str, version: str = None) -> List[Link]:
+        """
+        Get the files of a project.
+        :param version: When it is given, only the files of this version, and the files whose version is
+            unknown, are returned.
+        """
+        links, versions = self._get_project(project_name)
+        if version is None:
+            return links
+        try:
+            version = Version(version)
+        except InvalidVersion:
+            return links
+        return versions.get(version, []) + versions.get(None, [])
+
+    def get_versions(self, project_name: str) -> List[str]:
+        """Get the versions of a project, in the order of the index page."""
+        _, versions = self._get_project(project_name)
+        return [str(version) for version in versions if version is not None]
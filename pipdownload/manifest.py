@@ -0,0 +1,66 @@
+import json
+from typing import Iterable
+from typing import List
+
+from pipdownload.index import Link
+from pipdownload.tags import parse_wheel_tags
+
+
+def make_entry(name: str, version: str, link: Link) -> dict:
+    """
+    Describe a file to be downloaded.
+    :return: A dict with the keys name, version, filename, url, hash, sha256, size and tags. The url has no hash
+        fragment, hash is the `<hash_algo>=<hash_value>` given by the index whatever its algorithm, sha256 is
+        its value when it is a sha256, they and size are None if the index does not give them, and tags is
+        None for a source package.
+    """
+    link_hash = link.hash
+    tags = parse_wheel_tags(link.filename)
+    return {
+        "name": name,
+        "version": version,
+        "filename": link.filename,
+        "url": link.url_without_fragment,
+        "hash": "%s=%s" % link_hash if link_hash is not None else None,
+        "sha256": link_hash[1] if link_hash is not None and link_hash[0] == "sha256" else None,
+        "size": link.size,
+        "tags": sorted(str(tag) for tag in tags) if tags is not None else None,
+    }
+
+
+def entry_url(entry: dict) -> str:
+    """Return the url of a manifest entry, with its hash as the fragment so that it is verified when downloaded."""
+    url = entry["url"]
+    if "#" in url:
+        return url
+    if entry.get("hash"):
+        return "%s#%s" % (url, entry["hash"])
+    if entry.get("sha256"):
+        return "%s#sha256=%s" % (url, entry["sha256"])
+    return url
+
+
+def write_manifest(path: str, entries: Iterable[dict]) -> None:
+    """Write a manifest, as JSON Lines if path ends with '.jsonl' and as a JSON list otherwise."""
+    with open(path, "w", encoding="utf8") as f:
+        if path.endswith(".jsonl"):
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        else:
+            json.dump(list(entries), f, indent=2)
+            f.write("\n")
+
+
+def read_manifest(path: str) -> List[dict]:
+    """
+    Read a manifest written by `write_manifest`.
+    :raise ValueError: If the manifest is not valid JSON or an entry has no url.
+    """
+    with open(path, "r", encoding="utf8") as f:
+        if path.endswith(".jsonl"):
+            entries = [json.loads(line) for line in f if line.strip()]
+        else:
+            entries = json.load(f)
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) and entry.get("url") for entry in entries):
+        raise ValueError("The manifest %s is not a list of files with urls." % path)
+    return entries
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# The name of the sidecar index kept in a destination directory.
+INDEX_FILE_NAME = ".pip-download-index.json"
+
+
+class MirrorIndex:
+    """A sidecar index of the files in a destination directory, to sync it incrementally.
+
+    For every file the index records its size, its modification time in nanoseconds and its sha256, as
+    they were when the file was downloaded or last verified. A file whose size and modification time
+    have not changed is known to have the recorded sha256 without being read, so only the files changed
+    since the last run are hashed again.
+    """
+
+    def __init__(self, dest_dir: str) -> None:
+        self.path = os.path.join(dest_dir, INDEX_FILE_NAME)
+        self._lock = threading.Lock()
+        self._files = self._load()
+        self._previous = set(self._files)
+        self.added = set()
+        self.unchanged = set()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf8") as f:
+                return json.load(f)["files"]
+        except (OSError, ValueError, KeyError, TypeError):
+            return {}
+
+    def check(self, file_path: str, sha256: str) -> Optional[bool]:
+        """
+        Check an existing file against the index, without reading it.
+        :return: True if the file has not changed since it was recorded with this sha256, False if it has not
+            changed but was recorded with another sha256, None if it is not recorded or has changed.
+        """
+        file_name = os.path.basename(file_path)
+        with self._lock:
+            entry = self._files.get(file_name)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        if stat.st_size != entry["size"] or stat.st_mtime_ns != entry["mtime_ns"]:
+            return None
+        if entry["sha256"] != sha256:
+            return False
+        with self._lock:
+            self.unchanged.add(file_name)
+        return True
+
+    def record(self, file_path: str, sha256: str, added: bool = True) -> None:
+        """
+        Record a file whose sha256 has been verified.
+        :param added: Whether the file has been added to the directory by this run, or is an existing file
+            which has been verified again.
+        """
+        file_name = os.path.basename(file_path)
+        stat = os.stat(file_path)
+        with self._lock:
+            self._files[file_name] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+            (self.added if added else self.unchanged).add(file_name)
+
+    def recorded(self) -> Dict[str, str]:
+        """Return a dict of the recorded file names pointing to their sha256."""
+        with self._lock:
+            return {name: entry["sha256"] for name, entry in self._files.items()}
+
+    def removed(self, file_names: Iterable[str]) -> set:
+        """Return the files recorded by previous runs which are not among file_names, the files of this run."""
+        return self._previous - set(file_names)
+
+    def save(self) -> None:
+        """Write the index, forgetting the files which do not exist anymore."""
+        directory = os.path.dirname(self.path)
+        with self._lock:
+            files = {
+                name: entry for name, entry in self._files.items() if os.path.exists(os.path.join(directory, name))
+            }
+            temp_path = "%s.%d.%d.tmp" % (self.path, os.getpid(), threading.get_ident())
+            with open(temp_path, "w", encoding="utf8") as f:
+                json.dump({"files": files}, f, indent=0, sort_keys=True)
+            os.replace(temp_path, self.path)
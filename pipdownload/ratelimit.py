@@ -0,0 +1,112 @@
+import re
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+RATE_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*([kmg]?)i?b?", re.IGNORECASE)
+RATE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+# The longest delay asked by a `Retry-After` header which is honoured, a longer one is cut to it.
+MAX_RETRY_AFTER = 300
+
+
+def parse_rate(text: str) -> float:
+    """
+    Parse a rate in bytes per second like `500K`, `20M` or `1.5G`, with the binary units of curl's
+    `--limit-rate`.
+    :raise ValueError: If the rate can not be parsed or is not positive.
+    """
+    match = RATE_PATTERN.fullmatch(text.strip())
+    if match is None or float(match.group(1)) <= 0:
+        raise ValueError("The rate %r is not like '500K', '20M' or '1.5G'." % text)
+    return float(match.group(1)) * RATE_UNITS[match.group(2).lower()]
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the delay in seconds of a `Retry-After` header, given in seconds or as an HTTP date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at is None:
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+class TokenBucket:
+    """A token bucket shared by threads, refilled with rate tokens per second up to burst tokens.
+
+    A consumer takes the tokens it needs right away, even if the bucket goes into debt, and then sleeps
+    until the debt is paid back. So chunks larger than the burst are allowed, and concurrent consumers
+    are served in the order they come while their total never exceeds the rate.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None) -> None:
+        """
+        :param rate: The number of tokens added per second.
+        :param burst: The maximum number of tokens kept in the bucket. Defaults to one second of tokens.
+        """
+        self.rate = rate
+        self.burst = rate if burst is None else burst
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """Take amount tokens and return the number of seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def consume(self, amount: float = 1) -> None:
+        """Take amount tokens, waiting until they are available."""
+        delay = self.reserve(amount)
+        if delay > 0:
+            time.sleep(delay)
+
+
+class HostRateLimiter:
+    """Limit the requests sent to every host, shared by all threads using a session.
+
+    Every host has its own `TokenBucket` of rate requests per second. A host which answers `429 Too Many
+    Requests` can be paused, then every request to it waits until the pause is over.
+    """
+
+    def __init__(self, rate: Optional[float] = None) -> None:
+        """
+        :param rate: The maximum number of requests per second sent to one host, None for no limit.
+        """
+        self.rate = rate
+        self._buckets = {}
+        self._paused_until = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host: str) -> None:
+        """Wait until a request can be sent to host."""
+        with self._lock:
+            paused_until = self._paused_until.get(host, 0.0)
+            bucket = None
+            if self.rate is not None:
+                bucket = self._buckets.get(host)
+                if bucket is None:
+                    # Allow a burst of one second of requests, but at least one request.
+                    bucket = self._buckets[host] = TokenBucket(self.rate, max(self.rate, 1))
+        delay = paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if bucket is not None:
+            bucket.consume()
+
+    def pause(self, host: str, seconds: float) -> None:
+        """Hold the requests to host for the next seconds."""
+        with self._lock:
+            until = time.monotonic() + seconds
+            self._paused_until[host] = max(self._paused_until.get(host, 0.0), until)
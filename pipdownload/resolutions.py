@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
+from packaging.tags import sys_tags
+from packaging.utils import canonicalize_name
+
+
+def normalize_requirement(requirement: str) -> str:
+    """Return the canonical form of a requirement, so that equivalent specifiers are cached once."""
+    try:
+        parsed = Requirement(requirement)
+    except InvalidRequirement:
+        return requirement.strip()
+    parsed.name = canonicalize_name(parsed.name)
+    return str(parsed)
+
+
+class ResolutionCache:
+    """An on-disk cache of the resolutions of requirement sets, shared by all runs.
+
+    A resolution is keyed by the sha256 of the normalized requirements, the targets they are resolved
+    for, the index url and the resolver with its options, and it is stored as `<key>.json` with the
+    resolved files, which pin the (name, version) of every package, and the time it was resolved. A
+    resolution older than `ttl` is resolved again, as newer versions may have been released since.
+    """
+
+    def __init__(self, directory: str, ttl: int) -> None:
+        """
+        :param directory: The cache directory.
+        :param ttl: The number of seconds a resolution is reused.
+        """
+        self.directory = directory
+        self.ttl = ttl
+
+    @staticmethod
+    def key(requirements: Iterable[str], targets: Iterable[str], index_url: str, resolver: str = "metadata",
+            options: Iterable[str] = ()) -> str:
+        """
+        Return the key of a resolution.
+        :param targets: The specs of the targets, see `Target`. When there is none, the packages are resolved
+            for the running interpreter, whose most specific tag is used instead.
+        :param resolver: The resolver, see '--resolver', as they do not resolve the same files.
+        :param options: The other options which change the resolved files, like the pip options `--no-deps`
+            or `--prefer-binary`, in their order on the command line.
+        """
+        data = {
+            "requirements": sorted({normalize_requirement(requirement) for requirement in requirements}),
+            "targets": sorted(targets) or [str(next(iter(sys_tags())))],
+            "index_url": index_url.rstrip("/"),
+            "resolver": resolver,
+            "options": list(options),
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + ".json")
+
+    def get(self, key: str, expired: bool = False) -> Optional[List[Tuple[str, Optional[str]]]]:
+        """
+        Return the resolved files of a resolution, each with the spec of the target it is resolved for, or
+        None if it is not cached.
+        :param expired: Whether a resolution older than ttl is returned too, when the index can not be reached.
+        """
+        try:
+            with open(self._path(key), "r", encoding="utf8") as f:
+                entry = json.load(f)
+            resolved = entry["resolved"]
+            if not expired and time.time() - entry["time"] > self.ttl:
+                return None
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        return [(file_name, target) for file_name, target in resolved]
+
+    def set(self, key: str, resolved: Iterable[Tuple[str, Optional[str]]], requirements: Iterable[str] = ()) -> None:
+        """
+        Store a resolution.
+        :param resolved: The resolved files, each with the spec of its target or None.
+        :param requirements: The requirements resolved, they are stored for reference only.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        entry = {"time": time.time(), "requirements": list(requirements), "resolved": list(resolved)}
+        temp_path = "%s.%d.%d.tmp" % (path, os.getpid(), threading.get_ident())
+        with open(temp_path, "w", encoding="utf8") as f:
+            json.dump(entry, f)
+        os.replace(temp_path, path)
+        self.prune()
+
+    def invalidate(self, key: str) -> None:
+        try:
+            os.unlink(self._path(key))
+        except OSError:
+            pass
+
+    def prune(self) -> None:
+        """Remove the resolutions which have been expired for another ttl."""
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if now - os.path.getmtime(path) > 2 * self.ttl:
+                    os.unlink(path)
+            except OSError:
+                continue
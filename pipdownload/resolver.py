@@ -0,0 +1,181 @@
+import hashlib
+import logging
+from collections import OrderedDict
+from collections import deque
+from email.parser import HeaderParser
+from typing import Dict
+from typing import List
+
+from packaging.markers import default_environment
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
+from packaging.specifiers import InvalidSpecifier
+from packaging.specifiers import SpecifierSet
+from packaging.tags import sys_tags
+from packaging.utils import canonicalize_name
+from pipdownload.exceptions import MetadataResolutionError
+from pipdownload.index import IndexClient
+from pipdownload.index import Link
+from pipdownload.index import ProjectIndex
+from pipdownload.index import parse_filename
+from pipdownload.stats import stats
+
+logger = logging.getLogger(__name__)
+
+
+def _is_pinned(requirement: Requirement) -> bool:
+    return any(specifier.operator in ("==", "===") for specifier in requirement.specifier)
+
+
+class MetadataResolver:
+    """Resolve packages with the core metadata served by the index (PEP 658/PEP 714).
+
+    Only the `.metadata` files of the selected distributions are fetched, so no package is
+    downloaded just to learn its dependencies. The resolver pins the newest version allowed by
+    the first requirement it meets for a project and does not backtrack: when the metadata of a
+    distribution is not available or two requirements conflict, `MetadataResolutionError` is
+    raised and the caller should fall back to pip.
+    """
+
+    def __init__(
+        self,
+        index: IndexClient,
+        environment: Dict[str, str] = None,
+        tags=None,
+        projects: ProjectIndex = None,
+        require_tags: bool = False,
+    ):
+        """
+        :param index: The client used to request the index.
+        :param environment: The environment used to evaluate markers. Defaults to the current interpreter.
+        :param tags: The wheel tags preferred when choosing a distribution. Defaults to the current interpreter.
+        :param projects: The project index of the run, so that the pages fetched for the resolution are reused.
+        :param require_tags: Whether the wheels without any of the tags are ignored, so that only the versions
+            which can be installed with these tags are selected.
+        """
+        self.index = index
+        self.projects = ProjectIndex(index) if projects is None else projects
+        self.environment = default_environment() if environment is None else environment
+        self.tags = set(sys_tags()) if tags is None else set(tags)
+        self.require_tags = require_tags
+        self._requires_dist = {}
+
+    def resolve(self, packages: List[str]) -> List[str]:
+        """
+        Resolve the packages and their dependencies.
+        :param packages: The requirement specifiers of the packages.
+        :return: The names of the selected files, one for every resolved project.
+        """
+        pinned = OrderedDict()
+        extras = {}
+        queue = deque(self._parse_requirement(package) for package in packages)
+        while queue:
+            requirement = queue.popleft()
+            if requirement.marker is not None and not requirement.marker.evaluate(self.environment):
+                continue
+            if requirement.url:
+                raise MetadataResolutionError(
+                    "The requirement %s is a direct reference." % requirement
+                )
+            name = canonicalize_name(requirement.name)
+            if name in pinned:
+                version, link = pinned[name]
+                if not requirement.specifier.contains(version, prereleases=True):
+                    raise MetadataResolutionError(
+                        "The requirement %s conflicts with %s==%s." % (requirement, name, version)
+                    )
+                new_extras = set(requirement.extras) - extras[name]
+                if new_extras:
+                    extras[name] |= new_extras
+                    queue.extend(self._get_dependencies(link, new_extras))
+                continue
+
+            version, link = self._find_best_link(name, requirement)
+            logger.debug("Resolved %s to %s." % (requirement, link.filename))
+            pinned[name] = (version, link)
+            extras[name] = set(requirement.extras)
+            queue.extend(self._get_dependencies(link, {""} | extras[name]))
+        return [link.filename for version, link in pinned.values()]
+
+    @staticmethod
+    def _parse_requirement(requirement: str) -> Requirement:
+        try:
+            return Requirement(requirement)
+        except InvalidRequirement as e:
+            raise MetadataResolutionError(
+                "The requirement %s can not be parsed: %s" % (requirement, e)
+            )
+
+    def _python_compatible(self, link: Link) -> bool:
+        if not link.requires_python:
+            return True
+        try:
+            specifier = SpecifierSet(link.requires_python)
+        except InvalidSpecifier:
+            return True
+        return specifier.contains(self.environment["python_full_version"], prereleases=True)
+
+    def _find_best_link(self, name: str, requirement: Requirement) -> tuple:
+        candidates = {}
+        for link in self.projects.get_links(name):
+            parsed = parse_filename(link.filename)
+            if parsed is None or canonicalize_name(parsed[0]) != name:
+                continue
+            if link.yanked and not _is_pinned(requirement):
+                continue
+            if not self._python_compatible(link):
+                continue
+            if self.require_tags and parsed[2] is not None and self.tags.isdisjoint(parsed[2]):
+                continue
+            candidates.setdefault(parsed[1], []).append((link, parsed[2]))
+
+        versions = list(requirement.specifier.filter(candidates))
+        if not versions:
+            raise MetadataResolutionError("No version of %s satisfies %s." % (name, requirement))
+        version = max(versions)
+
+        def preference(candidate):
+            link, tags = candidate
+            return (
+                link.metadata_url is not None,
+                tags is not None and not self.tags.isdisjoint(tags),
+                tags is not None,
+            )
+
+        link, _ = max(candidates[version], key=preference)
+        if link.metadata_url is None:
+            raise MetadataResolutionError(
+                "The metadata of %s %s is not available on the index." % (name, version)
+            )
+        return version, link
+
+    def _get_requires_dist(self, link: Link) -> List[str]:
+        if link.url in self._requires_dist:
+            return self._requires_dist[link.url]
+        with stats.timer("resolve.metadata"):
+            content = self.index.get_metadata(link)
+        metadata_hash = link.metadata_hash
+        if metadata_hash is not None:
+            hash_algo, hash_value = metadata_hash
+            if hashlib.new(hash_algo, content).hexdigest() != hash_value:
+                raise MetadataResolutionError(
+                    "The metadata of %s does not match its hash." % link.filename
+                )
+        message = HeaderParser().parsestr(content.decode("utf8", errors="replace"))
+        requires_dist = message.get_all("Requires-Dist") or []
+        self._requires_dist[link.url] = requires_dist
+        return requires_dist
+
+    def _get_dependencies(self, link: Link, extras) -> List[Requirement]:
+        dependencies = []
+        for line in self._get_requires_dist(link):
+            requirement = self._parse_requirement(line)
+            if requirement.marker is None:
+                dependencies.append(requirement)
+                continue
+            for extra in extras:
+                if requirement.marker.evaluate(dict(self.environment, extra=extra)):
+                    requirement.marker = None
+                    dependencies.append(requirement)
+                    break
+        return dependencies
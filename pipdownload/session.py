@@ -0,0 +1,94 @@
+import logging
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from pipdownload.ratelimit import MAX_RETRY_AFTER
+from pipdownload.ratelimit import HostRateLimiter
+from pipdownload.ratelimit import parse_retry_after
+from pipdownload.stats import stats
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# The default (connect, read) timeout in seconds.
+DEFAULT_TIMEOUT = (10, 60)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """An `HTTPAdapter` which applies a default timeout to every request without one.
+
+    Every request waits for the `HostRateLimiter` of the adapter first. A `429 Too Many Requests` response
+    pauses its host for the delay of its `Retry-After` header, or an exponential backoff without one, and
+    the request is sent again, up to rate_limit_retries times.
+    """
+
+    def __init__(self, *args, timeout=DEFAULT_TIMEOUT, limiter: HostRateLimiter = None, rate_limit_retries: int = 3,
+                 backoff_factor: float = 0.5, **kwargs):
+        self.timeout = timeout
+        self.limiter = HostRateLimiter() if limiter is None else limiter
+        self.rate_limit_retries = rate_limit_retries
+        self.backoff_factor = backoff_factor
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        host = urlparse(request.url).netloc
+        for attempt in range(self.rate_limit_retries + 1):
+            self.limiter.acquire(host)
+            response = super().send(request, **kwargs)
+            if response.status_code != 429 or attempt == self.rate_limit_retries:
+                return response
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+            if delay is None:
+                delay = max(self.backoff_factor, 0.1) * 2 ** attempt
+            delay = min(delay, MAX_RETRY_AFTER)
+            stats.count("session.rate_limited")
+            logger.warning("%s is rate limited by %s, it is retried in %.1f s." % (request.url, host, delay))
+            response.close()
+            # The other requests to the host wait too.
+            self.limiter.pause(host, delay)
+
+
+def make_session(
+    pool_size: int = 10,
+    timeout=DEFAULT_TIMEOUT,
+    retries: int = 3,
+    backoff_factor: float = 0.5,
+    max_request_rate: Optional[float] = None,
+) -> requests.Session:
+    """
+    Create the session shared by index requests and file downloads.
+
+    Connections are kept alive and pooled per host, so files from the same host reuse the TCP and TLS
+    connections instead of opening new ones.
+    :param pool_size: The maximum number of connections kept for one host, it should be no less than the
+        number of concurrent downloads.
+    :param timeout: The default timeout in seconds, a number or a (connect, read) tuple.
+    :param retries: How many times a request is retried on connection errors, 5xx responses and 429 responses.
+    :param backoff_factor: The factor of the exponential backoff between retries.
+    :param max_request_rate: The maximum number of requests per second sent to one host by all threads
+        using the session, None for no limit.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=("GET", "HEAD"),
+        raise_on_status=False,
+    )
+    adapter = TimeoutHTTPAdapter(
+        timeout=timeout,
+        limiter=HostRateLimiter(max_request_rate),
+        rate_limit_retries=retries,
+        backoff_factor=backoff_factor,
+        max_retries=retry,
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
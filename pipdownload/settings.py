@@ -1,5 +1,23 @@
 import os
 
+from appdirs import user_cache_dir
 from appdirs import user_data_dir
 
 SETTINGS_FILE = os.path.join(user_data_dir("pipdownload", ""), "settings.json")
+
+# The defaults of the on-disk index page cache, they can be overridden by `index-cache-dir`,
+# `index-cache-size` (in MiB) and `index-cache-ttl` (in seconds) in the config file.
+INDEX_CACHE_DIR = os.path.join(user_cache_dir("pipdownload", ""), "index")
+INDEX_CACHE_SIZE = 256
+INDEX_CACHE_TTL = 600
+
+# The defaults of the on-disk resolution cache, they can be overridden by `resolution-cache-dir` and
+# `resolution-cache-ttl` (in seconds, 0 disables the cache) in the config file.
+RESOLUTION_CACHE_DIR = os.path.join(user_cache_dir("pipdownload", ""), "resolutions")
+RESOLUTION_CACHE_TTL = 3600
+
+# The default directory of the artifact store, it can be overridden by `store-dir` in the config file.
+STORE_DIR = os.path.join(user_cache_dir("pipdownload", ""), "store")
+
+# The default Unix socket of `pip-download serve` and `pip-download-client`.
+DAEMON_SOCKET = os.path.join(user_cache_dir("pipdownload", ""), "daemon.sock")
@@ -0,0 +1,107 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator
+from typing import List
+
+
+class Stats:
+    """Timers and counters of the stages of a run.
+
+    Every timed stage records its number of calls, total and maximum duration. When tracing is
+    enabled, every call is also kept as a complete event of the Chrome trace format, which can be
+    opened in chrome://tracing or Perfetto. All methods are thread-safe.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self, trace: bool = False) -> None:
+        """
+        Forget everything recorded.
+        :param trace: Whether every call of the timed stages is kept for `write_trace`.
+        """
+        with self._lock:
+            self.timers = OrderedDict()
+            self.counters = OrderedDict()
+            self.trace = trace
+            self._events = []
+            self._start = time.perf_counter()
+
+    @contextmanager
+    def timer(self, stage: str) -> Iterator[None]:
+        """Time the block as a call of stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start, start)
+
+    def add_time(self, stage: str, duration: float, start: float = None) -> None:
+        """
+        Record a call of stage.
+        :param duration: The duration of the call in seconds.
+        :param start: The `time.perf_counter` value when the call started. A call without it is not traced, it
+            is used for the time spent in many small pieces, like hashing the chunks of a file.
+        """
+        with self._lock:
+            timer = self.timers.get(stage)
+            if timer is None:
+                timer = self.timers[stage] = {"calls": 0, "total": 0.0, "max": 0.0}
+            timer["calls"] += 1
+            timer["total"] += duration
+            timer["max"] = max(timer["max"], duration)
+            if self.trace and start is not None:
+                self._events.append(
+                    {
+                        "name": stage,
+                        "ph": "X",
+                        "ts": (start - self._start) * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                    }
+                )
+
+    def count(self, counter: str, value: int = 1) -> None:
+        with self._lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "timers": {stage: dict(timer) for stage, timer in self.timers.items()},
+                "counters": dict(self.counters),
+            }
+
+    def summary(self) -> List[str]:
+        """Return the lines of a human readable report."""
+        data = self.to_dict()
+        lines = ["%-24s %8s %10s %10s %10s" % ("stage", "calls", "total s", "mean ms", "max ms")]
+        for stage, timer in data["timers"].items():
+            lines.append(
+                "%-24s %8d %10.3f %10.2f %10.2f"
+                % (stage, timer["calls"], timer["total"], timer["total"] / timer["calls"] * 1000, timer["max"] * 1000)
+            )
+        for counter, value in data["counters"].items():
+            lines.append("%-24s %8d" % (counter, value))
+        return lines
+
+    def write_json(self, path: str) -> None:
+        with open(path, "w", encoding="utf8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def write_trace(self, path: str) -> None:
+        """Write the calls recorded while tracing is enabled as a Chrome trace."""
+        with self._lock:
+            events = list(self._events)
+        with open(path, "w", encoding="utf8") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+# The stats of the current run.
+stats = Stats()
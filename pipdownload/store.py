@@ -0,0 +1,180 @@
+import errno
+import logging
+import os
+import shutil
+import threading
+from typing import List
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# The FICLONE ioctl of Linux, which makes `dest` share the extents of `src` on btrfs, xfs and so on.
+FICLONE = 0x40049409
+
+
+def reflink(src: str, dest: str) -> None:
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        try:
+            fcntl.ioctl(dest_file.fileno(), FICLONE, src_file.fileno())
+        except OSError:
+            dest_file.close()
+            os.unlink(dest)
+            raise
+
+
+def link_or_copy(src: str, dest: str) -> str:
+    """
+    Make dest have the content of src by hardlink, reflink or copy, whichever works first.
+    :return: The method used, one of 'hardlink', 'reflink' and 'copy'.
+    """
+    try:
+        os.link(src, dest)
+        return "hardlink"
+    except OSError:
+        pass
+    try:
+        reflink(src, dest)
+        return "reflink"
+    except OSError:
+        pass
+    shutil.copyfile(src, dest)
+    return "copy"
+
+
+class ArtifactStore:
+    """A content-addressed store of downloaded files, shared by all destination directories.
+
+    A file is stored once as `<directory>/sha256/<hash[:2]>/<hash>`, and materialized into every
+    destination directory with a hardlink, a reflink or a copy. The destination paths are recorded
+    in `<hash>.refs`, whose modification time is the last time the file was used. A stored file
+    is referenced while any of the recorded paths still exists.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.directory, "sha256", sha256[:2], sha256)
+
+    def contains(self, sha256: str) -> bool:
+        return os.path.exists(self.path(sha256))
+
+    def add(self, sha256: str, file_path: str) -> None:
+        """Add a file, whose sha256 has been verified, into the store and reference it."""
+        blob_path = self.path(sha256)
+        if not os.path.exists(blob_path):
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            temp_path = "%s.%d.%d.tmp" % (blob_path, os.getpid(), threading.get_ident())
+            link_or_copy(file_path, temp_path)
+            os.replace(temp_path, blob_path)
+        self._add_ref(sha256, file_path)
+
+    def materialize(self, sha256: str, dest_path: str) -> str:
+        """
+        Create dest_path from the stored file.
+        :return: The method used, one of 'hardlink', 'reflink' and 'copy'.
+        """
+        temp_path = "%s.%d.%d.tmp" % (dest_path, os.getpid(), threading.get_ident())
+        method = link_or_copy(self.path(sha256), temp_path)
+        os.replace(temp_path, dest_path)
+        self._add_ref(sha256, dest_path)
+        return method
+
+    def _add_ref(self, sha256: str, file_path: str) -> None:
+        refs_path = self.path(sha256) + ".refs"
+        file_path = os.path.abspath(file_path)
+        with self._lock:
+            refs = self._read_refs(refs_path)
+            if file_path not in refs:
+                with open(refs_path, "a", encoding="utf8") as f:
+                    f.write(file_path + "\n")
+            os.utime(refs_path)
+
+    @staticmethod
+    def _read_refs(refs_path: str) -> List[str]:
+        try:
+            with open(refs_path, "r", encoding="utf8") as f:
+                return [line.rstrip("\n") for line in f if line.strip()]
+        except OSError:
+            return []
+
+    def _live_refs(self, sha256: str) -> List[str]:
+        blob_size = os.path.getsize(self.path(sha256))
+        live = []
+        for ref in self._read_refs(self.path(sha256) + ".refs"):
+            try:
+                if os.path.getsize(ref) == blob_size:
+                    live.append(ref)
+            except OSError:
+                continue
+        return live
+
+    def gc(self, max_size: int = 0, dry_run: bool = False) -> List[str]:
+        """
+        Remove unreferenced files, least recently used first, until the unreferenced files take no more
+        than max_size bytes.
+        :param max_size: The number of bytes unreferenced files are allowed to take.
+        :param dry_run: When it is true, nothing is removed.
+        :return: The hashes of the removed files.
+        """
+        root = os.path.join(self.directory, "sha256")
+        if not os.path.isdir(root):
+            return []
+        unreferenced = []
+        unreferenced_size = 0
+        for prefix in os.listdir(root):
+            for name in os.listdir(os.path.join(root, prefix)):
+                if name.endswith((".refs", ".tmp")):
+                    continue
+                blob_path = os.path.join(root, prefix, name)
+                refs_path = blob_path + ".refs"
+                live_refs = self._live_refs(name)
+                if live_refs:
+                    if not dry_run:
+                        # Forget the paths which do not exist anymore.
+                        with self._lock, open(refs_path, "w", encoding="utf8") as f:
+                            f.writelines(ref + "\n" for ref in live_refs)
+                    continue
+                last_used = self._last_used(blob_path)
+                size = os.path.getsize(blob_path)
+                unreferenced.append((last_used, size, name))
+                unreferenced_size += size
+
+        removed = []
+        for _, size, name in sorted(unreferenced):
+            if unreferenced_size <= max_size:
+                break
+            if not dry_run:
+                for path in (self.path(name), self.path(name) + ".refs"):
+                    try:
+                        os.unlink(path)
+                    except OSError as e:
+                        if e.errno != errno.ENOENT:
+                            raise
+            removed.append(name)
+            unreferenced_size -= size
+        return removed
+
+    @staticmethod
+    def _last_used(blob_path: str) -> float:
+        try:
+            return os.path.getmtime(blob_path + ".refs")
+        except OSError:
+            return os.path.getmtime(blob_path)
+
+    def size(self) -> int:
+        total = 0
+        root = os.path.join(self.directory, "sha256")
+        for dir_path, _, names in os.walk(root):
+            total += sum(
+                os.path.getsize(os.path.join(dir_path, name)) for name in names if not name.endswith(".refs")
+            )
+        return total
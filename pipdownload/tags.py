@@ -0,0 +1,97 @@
+from functools import lru_cache
+from typing import FrozenSet
+from typing import Iterable
+from typing import Optional
+
+from packaging.tags import Tag
+from packaging.utils import InvalidWheelFilename
+from packaging.utils import parse_wheel_filename
+from packaging.version import InvalidVersion
+
+# The legacy manylinux tags and the PEP 600 tags they are equal to.
+MANYLINUX_ALIASES = {
+    "manylinux1": "manylinux_2_5",
+    "manylinux2010": "manylinux_2_12",
+    "manylinux2014": "manylinux_2_17",
+}
+
+# The number of file names whose tags are cached, the file names of the projects of a large run fit in it while the
+# cache of a long-running daemon stays bounded.
+TAGS_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=TAGS_CACHE_SIZE)
+def parse_wheel_tags(filename: str) -> Optional[FrozenSet[Tag]]:
+    """Return the tags of a wheel, or None if filename is not a valid wheel file name."""
+    if not filename.endswith(".whl"):
+        return None
+    try:
+        return parse_wheel_filename(filename)[3]
+    except (InvalidWheelFilename, InvalidVersion):
+        return None
+
+
+def _platform_aliases(platform: str) -> Iterable[str]:
+    yield platform
+    for legacy, pep600 in MANYLINUX_ALIASES.items():
+        if platform.startswith(legacy + "_"):
+            yield pep600 + platform[len(legacy):]
+        elif platform.startswith(pep600 + "_"):
+            yield legacy + platform[len(pep600):]
+
+
+class WheelTagMatcher:
+    """Match wheel file names against the `--python-version` and `--platform-tag` options.
+
+    A wheel matches when one of its tags has an interpreter or abi tag listed in python_versions
+    (like 'cp37' or 'py3') and a platform tag accepted by platform_tags. A platform tag is accepted
+    if it is listed, if it is the legacy/PEP 600 alias of a listed manylinux tag, or if it starts
+    with a listed family made of letters only (like 'manylinux', 'macosx' or 'win'). Pure python
+    wheels (platform 'any') are never filtered by platform_tags. An empty option accepts all.
+
+    The options are compiled into frozensets once, and the result for every platform tag is
+    memoized, so matching a wheel costs a few set lookups.
+    """
+
+    def __init__(self, python_versions: Iterable[str] = None, platform_tags: Iterable[str] = None) -> None:
+        self.python_versions = frozenset(python_versions or ())
+        platform_tags = list(platform_tags or ())
+        self.platforms = frozenset(
+            alias for platform in platform_tags if not platform.isalpha() for alias in _platform_aliases(platform)
+        )
+        self.platform_families = tuple(platform for platform in platform_tags if platform.isalpha())
+        self.filter_platform = bool(platform_tags)
+        self._platform_results = {}
+
+    def _platform_matches(self, platform: str) -> bool:
+        if not self.filter_platform or platform == "any":
+            return True
+        result = self._platform_results.get(platform)
+        if result is None:
+            result = platform in self.platforms or platform.startswith(self.platform_families)
+            self._platform_results[platform] = result
+        return result
+
+    def _python_matches(self, tag: Tag) -> bool:
+        return (
+            not self.python_versions
+            or tag.interpreter in self.python_versions
+            or tag.abi in self.python_versions
+        )
+
+    def matches(self, filename: str, any_python: bool = False) -> bool:
+        """
+        Whether a file should be downloaded.
+        :param filename: The name of the file.
+        :param any_python: When it is true, pure python wheels are accepted whatever python_versions is.
+        :return: For a file which is not a wheel, whether no filter is set.
+        """
+        tags = parse_wheel_tags(filename)
+        if tags is None:
+            return not (self.python_versions or self.filter_platform)
+        for tag in tags:
+            if not self._platform_matches(tag.platform):
+                continue
+            if (any_python and tag.abi == "none" and tag.platform == "any") or self._python_matches(tag):
+                return True
+        return False
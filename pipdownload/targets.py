@@ -0,0 +1,190 @@
+import logging
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+import requests
+from packaging.tags import Tag
+from packaging.tags import compatible_tags
+from packaging.tags import cpython_tags
+from packaging.tags import mac_platforms
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.exceptions import MetadataResolutionError
+from pipdownload.index import IndexCache
+from pipdownload.index import IndexClient
+from pipdownload.resolver import MetadataResolver
+from pipdownload.session import DEFAULT_TIMEOUT
+from pipdownload.session import make_session
+from pipdownload.tags import MANYLINUX_ALIASES
+from pipdownload.tags import parse_wheel_tags
+from pipdownload.utils import resolve_packages
+
+logger = logging.getLogger(__name__)
+
+TARGET_PATTERN = re.compile(r"(?:cp|py)?(\d)\.?(\d+)-(\w+)")
+# The oldest glibc of the manylinux tags.
+OLDEST_GLIBC_MINOR = 5
+
+
+class Target:
+    """A (python version, platform) pair the packages are resolved and downloaded for.
+
+    A target is written as `<python version>-<platform tag>`, like `cp311-manylinux2014_x86_64`,
+    `3.10-win_amd64` or `cp38-macosx_11_0_arm64`. The environment markers are evaluated for CPython
+    on that platform, and a wheel matches the target if one of its tags is supported there.
+    """
+
+    def __init__(self, spec: str) -> None:
+        match = TARGET_PATTERN.fullmatch(spec)
+        if match is None:
+            raise ValueError(
+                "The target %r is not like 'cp311-manylinux2014_x86_64' or '3.10-win_amd64'." % spec
+            )
+        self.spec = spec
+        self.python_version = (int(match.group(1)), int(match.group(2)))
+        self.platform = match.group(3)
+        self._tags = None
+
+    def __repr__(self):
+        return "{}<{!r}>".format(self.__class__.__name__, self.spec)
+
+    def __str__(self):
+        return self.spec
+
+    @property
+    def interpreter(self) -> str:
+        return "cp%d%d" % self.python_version
+
+    def platforms(self) -> List[str]:
+        """Return the platform tags supported on the platform of the target, the most specific first."""
+        platform = self.platform
+        for legacy, pep600 in MANYLINUX_ALIASES.items():
+            if platform.startswith(legacy + "_"):
+                platform = pep600 + platform[len(legacy):]
+        match = re.fullmatch(r"manylinux_2_(\d+)_(\w+)", platform)
+        if match is not None:
+            glibc_minor, arch = int(match.group(1)), match.group(2)
+            platforms = []
+            for minor in range(glibc_minor, OLDEST_GLIBC_MINOR - 1, -1):
+                pep600 = "manylinux_2_%d_%s" % (minor, arch)
+                platforms.append(pep600)
+                for legacy, alias in MANYLINUX_ALIASES.items():
+                    if alias == "manylinux_2_%d" % minor:
+                        platforms.append("%s_%s" % (legacy, arch))
+            return platforms + ["linux_%s" % arch]
+        match = re.fullmatch(r"macosx_(\d+)_(\d+)_(\w+)", platform)
+        if match is not None:
+            return list(mac_platforms((int(match.group(1)), int(match.group(2))), match.group(3)))
+        return [platform]
+
+    def tags(self) -> FrozenSet[Tag]:
+        """Return the wheel tags supported by CPython on the target."""
+        if self._tags is None:
+            platforms = self.platforms()
+            self._tags = frozenset(cpython_tags(self.python_version, platforms=platforms)) | frozenset(
+                compatible_tags(self.python_version, self.interpreter, platforms)
+            )
+        return self._tags
+
+    def environment(self) -> Dict[str, str]:
+        """Return the environment the markers are evaluated in."""
+        platform = self.platform
+        if platform.startswith("win"):
+            machine = {"win32": "x86", "win_amd64": "AMD64", "win_arm64": "ARM64"}.get(platform, "AMD64")
+            sys_platform, system, os_name = "win32", "Windows", "nt"
+        elif platform.startswith("macosx"):
+            machine = platform.rsplit("_", 1)[-1]
+            if machine in ("universal2", "universal", "intel"):
+                machine = "x86_64"
+            sys_platform, system, os_name = "darwin", "Darwin", "posix"
+        else:
+            machine = re.sub(r"^(many|musl)?linux(_\d+)*_|^(manylinux1|manylinux2010|manylinux2014)_", "", platform)
+            sys_platform, system, os_name = "linux", "Linux", "posix"
+        version = "%d.%d" % self.python_version
+        return {
+            "implementation_name": "cpython",
+            "implementation_version": version + ".0",
+            "os_name": os_name,
+            "platform_machine": machine,
+            "platform_release": "",
+            "platform_system": system,
+            "platform_version": "",
+            "python_full_version": version + ".0",
+            "platform_python_implementation": "CPython",
+            "python_version": version,
+            "sys_platform": sys_platform,
+        }
+
+    def pip_options(self) -> List[str]:
+        """Return the options which make pip resolve for the target."""
+        options = ["--python-version", "%d.%d" % self.python_version, "--implementation", "cp", "--only-binary=:all:"]
+        for platform in self.platforms():
+            options.extend(["--platform", platform])
+        return options
+
+    def matches(self, filename: str, any_python: bool = False) -> bool:
+        """Whether a wheel can be installed on the target, the same interface as `WheelTagMatcher.matches`."""
+        tags = parse_wheel_tags(filename)
+        return tags is not None and not self.tags().isdisjoint(tags)
+
+
+def resolve_target(
+    spec: str,
+    requirements: List[str],
+    index_url: str,
+    cache: Optional[Tuple[str, int, int]] = None,
+    offline: bool = False,
+    timeout=DEFAULT_TIMEOUT,
+    retries: int = 3,
+    max_request_rate: Optional[float] = None,
+) -> Optional[List[str]]:
+    """
+    Resolve the requirements for a target with the metadata published by the index. It runs in a worker
+    process, so it takes only picklable arguments and builds its own session.
+    :param cache: The (directory, max_size, ttl) of the index cache, or None to disable it.
+    :param max_request_rate: The maximum number of requests per second this process sends to one host.
+    :return: The names of the resolved files, or None if the metadata is not enough to resolve them.
+    """
+    target = Target(spec)
+    session = make_session(pool_size=4, timeout=timeout, retries=retries, max_request_rate=max_request_rate)
+    index = IndexClient(session, index_url, cache=IndexCache(*cache) if cache else None, offline=offline)
+    try:
+        resolver = MetadataResolver(index, environment=target.environment(), tags=target.tags(), require_tags=True)
+        return resolver.resolve(requirements)
+    except (MetadataResolutionError, IndexPageNotCached, requests.RequestException) as e:
+        logger.warning("%s: %s" % (spec, e))
+        return None
+
+
+def resolve_targets(targets: List[Target], requirements: List[str], index_url: str, jobs: int = None,
+                    **kwargs) -> List[Optional[List[str]]]:
+    """
+    Resolve the requirements for every target in a pool of processes.
+    :param kwargs: The other arguments of `resolve_target`.
+    :return: The result of `resolve_target` for every target, in the order of targets.
+    """
+    with ProcessPoolExecutor(max_workers=jobs or len(targets)) as executor:
+        futures = [
+            executor.submit(resolve_target, target.spec, requirements, index_url, **kwargs) for target in targets
+        ]
+        return [future.result() for future in futures]
+
+
+def resolve_targets_with_pip(targets: List[Target], requirements: List[str], index_url: str, quiet: bool,
+                             jobs: int = None) -> List[Optional[List[str]]]:
+    """
+    Resolve the requirements for every target with pip, see `resolve_packages`. Every pip invocation is a
+    subprocess, so they are run at the same time from a pool of threads.
+    :return: The result of `resolve_packages` for every target, in the order of targets.
+    """
+    with ThreadPoolExecutor(max_workers=jobs or len(targets)) as executor:
+        futures = [
+            executor.submit(resolve_packages, index_url, requirements, quiet, options=target.pip_options())
+            for target in targets
+        ]
+        return [future.result() for future in futures]
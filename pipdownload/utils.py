@@ -1,32 +1,48 @@
-import distutils.util
 import hashlib
 import io
+import json
 import logging
 import os.path
 import platform
-import posixpath
 import re
 import shutil
 import subprocess
 import sys
 import tempfile
-import urllib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from functools import partial
 from typing import BinaryIO
 from typing import Dict
 from typing import Generator
+from typing import Iterable
 from typing import Iterator
 from typing import List
 from typing import NoReturn
-from urllib.parse import urljoin
+from typing import Optional
+from typing import Set
+from typing import Tuple
 from urllib.parse import urlparse
-from urllib.parse import urlunparse
 
 import click
 import requests
+import urllib3
+from packaging.requirements import InvalidRequirement
+from packaging.requirements import Requirement
 from packaging.utils import canonicalize_name
-from pip._internal import main as pip_main
+from packaging.version import VERSION_PATTERN
 from pipdownload.exceptions import HashMismatch
+from pipdownload.index import Link
+from pipdownload.index import iter_links
+from pipdownload.index import make_absolute  # noqa: F401
+from pipdownload.index import mkurl_pypi_url  # noqa: F401
+from pipdownload.index import url_to_file_name
+from pipdownload.session import DEFAULT_TIMEOUT
+from pipdownload.session import make_session
+from pipdownload.stats import stats
 from retrying import retry
 
 logger = logging.getLogger(__name__)
@@ -109,6 +125,8 @@ class TempDirectory:
 
 
 class PythonPackage:
+    __slots__ = ("name", "version")
+
     def __init__(self, name, version):
         if name is None:
             self.name = name
@@ -120,7 +138,12 @@ class PythonPackage:
         return "{}<{!r}, {!r}>".format(self.__class__.__name__, self.name, self.version)
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__
+        if not isinstance(other, PythonPackage):
+            return NotImplemented
+        return self.name == other.name and self.version == other.version
+
+    def __hash__(self):
+        return hash((self.name, self.version))
 
 
 def read_chunks(file, size=io.DEFAULT_BUFFER_SIZE):
@@ -145,32 +168,45 @@ class Hashes:
         """
         self._allowed = {} if hashes is None else hashes
 
-    def check_against_chunks(self, chunks: Iterator[bytes]) -> None:
-        """
-        Check good hashes against ones built from iterable of chunks of
-        data.
-
-        Raise HashMismatch if none match.
-
-        """
+    def hashers(self) -> Dict[str, "hashlib._Hash"]:
+        """Return a new hash object for every allowed algorithm, to be fed while data is streamed."""
         gots = {}
         for hash_name in self._allowed:
             try:
                 gots[hash_name] = hashlib.new(hash_name)
             except (ValueError, TypeError):
                 raise
+        return gots
 
-        for chunk in chunks:
-            for hash in gots.values():
-                hash.update(chunk)
+    def check_against_hashers(self, gots: Dict[str, "hashlib._Hash"]) -> None:
+        """
+        Check good hashes against hash objects returned by `hashers` which have been fed with all of
+        the data.
 
+        Raise HashMismatch if none match.
+
+        """
         for hash_name, got in gots.items():
             if got.hexdigest() in self._allowed[hash_name]:
                 return
         self._raise(gots)
 
+    def check_against_chunks(self, chunks: Iterator[bytes]) -> None:
+        """
+        Check good hashes against ones built from iterable of chunks of
+        data.
+
+        Raise HashMismatch if none match.
+
+        """
+        gots = self.hashers()
+        for chunk in chunks:
+            for hash in gots.values():
+                hash.update(chunk)
+        self.check_against_hashers(gots)
+
     def _raise(self, gots) -> NoReturn:
-        raise HashMismatch({}, gots)
+        raise HashMismatch(self._allowed, gots)
 
     def check_against_file(self, file: BinaryIO) -> None:
         """Check good hashes against a file-like object
@@ -192,30 +228,41 @@ class Hashes:
         return self.__nonzero__()
 
 
+# The same rules as `packaging.utils.parse_wheel_filename` and `parse_sdist_filename`, without parsing the
+# wheel tags and building a `Version`, which take most of their time.
+VERSION_REGEX = re.compile(r"^\s*" + VERSION_PATTERN + r"\s*$", re.VERBOSE | re.IGNORECASE)
+# Most of the versions are plain release numbers, which are checked first without the full pattern.
+RELEASE_REGEX = re.compile(r"[0-9]+(?:\.[0-9]+)*$")
+SDIST_EXTENSIONS = (".tar.gz", ".zip", ".tar.bz2")
+UNKNOWN_PACKAGE = PythonPackage(None, None)
+# The number of file names whose packages are cached, bounded for a long-running daemon.
+PACKAGE_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=PACKAGE_CACHE_SIZE)
 def resolve_package_file(name: str) -> PythonPackage:
     """
     Resolve the package's name and version from the full name of python package
     :param name: The name of python package
-    :return: An instance of `PythonPackage`
+    :return: An instance of `PythonPackage`, the version is kept as it is written in the name. Its name and
+        version are None if name is not a valid wheel or source package name. The results are cached.
     """
-    # result is used to match the version string in the full name of python package
-    result = None
-    if name.endswith(".tar.gz"):
-        result = re.search(r"(?<=-)[^-]+?(?=\.tar\.gz)", name)
-
-    if name.endswith(".tar.bz2"):
-        result = re.search(r"(?<=-)[^-]+?(?=\.tar\.bz2)", name)
-
-    if name.endswith(".zip"):
-        result = re.search(r"(?<=-)[^-]+?(?=\.zip)", name)
-
     if name.endswith(".whl"):
-
-        result = re.search(r"(?<=-)[^-]+?(?=-p|-c)", name)
-    if result is not None:
-        return PythonPackage(name[: result.start() - 1], result.group(0))
+        # {name}-{version}(-{build tag})?-{python tag}-{abi tag}-{platform tag}.whl
+        parts = name.split("-")
+        if len(parts) != 5 and len(parts) != 6:
+            return UNKNOWN_PACKAGE
+        project, version = parts[0], parts[1]
     else:
-        return PythonPackage(None, None)
+        for extension in SDIST_EXTENSIONS:
+            if name.endswith(extension):
+                project, _, version = name[: -len(extension)].rpartition("-")
+                break
+        else:
+            return UNKNOWN_PACKAGE
+    if not project or (RELEASE_REGEX.match(version) is None and VERSION_REGEX.match(version) is None):
+        return UNKNOWN_PACKAGE
+    return PythonPackage(project, version)
 
 
 def resolve_package_files(names: List[str]) -> Generator[PythonPackage, None, None]:
@@ -225,111 +272,592 @@ def resolve_package_files(names: List[str]) -> Generator[PythonPackage, None, No
             yield result
 
 
-def make_absolute(link, base_url):
-    parsed = urlparse(link)._asdict()
-    # If link is relative, then join it with base_url.
-    if not parsed["netloc"]:
-        return urljoin(base_url, link)
+def requirement_satisfied(requirement: str, python_packages: Iterable[PythonPackage]) -> bool:
+    """
+    Whether a requirement is satisfied by one of the packages resolved already, so that it need not be resolved
+    again. Requirements with extras, markers or urls are never considered satisfied.
+    """
+    try:
+        requirement = Requirement(requirement)
+    except InvalidRequirement:
+        return False
+    if requirement.url or requirement.extras or requirement.marker:
+        return False
+    name = canonicalize_name(requirement.name)
+    return any(
+        python_package.name == name and requirement.specifier.contains(python_package.version, prereleases=True)
+        for python_package in python_packages
+    )
 
-    # Link is absolute; if it lacks a scheme, add one from base_url.
-    if not parsed["scheme"]:
-        parsed["scheme"] = urlparse(base_url).scheme
 
-        # Reconstruct the URL to incorporate the new scheme.
-        parsed = (v for v in parsed.values())
-        return urlunparse(parsed)
-    return link
+def requirement_names(requirements: Iterable[str]) -> List[str]:
+    """Return the names of the projects of the requirements which are looked up on the index, in their order."""
+    names = []
+    for requirement in requirements:
+        try:
+            requirement = Requirement(requirement)
+        except InvalidRequirement:
+            continue
+        if requirement.url is None and requirement.name not in names:
+            names.append(requirement.name)
+    return names
 
 
 def get_file_links(html_doc, base_url, python_package_local: PythonPackage) -> set:
-    def gen():
-        # use version to match hyperlinks in web pages, so the number of matches will get smaller.
-        version = re.escape(python_package_local.version)
-        for link in re.finditer(
-            rf'<a.*?href="(.+?)".*?>(.+{version}.+?)</a>', html_doc
-        ):
-            link_href, link_text = link.groups()
-            try:
-                href = link_href.strip()
-                python_package_on_page = resolve_package_file(link_text)
-                if python_package_local == python_package_on_page:
-                    if href:
-                        yield make_absolute(href, base_url)
-            except KeyError:
-                pass
-
-    return set(gen())
-
-
-def download(url, dest_dir, quiet=False):
-    file_url, file_hash = url.split("#")
+    """
+    Get the urls of the files of a package on an index page.
+    :param html_doc: The index page, either a string or an iterable of strings which are parsed as they come.
+    :param base_url: The url of the index page.
+    :param python_package_local: The package whose files are wanted.
+    :return: A set of urls.
+    """
+    if isinstance(html_doc, str):
+        html_doc = (html_doc,)
+    # use version to skip most of the links without parsing their attributes.
+    links = iter_links(html_doc, base_url, contains=python_package_local.version)
+    return select_file_links(links, python_package_local)
+
+
+def select_file_links(links: Iterable[Link], python_package_local: PythonPackage) -> Set[str]:
+    """Return the urls of the links which are files of python_package_local."""
+    return {link.url for link in links if resolve_package_file(link.filename) == python_package_local}
+
+
+def download(
+    url,
+    dest_dir,
+    quiet=False,
+    progress=None,
+    store=None,
+    retries=3,
+    session=None,
+    mirror_index=None,
+    bandwidth=None,
+    timeout=DEFAULT_TIMEOUT,
+) -> bool:
+    """
+    Download one file into dest_dir.
+    :param url: The url of the file, with a `#<hash_algo>=<hash_value>` fragment. A file without one is
+        downloaded without being verified, and an existing file is kept as it is.
+    :param dest_dir: The destination directory.
+    :param quiet: Whether to hide the progress bar.
+    :param progress: An instance of `DownloadProgress` shared by a batch of downloads. When it is given,
+        the progress is reported to it instead of being rendered for this file alone.
+    :param store: An instance of `ArtifactStore`. When it is given, files with a sha256 are materialized
+        from it if they have been stored, and stored after they are downloaded.
+    :param retries: How many times an interrupted download is resumed, and a failed request is retried by the
+        session made when session is not given.
+    :param session: The session used to download the file, see `pipdownload.session.make_session`.
+        Defaults to a new session with retries and timeout.
+    :param mirror_index: An instance of `MirrorIndex` of dest_dir. When it is given, an existing file with a
+        sha256 is skipped without being read if its size and modification time have not changed since it
+        was recorded, and the files verified or downloaded are recorded.
+    :param bandwidth: A `TokenBucket` of bytes shared by a batch of downloads. When it is given, the transfer
+        is throttled to its rate.
+    :param timeout: The timeout of the session made when session is not given, see `make_session`.
+    :return: Whether the file is in dest_dir and matches its hash, False if it could not be downloaded.
+    """
+    if session is None:
+        session = make_session(pool_size=1, timeout=timeout, retries=retries)
+    file_url, _, file_hash = url.partition("#")
     file_name = os.path.basename(file_url)
-    hash_algo, hash_value = file_hash.split("=")
-    hashes = Hashes({hash_algo: hash_value})
+    if "=" in file_hash:
+        hash_algo, hash_value = file_hash.split("=", 1)
+        hashes = Hashes({hash_algo: [hash_value]})
+    else:
+        hash_algo = hash_value = None
+        hashes = Hashes()
     download_file_path = os.path.join(dest_dir, file_name)
+    if hash_algo != "sha256":
+        store = None
+        mirror_index = None
     if os.path.exists(download_file_path):
-        try:
-            hashes.check_against_path(download_file_path)
+        # True when the file is known to be good, False when it is known to be bad.
+        good = mirror_index.check(download_file_path, hash_value) if mirror_index is not None else None
+        if good is None and not hashes:
+            good = True
+        elif good is None:
+            try:
+                with stats.timer("download.hash_existing"):
+                    hashes.check_against_path(download_file_path)
+                good = True
+            except HashMismatch:
+                good = False
+            if good and mirror_index is not None:
+                mirror_index.record(download_file_path, hash_value, added=False)
+        if good:
+            stats.count("download.skipped")
             logger.info("The file %s has already been downloaded." % download_file_path)
-            return
-        except HashMismatch:
+            if store is not None and not store.contains(hash_value):
+                store.add(hash_value, download_file_path)
+            return True
+        logger.warning(
+            "Previously-downloaded file %s has bad hash. " "Re-downloading.",
+            download_file_path,
+        )
+        os.unlink(download_file_path)
+
+    if store is not None and store.contains(hash_value):
+        method = store.materialize(hash_value, download_file_path)
+        stats.count("download.materialized")
+        logger.info(
+            "The file %s has been materialized from the artifact store by %s." % (download_file_path, method)
+        )
+        if mirror_index is not None:
+            mirror_index.record(download_file_path, hash_value)
+        return True
+
+    # The file is written to `<file_name>.part` in dest_dir, and renamed only after its hash has been
+    # verified, so a corrupted or truncated download is never left in dest_dir. An interrupted download
+    # keeps its `.part` file and journal, and is resumed with a Range request.
+    part_path = download_file_path + ".part"
+    transfer = PartialDownload(file_url, file_hash, part_path, hashes, session, bandwidth)
+    for attempt in range(retries + 1):
+        try:
+            with stats.timer("download.transfer"):
+                completed = transfer.fetch(quiet, progress)
+            break
+        except (requests.RequestException, ConnectionError) as e:
             logger.warning(
-                "Previously-downloaded file %s has bad hash. " "Re-downloading.",
-                download_file_path,
+                "The download of %s is interrupted (%s), %d bytes have been saved." % (file_name, e, transfer.offset())
             )
-            os.unlink(download_file_path)
+    else:
+        logger.error("Cannot download file from url: %s" % file_url)
+        return False
+    if not completed:
+        return False
+    os.replace(part_path, download_file_path)
+    transfer.discard()
+    stats.count("download.completed")
+    if store is not None:
+        store.add(hash_value, download_file_path)
+    if mirror_index is not None:
+        mirror_index.record(download_file_path, hash_value)
+    return True
 
-    try:
-        response = requests.get(file_url, stream=True)
-        chunk_size = 1024
-        size = 0
-        if response.status_code == 200:
-            content_size = int(response.headers["content-length"])
-            logger.info("Downloading file %s: " % file_name)
-            with open(download_file_path, "wb") as file:
-                for data in response.iter_content(chunk_size=chunk_size):
-                    file.write(data)
-                    if not quiet:
-                        size += len(data)
-                        click.echo(
-                            "\r"
-                            + "[Processing]:%s%.2f%%"
-                            % (
-                                ">" * int(size * 50 / content_size),
-                                float(size / content_size * 100),
-                            ),
-                            nl=False,
-                        )
-                if not quiet:
-                    click.echo("\n", nl=False)
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-\d+/(?:\d+|\*)", re.IGNORECASE)
+
+
+def content_range_start(response: requests.Response) -> Optional[int]:
+    """Return the first byte of a `206 Partial Content` response, or None if its `Content-Range` is not valid."""
+    match = CONTENT_RANGE_PATTERN.fullmatch(response.headers.get("Content-Range", "").strip())
+    return int(match.group(1)) if match is not None else None
+
+
+class PartialDownload:
+    """The transfer of one file into a `.part` file, which can be resumed with HTTP Range requests.
+
+    A journal `<file_name>.part.json` next to the `.part` file records the url, the expected hash and
+    the validators (`ETag`, `Last-Modified`) of the response. The `.part` file is resumed only when the
+    journal matches, and `If-Range` makes the server send the whole file again if it has changed.
+    """
+
+    def __init__(
+        self, file_url: str, file_hash: str, part_path: str, hashes: Hashes, session=None, bandwidth=None
+    ) -> None:
+        self.file_url = file_url
+        self.session = requests if session is None else session
+        self.bandwidth = bandwidth
+        self.file_hash = file_hash
+        self.part_path = part_path
+        self.journal_path = part_path + ".json"
+        self.hashes = hashes
+        self._counted = False
+
+    def offset(self) -> int:
+        try:
+            return os.path.getsize(self.part_path)
+        except OSError:
+            return 0
+
+    def _read_journal(self) -> Optional[dict]:
+        try:
+            with open(self.journal_path, "r", encoding="utf8") as f:
+                journal = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if journal.get("url") != self.file_url or journal.get("hash") != self.file_hash:
+            return None
+        return journal
+
+    def discard(self) -> None:
+        for path in (self.part_path, self.journal_path):
+            if os.path.exists(path):
+                os.unlink(path)
+
+    def fetch(self, quiet=False, progress=None) -> bool:
+        """
+        Fetch the rest of the file into the `.part` file and verify its hash.
+        :return: Whether the file is complete and matches its hash.
+        """
+        journal = self._read_journal()
+        offset = self.offset() if journal is not None else 0
+        headers = {}
+        if offset:
+            headers["Range"] = "bytes=%d-" % offset
+            validator = journal.get("etag") or journal.get("last_modified")
+            if validator:
+                headers["If-Range"] = validator
         else:
+            self.discard()
+
+        response = self.session.get(self.file_url, stream=True, headers=headers)
+        if offset and response.status_code == 416:
+            # The `.part` file can not be resumed, fetch the file from the beginning again.
+            response.close()
+            self.discard()
+            return self.fetch(quiet, progress)
+        if response.status_code == 206 and content_range_start(response) != offset:
+            # The server has not sent the rest of the `.part` file, appending it would corrupt the file.
+            response.close()
+            self.discard()
+            file_name = os.path.basename(self.file_url)
+            if not offset:
+                logger.error("The server has sent a part of %s instead of the whole file." % file_name)
+                return False
+            logger.warning(
+                "The server has not resumed the download of %s from byte %d, downloading it again." % (file_name, offset)
+            )
+            return self.fetch(quiet, progress)
+        if response.status_code not in (200, 206):
             logger.error(
                 f"The status code is {response.status_code}, and the text is {response.text}."
             )
-    except ConnectionError as e:
-        logger.error("Cannot download file from url: %s" % file_url)
-        logger.error(e)
+            return False
+
+        gots = self.hashes.hashers()
+        if response.status_code == 206 and offset:
+            logger.info("Resuming the download of %s from byte %d." % (os.path.basename(self.file_url), offset))
+            with open(self.part_path, "rb") as file:
+                for chunk in read_chunks(file):
+                    for hash in gots.values():
+                        hash.update(chunk)
+            mode = "ab"
+        else:
+            offset = 0
+            mode = "wb"
+            with open(self.journal_path, "w", encoding="utf8") as f:
+                json.dump(
+                    {
+                        "url": self.file_url,
+                        "hash": self.file_hash,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    },
+                    f,
+                )
+
+        file_name = os.path.basename(self.file_url)
+        content_size = offset + int(response.headers.get("content-length", 0))
+        own_progress = progress is None
+        if own_progress:
+            logger.info("Downloading file %s: " % file_name)
+            progress = FileProgress(quiet)
+        if own_progress or not self._counted:
+            progress.add_total(content_size)
+            progress.update(offset)
+            self._counted = True
+
+        hash_time = 0.0
+        throttle_time = 0.0
+        received = 0
+        try:
+            with open(self.part_path, mode) as file:
+                for data in iter_response_chunks(response):
+                    if self.bandwidth is not None:
+                        delay = self.bandwidth.reserve(len(data))
+                        if delay > 0:
+                            throttle_time += delay
+                            time.sleep(delay)
+                    file.write(data)
+                    start = time.perf_counter()
+                    for hash in gots.values():
+                        hash.update(data)
+                    hash_time += time.perf_counter() - start
+                    received += len(data)
+                    progress.update(len(data))
+        finally:
+            stats.add_time("download.hash", hash_time)
+            if throttle_time:
+                stats.add_time("download.throttle", throttle_time)
+            stats.count("download.bytes", received)
+        if own_progress:
+            progress.close()
+        if not self.hashes:
+            return True
+        try:
+            self.hashes.check_against_hashers(gots)
+        except HashMismatch as e:
+            self.discard()
+            if offset:
+                # The bytes saved by an earlier attempt may be the bad ones, the whole file is fetched once more.
+                logger.warning(
+                    "The resumed download of %s does not match its hash, downloading it again from the beginning."
+                    % file_name
+                )
+                return self.fetch(quiet, progress)
+            logger.error(
+                "The downloaded file %s does not match its hash:\n%s" % (file_name, e.body())
+            )
+            return False
+        return True
 
 
 quiet_download = partial(download, quiet=True)
 
 
-def mkurl_pypi_url(url, project_name):
-    loc = posixpath.join(url, urllib.parse.quote(canonicalize_name(project_name)))
-    # For maximum compatibility with easy_install, ensure the path
-    # ends in a trailing slash.  Although this isn't in the spec
-    # (and PyPI can handle it without the slash) some other index
-    # implementations might break if they relied on easy_install's
-    # behavior.
-    if not loc.endswith("/"):
-        loc = loc + "/"
-    return loc
+def iter_response_chunks(
+    response: requests.Response,
+    min_chunk_size: int = 64 * 1024,
+    max_chunk_size: int = 1024 * 1024,
+) -> Iterator[bytes]:
+    """
+    Yield the body of a streamed response in chunks whose size adapts to the speed of the connection.
+
+    The chunk size starts at min_chunk_size, is doubled while chunks arrive fast and is halved when
+    they arrive slowly, so a fast link is not bounded by the per-chunk overhead of Python and a
+    slow one still reports progress smoothly.
+    """
+    chunk_size = min_chunk_size
+    while True:
+        started = time.monotonic()
+        try:
+            data = response.raw.read(chunk_size, decode_content=True)
+        except urllib3.exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        except urllib3.exceptions.DecodeError as e:
+            raise requests.exceptions.ContentDecodingError(e)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            raise requests.exceptions.ConnectionError(e)
+        if not data:
+            break
+        yield data
+        elapsed = time.monotonic() - started
+        if len(data) == chunk_size and elapsed < 0.05:
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+        elif elapsed > 0.5:
+            chunk_size = max(chunk_size // 2, min_chunk_size)
+
+
+class DownloadProgress:
+    """Aggregated progress of a batch of concurrent downloads.
+
+    Every worker reports the bytes it receives here, and a single progress line is rendered
+    for the whole batch instead of one progress bar per file. The line is rendered at most
+    once every `render_interval` seconds.
+    """
+
+    render_interval = 0.1
+
+    def __init__(self, total_files: int, quiet: bool = False) -> None:
+        self.total_files = total_files
+        self.quiet = quiet
+        self.finished_files = 0
+        self.total_bytes = 0
+        self.received_bytes = 0
+        self._lock = threading.Lock()
+        self._rendered_at = 0.0
+
+    def add_total(self, size: int) -> None:
+        with self._lock:
+            self.total_bytes += size
+
+    def update(self, size: int) -> None:
+        with self._lock:
+            self.received_bytes += size
+            self._render()
+
+    def finish_file(self) -> None:
+        with self._lock:
+            self.finished_files += 1
+            self._render()
+
+    def close(self) -> None:
+        if not self.quiet and self.total_files:
+            with self._lock:
+                self._render(force=True)
+            click.echo("\n", nl=False)
+
+    def _render(self, force: bool = False) -> None:
+        if self.quiet:
+            return
+        now = time.monotonic()
+        if not force and now - self._rendered_at < self.render_interval:
+            return
+        self._rendered_at = now
+        click.echo(self._format(), nl=False)
+
+    def _format(self) -> str:
+        percent = self.received_bytes / self.total_bytes * 100 if self.total_bytes else 0.0
+        return "\r[Processing]: %d/%d files, %.2f/%.2f MiB (%.2f%%)" % (
+            self.finished_files,
+            self.total_files,
+            self.received_bytes / 1024 / 1024,
+            self.total_bytes / 1024 / 1024,
+            percent,
+        )
 
 
+class FileProgress(DownloadProgress):
+    """The progress bar of a single download."""
+
+    def __init__(self, quiet: bool = False) -> None:
+        super().__init__(1, quiet)
+
+    def _format(self) -> str:
+        if not self.total_bytes:
+            return "\r[Processing]:%.2f MiB" % (self.received_bytes / 1024 / 1024)
+        return "\r[Processing]:%s%.2f%%" % (
+            ">" * int(self.received_bytes * 50 / self.total_bytes),
+            float(self.received_bytes / self.total_bytes * 100),
+        )
+
+
+def download_all(
+    urls: List[str],
+    dest_dir: str,
+    jobs: int = 4,
+    per_host: Optional[int] = None,
+    quiet: bool = False,
+    store=None,
+    session=None,
+    mirror_index=None,
+    bandwidth=None,
+    retries: int = 3,
+    timeout=DEFAULT_TIMEOUT,
+) -> List[str]:
+    """
+    Download all urls into dest_dir concurrently.
+    :param urls: The urls of the files to be downloaded, see `download`.
+    :param dest_dir: The destination directory.
+    :param jobs: The number of worker threads.
+    :param per_host: The maximum number of connections opened to one host at the same time.
+        Defaults to `jobs`.
+    :param quiet: Whether to hide the progress line.
+    :param store: An instance of `ArtifactStore`, see `download`.
+    :param session: The session shared by all of the downloads. Defaults to a session whose connection pool
+        fits the number of jobs, with retries and timeout.
+    :param mirror_index: An instance of `MirrorIndex` of dest_dir, see `download`. It is saved when the
+        downloads are finished, even if some of them have failed.
+    :param bandwidth: A `TokenBucket` of bytes per second shared by all of the downloads, see `download`.
+    :param retries: How many times a download is resumed and a request is retried, see `download`.
+    :param timeout: The timeout of the session made when session is not given, see `make_session`.
+    :return: The urls which could not be downloaded, in the order of urls.
+    """
+    if per_host is None:
+        per_host = jobs
+    if session is None:
+        session = make_session(pool_size=jobs, timeout=timeout, retries=retries)
+    host_semaphores = {}
+    for url in urls:
+        host = urlparse(url).netloc
+        if host not in host_semaphores:
+            host_semaphores[host] = threading.BoundedSemaphore(per_host)
+
+    progress = DownloadProgress(len(urls), quiet)
+
+    def worker(url) -> bool:
+        with host_semaphores[urlparse(url).netloc]:
+            downloaded = download(
+                url,
+                dest_dir,
+                quiet,
+                progress,
+                store,
+                retries=retries,
+                session=session,
+                mirror_index=mirror_index,
+                bandwidth=bandwidth,
+                timeout=timeout,
+            )
+        progress.finish_file()
+        return downloaded
+
+    with ThreadPoolExecutor(max_workers=max(jobs, 1)) as executor:
+        futures = [executor.submit(worker, url) for url in urls]
+        try:
+            return [url for url, future in zip(urls, futures) if not future.result()]
+        finally:
+            progress.close()
+            if mirror_index is not None:
+                mirror_index.save()
+
 
 def wheel_package_exists(package_links: Set[str]) -> bool:
     return any([".whl" in link for link in package_links])
 
+
+def group_resolved_files(resolved_files: Iterable[Tuple[str, object]]) -> Tuple["OrderedDict", List[PythonPackage]]:
+    """
+    Group the resolved files by package, so that every package is looked up only once however many
+    resolutions picked it.
+    :param resolved_files: Tuples of a resolved file name and the matcher of the wheels to download for it,
+        a `WheelTagMatcher` or a `Target`.
+    :return: An OrderedDict of the packages pointing to an OrderedDict of their matchers, each pointing to
+        whether pure python wheels are accepted whatever the python versions are, and the packages whose
+        name and version can not be resolved from the file names.
+    """
+    resolved_packages = OrderedDict()
+    unresolved = []
+    for file_name, matcher in resolved_files:
+        python_package = resolve_package_file(file_name)
+        if python_package.name is None:
+            unresolved.append(python_package)
+            logger.warning(
+                "Can not resolve a package's name and version from a downloaded package. You shuold "
+                "create an issue maybe."
+            )
+            continue
+        # Pure python wheels are accepted whatever the python versions are if any resolution picked a universal one.
+        matchers = resolved_packages.setdefault(python_package, OrderedDict())
+        matchers[matcher] = matchers.get(matcher, False) or "py2.py3" in file_name
+    return resolved_packages, unresolved
+
+
+def select_downloads(
+    projects, resolved_packages: "OrderedDict", no_source: bool = False, source_as_fallback: bool = False,
+    url_list: list = None,
+) -> "OrderedDict":
+    """
+    Select the files of the resolved packages to download.
+    :param projects: The `ProjectIndex` the files are looked up in.
+    :param resolved_packages: The packages and their matchers, see `group_resolved_files`.
+    :param no_source: Whether the source packages are skipped.
+    :param source_as_fallback: Whether the source packages of the packages without any wheel are kept anyway.
+    :param url_list: When it is given, every package and the urls of all of its files are appended to it.
+    :return: An OrderedDict of the urls to download pointing to a tuple of their `PythonPackage` and `Link`.
+    """
+    download_urls = OrderedDict()
+    for python_package, matchers in resolved_packages.items():
+        if url_list is not None:
+            url_list.append(python_package)
+        try:
+            links = projects.get_links(python_package.name, python_package.version)
+        except ConnectionError as e:
+            logger.error(
+                "Can not get information about package %s, and the Exception is below.",
+                python_package.name,
+            )
+            logger.error(e)
+            raise
+        links_by_url = {link.url: link for link in links}
+        with stats.timer("select"):
+            file_links = select_file_links(links, python_package)
+            for file in file_links:
+                if url_list is not None:
+                    url_list.append(file)
+                if file.split("#")[0].endswith((".tar.gz", ".zip")):
+                    if no_source and not (source_as_fallback and not wheel_package_exists(file_links)):
+                        continue
+                    download_urls[file] = (python_package, links_by_url[file])
+                    continue
+
+                file_name = url_to_file_name(file)
+                if any(matcher.matches(file_name, any_python=any_python) for matcher, any_python in matchers.items()):
+                    download_urls[file] = (python_package, links_by_url[file])
+    return download_urls
+
  
 def _is_running_32bit() -> bool:
     return sys.maxsize == 2147483647
@@ -352,6 +880,8 @@ def get_platform() -> str:
         return "macosx_{}_{}_{}".format(split_ver[0], split_ver[1], machine)
 
     # XXX remove distutils dependency
+    import distutils.util
+
     result = distutils.util.get_platform().replace(".", "_").replace("-", "_")
     if result == "linux_x86_64" and _is_running_32bit():
         # 32 bit Python program (running on a 64 bit Linux): pip should only
@@ -415,6 +945,12 @@ def get_platform() -> str:
 
 
 def download_package(index_url, directory, package, quiet, platform):
+    # pip and distutils take hundreds of milliseconds to import, they are imported only when the legacy resolver
+    # needs them.
+    import distutils.util
+
+    from pip._internal import main as pip_main
+
     if platform == "original":
         command = [
             sys.executable,
@@ -441,10 +977,14 @@ def download_package(index_url, directory, package, quiet, platform):
     if quiet:
         command.extend(["--progress-bar", "off", "-qqq"])
     try:
-        if platform == "original":
-            subprocess.check_call(command)
-        else:
-            pip_main(command)
+        with stats.timer("pip.download"):
+            if platform == "original":
+                subprocess.check_call(command)
+            else:
+                # pip's main reports a failure by its return code instead of raising.
+                status = pip_main(command)
+                if status:
+                    raise Exception("pip download has exited with the status %s." % status)
     except Exception as e:
         logger.error(
             "Can not use pip download to download the package %s on %s"
@@ -453,3 +993,53 @@ def download_package(index_url, directory, package, quiet, platform):
         logger.error(e)
         return False
     return True
+
+
+def resolve_packages(index_url, packages, quiet, options: List[str] = None) -> Optional[List[str]]:
+    """
+    Resolve all of the packages and their dependencies with one pip invocation.
+
+    `pip install --dry-run --report` is used, so the resolution is done only once for the whole
+    requirement set and the resolved packages are not downloaded into a temporary directory.
+    :param index_url: The index url.
+    :param packages: The requirement specifiers of the packages.
+    :param quiet: Whether to hide the output of pip.
+    :param options: The platform and abi specific options of pip, like the ones of `Target.pip_options`.
+    :return: The names of the files pip would download, or None if pip failed to resolve the packages.
+    """
+    if not packages:
+        return []
+    with TempDirectory(delete=True) as directory:
+        report_file = os.path.join(directory.path, "report.json")
+        command = [
+            sys.executable,
+            "-m",
+            "pip",
+            "install",
+            "--dry-run",
+            "--ignore-installed",
+            "--report",
+            report_file,
+            "-i",
+            index_url,
+            *packages,
+        ]
+        if options:
+            # pip accepts these options only when it installs into a target directory, which is never created
+            # in a dry run.
+            command.extend(["--target", os.path.join(directory.path, "target"), *options])
+        if quiet:
+            command.extend(["--progress-bar", "off", "-qqq"])
+        try:
+            with stats.timer("pip.resolve"):
+                subprocess.check_call(command)
+            with open(report_file, "r", encoding="utf8") as f:
+                report = json.load(f)
+        except (subprocess.CalledProcessError, OSError, ValueError) as e:
+            logger.error(
+                "Can not use pip to resolve the packages %s and Exception is below:"
+                % ", ".join(packages)
+            )
+            logger.error(e)
+            return None
+    return [url_to_file_name(item["download_info"]["url"]) for item in report["install"]]
@@ -0,0 +1,126 @@
+import hashlib
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+# The size of the pieces a file is hashed in. hashlib releases the GIL for large pieces, and fewer
+# calls make the hashing bounded by the disk rather than by the interpreter.
+VERIFY_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def hash_file(path: str, hash_algo: str = "sha256") -> Tuple[str, Optional[str], int]:
+    """
+    Hash a file, through mmap when it is possible and with large buffered reads otherwise.
+    :return: A tuple of the path, the hex digest and the size of the file. The digest is None if the file
+        can not be read.
+    """
+    hasher = hashlib.new(hash_algo)
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            try:
+                # mmap does not support empty files.
+                view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else None
+            except (OSError, ValueError):
+                view = None
+            if view is not None:
+                with view, memoryview(view) as memory:
+                    for start in range(0, size, VERIFY_CHUNK_SIZE):
+                        hasher.update(memory[start:start + VERIFY_CHUNK_SIZE])
+            else:
+                buffer = bytearray(VERIFY_CHUNK_SIZE)
+                memory = memoryview(buffer)
+                size = 0
+                while True:
+                    read = f.readinto(buffer)
+                    if not read:
+                        break
+                    hasher.update(memory[:read])
+                    size += read
+    except OSError:
+        return path, None, 0
+    return path, hasher.hexdigest(), size
+
+
+class VerifyReport:
+    """The result of `verify_files`.
+
+    Attributes:
+        verified
+            The paths of the files which match their hashes.
+        mismatches
+            The paths of the files which do not match their hashes.
+        missing
+            The paths of the files which can not be read.
+        total_bytes
+            The number of bytes hashed.
+        elapsed
+            The number of seconds the verification takes.
+    """
+
+    def __init__(self) -> None:
+        self.verified = []
+        self.mismatches = []
+        self.missing = []
+        self.total_bytes = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self) -> float:
+        """The number of bytes hashed per second."""
+        return self.total_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def verify_files(expected: Dict[str, str], jobs: int = None, hash_algo: str = "sha256") -> VerifyReport:
+    """
+    Check files against their hashes in a pool of processes.
+    :param expected: A dict of the paths of the files pointing to their expected hex digests.
+    :param jobs: The number of processes. Defaults to the number of CPUs.
+    :param hash_algo: The hash algorithm of the expected digests.
+    """
+    report = VerifyReport()
+    # The largest files are hashed first, so that no process is left with a large file at the end.
+    paths = sorted(expected, key=_size, reverse=True)
+    start = time.monotonic()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for path, digest, size in executor.map(hash_file, paths, [hash_algo] * len(paths)):
+            report.total_bytes += size
+            if digest is None:
+                report.missing.append(path)
+            elif digest != expected[path]:
+                report.mismatches.append(path)
+            else:
+                report.verified.append(path)
+    report.elapsed = time.monotonic() - start
+    return report
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def recorded_files(dest_dir: str, index_files: Dict[str, str]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Match the files in a destination directory with their recorded hashes.
+    :param index_files: A dict of file names pointing to their recorded hashes.
+    :return: A tuple of a dict of the paths of the recorded files pointing to their hashes, and the names of the
+        files in dest_dir which have no recorded hash.
+    """
+    expected = {os.path.join(dest_dir, name): digest for name, digest in index_files.items()}
+    unknown = [
+        name
+        for name in sorted(os.listdir(dest_dir))
+        if name not in index_files
+        and not name.startswith(".")
+        and not name.endswith((".part", ".part.json", ".tmp"))
+        and os.path.isfile(os.path.join(dest_dir, name))
+    ]
+    return expected, unknown
@@ -16,7 +16,6 @@ with open('README.md', 'r', encoding='utf-8') as f:
 REQUIRES = [
     'click',
     'requests',
-    'cachecontrol',
     'packaging',
     'retrying',
     'pip-api',
@@ -72,7 +71,8 @@ setup(
     packages=find_packages(),
     entry_points={
         'console_scripts': [
-            'pip-download = pipdownload.cli:pipdownload',
+            'pip-download = pipdownload.cli:main',
+            'pip-download-client = pipdownload.client:main',
         ],
     },
 )
@@ -1,4 +1,5 @@
 import re
+import tempfile
 from pathlib import Path
 
 import pytest
@@ -6,10 +7,14 @@ import requests
 from bs4 import BeautifulSoup
 from pipdownload import settings
 
+from tests.server import serve_directory
+
 SRC_DIR = (Path(__file__).parent / "data").resolve()
 
 # this is a monkey patch of config file
 settings.SETTINGS_FILE = str(SRC_DIR / "settings.json")
+settings.INDEX_CACHE_DIR = tempfile.mkdtemp(prefix="pipdownload-index-")
+settings.RESOLUTION_CACHE_DIR = tempfile.mkdtemp(prefix="pipdownload-resolutions-")
 
 
 @pytest.fixture(scope="module")
@@ -22,6 +27,17 @@ def requirement_file_normal():
     return str(SRC_DIR / "requirements_normal.txt")
 
 
+@pytest.fixture(scope="function")
+def file_server(tmp_path_factory):
+    """
+    Serve a temporary directory over http on localhost.
+    :return: A tuple of the served directory and its base url.
+    """
+    directory = tmp_path_factory.mktemp("server")
+    with serve_directory(directory) as base_url:
+        yield directory, base_url
+
+
 def get_file_num_from_site_pypi_org(
     packege_name: str,  constraints: list = None, no_source: bool = False, package_version: str = None
 ):
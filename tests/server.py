@@ -0,0 +1,137 @@
+"""
+A local simple index, shared by the tests and the benchmarks.
+
+`write_project` writes the files and the pages of a project into a directory, and `serve_directory` serves it
+over http on localhost, the index url is `<base_url>/simple`.
+"""
+import contextlib
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+
+class QuietHTTPRequestHandler(SimpleHTTPRequestHandler):
+    """Serve files quietly, with support of `Range: bytes=<start>-` requests. The `index.json` of a
+    directory is served instead of its `index.html` when the client accepts the JSON simple API (PEP 691)
+    and json_api is true."""
+
+    # HTTP/1.1 keeps connections alive, as a real index does.
+    protocol_version = "HTTP/1.1"
+    json_api = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        match = re.fullmatch(r"bytes=(\d+)-", self.headers.get("Range") or "")
+        path = self.translate_path(self.path)
+        json_path = os.path.join(path, "index.json")
+        accept = self.headers.get("Accept", "")
+        if self.json_api and "application/vnd.pypi.simple.v1+json" in accept and os.path.isfile(json_path):
+            with open(json_path, "rb") as f:
+                content = f.read()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.pypi.simple.v1+json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        if match is None or not os.path.isfile(path):
+            return super().do_GET()
+        start = int(match.group(1))
+        size = os.path.getsize(path)
+        if start >= size:
+            self.send_error(416)
+            return
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Content-Range", "bytes %d-%d/%d" % (start, size - 1, size))
+        self.send_header("Content-Length", str(size - start))
+        self.end_headers()
+        with open(path, "rb") as f:
+            f.seek(start)
+            shutil.copyfileobj(f, self.wfile)
+
+
+class HTMLOnlyHTTPRequestHandler(QuietHTTPRequestHandler):
+    json_api = False
+
+
+@contextlib.contextmanager
+def serve_directory(directory: str, json_api: bool = True):
+    """
+    Serve a directory over http on localhost.
+    :param json_api: Whether the JSON pages are served to the clients which accept them.
+    :return: The base url of the server.
+    """
+    handler_class = QuietHTTPRequestHandler if json_api else HTMLOnlyHTTPRequestHandler
+    handler = partial(handler_class, directory=str(directory))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield "http://127.0.0.1:%d" % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def metadata(name: str, version: str, *requires_dist: str) -> str:
+    """Return the core metadata of a distribution."""
+    lines = ["Metadata-Version: 2.1", "Name: %s" % name, "Version: %s" % version]
+    lines.extend("Requires-Dist: %s" % requirement for requirement in requires_dist)
+    return "\n".join(lines) + "\n"
+
+
+def write_project(directory: Path, name: str, files: list, json_page: bool = False):
+    """
+    Write the files of a project and its simple index page into a served directory.
+    :param directory: The served directory, the index url is `<base_url>/simple`.
+    :param name: The name of the project.
+    :param files: A list of dicts with the keys `filename`, `content` and optional `metadata`,
+        `requires_python`.
+    :param json_page: Whether the PEP 691 JSON page is written besides the HTML page.
+    """
+    directory = Path(directory)
+    (directory / "packages").mkdir(exist_ok=True)
+    anchors = []
+    json_files = []
+    for file in files:
+        filename = file["filename"]
+        content = file["content"]
+        (directory / "packages" / filename).write_bytes(content)
+        attrs = ""
+        json_file = {
+            "filename": filename,
+            "url": "../../packages/%s" % filename,
+            "hashes": {"sha256": hashlib.sha256(content).hexdigest()},
+            "size": len(content),
+        }
+        if file.get("requires_python"):
+            json_file["requires-python"] = file["requires_python"]
+            attrs += ' data-requires-python="%s"' % file["requires_python"].replace(">", "&gt;").replace("<", "&lt;")
+        if file.get("metadata") is not None:
+            metadata = file["metadata"].encode()
+            (directory / "packages" / (filename + ".metadata")).write_bytes(metadata)
+            attrs += ' data-core-metadata="sha256=%s"' % hashlib.sha256(metadata).hexdigest()
+            json_file["core-metadata"] = {"sha256": hashlib.sha256(metadata).hexdigest()}
+        json_files.append(json_file)
+        anchors.append(
+            '<a href="../../packages/%s#sha256=%s"%s>%s</a><br/>'
+            % (filename, hashlib.sha256(content).hexdigest(), attrs, filename)
+        )
+    page = directory / "simple" / name
+    page.mkdir(parents=True, exist_ok=True)
+    (page / "index.html").write_text(
+        "<!DOCTYPE html><html><body>\n%s\n</body></html>" % "\n".join(anchors)
+    )
+    if json_page:
+        page_json = {"meta": {"api-version": "1.0"}, "name": name, "files": json_files}
+        (page / "index.json").write_text(json.dumps(page_json))
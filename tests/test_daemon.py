@@ -0,0 +1,119 @@
+import os
+import stat
+import threading
+
+import pytest
+from pipdownload.client import request
+from pipdownload.daemon import Daemon
+from pipdownload.daemon import make_server
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+@pytest.fixture(scope="function")
+def daemon_socket(tmp_path):
+    daemon = Daemon(max_jobs=1, jobs=2)
+    socket_path = str(tmp_path / "daemon.sock")
+    server = make_server(daemon, socket_path=socket_path)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield daemon, socket_path
+    server.shutdown()
+    server.server_close()
+    daemon.shutdown()
+
+
+def test_daemon_jobs(file_server, daemon_socket, tmp_path):
+    directory, base_url = file_server
+    daemon, socket_path = daemon_socket
+    write_project(
+        directory,
+        "demo",
+        [
+            {"filename": "demo-1.0-py3-none-any.whl", "content": b"demo", "metadata": metadata("demo", "1.0", "dep")},
+            {"filename": "demo-1.0.tar.gz", "content": b"sdist"},
+        ],
+    )
+    write_project(directory, "dep", [{"filename": "dep-2.0-py3-none-any.whl", "content": b"dep",
+                                      "metadata": metadata("dep", "2.0")}])
+    job = {"requirements": ["demo"], "index_url": base_url + "/simple", "dest_dir": str(tmp_path / "dest")}
+
+    status, data = request("POST", "/jobs?wait=0", job, socket_path=socket_path)
+    assert status == 200
+    assert data["state"] == "done", data["error"]
+    assert sorted(data["result"]["files"]) == ["demo-1.0-py3-none-any.whl", "demo-1.0.tar.gz", "dep-2.0-py3-none-any.whl"]
+    assert not data["result"]["resolution_cached"]
+    assert sorted(path.name for path in (tmp_path / "dest").iterdir()) == sorted(data["result"]["files"])
+
+    # The same job is answered from the warm caches, without any index request.
+    fetched = daemon.status()["stats"]["counters"].get("index.fetched")
+    plan = str(tmp_path / "plan.json")
+    status, data = request("POST", "/jobs", dict(job, dest_dir=None, plan=plan, no_source=True), socket_path=socket_path)
+    assert status in (200, 202)
+    status, data = request("GET", "/jobs/%d?wait=10" % data["id"], socket_path=socket_path)
+    assert data["state"] == "done", data["error"]
+    assert data["result"]["resolution_cached"]
+    assert sorted(data["result"]["files"]) == ["demo-1.0-py3-none-any.whl", "dep-2.0-py3-none-any.whl"]
+    assert daemon.status()["stats"]["counters"].get("index.fetched") == fetched
+
+    status, data = request("GET", "/status", socket_path=socket_path)
+    assert data["jobs"]["done"] == 2
+    assert data["cached_projects"] == 2
+
+    # A file which does not match its hash fails the job, and is not listed among the downloaded files.
+    (directory / "packages" / "demo-1.0.tar.gz").write_bytes(b"tampered")
+    status, data = request("POST", "/jobs?wait=0", dict(job, dest_dir=str(tmp_path / "other")), socket_path=socket_path)
+    assert data["state"] == "failed"
+    assert data["result"]["failed"] == ["demo-1.0.tar.gz"]
+    assert "demo-1.0.tar.gz" in data["error"]
+    assert sorted(data["result"]["files"]) == ["demo-1.0-py3-none-any.whl", "dep-2.0-py3-none-any.whl"]
+
+
+def test_daemon_invalid_job(daemon_socket):
+    _, socket_path = daemon_socket
+    status, data = request("POST", "/jobs", {"requirements": ["demo"], "dest_dir": "relative"}, socket_path=socket_path)
+    assert status == 400
+    status, data = request("POST", "/jobs", {"packages": ["demo"]}, socket_path=socket_path)
+    assert status == 400
+    assert "packages" in data["error"]
+    status, data = request("GET", "/jobs/42", socket_path=socket_path)
+    assert status == 404
+    job = {"requirements": ["demo"], "dest_dir": "/nonexistent/dest"}
+    for wait in ("soon", "-1", "inf"):
+        status, data = request("POST", "/jobs?wait=" + wait, job, socket_path=socket_path)
+        assert status == 400 and "wait" in data["error"]
+    status, data = request("GET", "/status", socket_path=socket_path)
+    assert sum(data["jobs"].values()) == 0
+
+
+def test_daemon_socket_mode(daemon_socket):
+    _, socket_path = daemon_socket
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+
+
+def test_daemon_tcp_token(tmp_path):
+    daemon = Daemon(max_jobs=1, jobs=1, allowed_roots=[str(tmp_path / "mirror")])
+    with pytest.raises(ValueError):
+        make_server(daemon, port=0)
+    server = make_server(daemon, port=0, token="secret")
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        url = "http://%s:%d" % server.server_address[:2]
+        for token in (None, "wrong"):
+            status, data = request("GET", "/status", url=url, token=token)
+            assert status == 401
+            status, data = request("POST", "/jobs", {"requirements": ["demo"]}, url=url, token=token)
+            assert status == 401
+        status, data = request("GET", "/status", url=url, token="secret")
+        assert status == 200
+        job = {"requirements": ["demo"], "dest_dir": str(tmp_path / "other")}
+        status, data = request("POST", "/jobs", job, url=url, token="secret")
+        assert status == 400 and "dest_dir" in data["error"]
+        status, data = request("POST", "/jobs", dict(job, dest_dir=str(tmp_path / "mirror" / "..")), url=url, token="secret")
+        assert status == 400
+    finally:
+        server.shutdown()
+        server.server_close()
+        daemon.shutdown()
@@ -0,0 +1,168 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+import requests
+from click.testing import CliRunner
+from pipdownload.cli import pipdownload
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.index import IndexCache
+from pipdownload.index import IndexClient
+from pipdownload.index import ProjectIndex
+from pipdownload.index import iter_links
+from pipdownload.index import parse_links
+from pipdownload.manifest import read_manifest
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_parse_links(shared_datadir: Path):
+    with (shared_datadir / "click.html").open() as f:
+        html_doc = f.read()
+    links = parse_links(html_doc, "https://mirrors.aliyun.com/pypi/simple/click/")
+    assert len(links) == 68
+    link = links[0]
+    assert link.filename == "Click-7.0-py2.py3-none-any.whl"
+    assert link.url.startswith("https://mirrors.aliyun.com/pypi/packages/")
+    assert link.requires_python == ">=2.7, !=3.0.*, !=3.1.*, !=3.2.*, !=3.3.*"
+    assert not link.yanked
+    assert link.metadata_url is None
+
+
+def test_iter_links_chunks(shared_datadir: Path):
+    with (shared_datadir / "click.html").open() as f:
+        html_doc = f.read()
+    base_url = "https://mirrors.aliyun.com/pypi/simple/click/"
+    chunks = (html_doc[i:i + 7] for i in range(0, len(html_doc), 7))
+    links = list(iter_links(chunks, base_url))
+    assert [link.url for link in links] == [link.url for link in parse_links(html_doc, base_url)]
+
+    links = list(iter_links((html_doc,), base_url, contains="7.0"))
+    assert {link.filename for link in links} == {"Click-7.0-py2.py3-none-any.whl", "Click-7.0.tar.gz"}
+
+
+def test_index_cache(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    write_project(directory, "demo", [{"filename": "demo-1.0.tar.gz", "content": b"1.0"}])
+    cache = IndexCache(str(tmp_path), 1024 * 1024, ttl=0)
+    index = IndexClient(requests.Session(), base_url + "/simple", cache=cache)
+    assert [link.filename for link in index.get_links("demo")] == ["demo-1.0.tar.gz"]
+    # The page is revalidated with If-Modified-Since as the ttl is 0.
+    assert [link.filename for link in index.get_links("demo")] == ["demo-1.0.tar.gz"]
+
+    offline_index = IndexClient(None, base_url + "/simple", cache=cache, offline=True)
+    assert [link.filename for link in offline_index.get_links("demo")] == ["demo-1.0.tar.gz"]
+    with pytest.raises(IndexPageNotCached):
+        offline_index.get_links("other")
+
+
+def test_index_cache_eviction(tmp_path: Path):
+    cache = IndexCache(str(tmp_path), 3000, ttl=600)
+    for i in range(5):
+        url = "https://example.com/simple/p%d/" % i
+        cache.set(url, {"fetched_at": i}, b"x" * 1000)
+        # Make the access times distinct even on file systems with coarse timestamps.
+        os.utime(cache._paths(url)[0], (i, i))
+    assert len(list(tmp_path.glob("*.body"))) == 2
+    assert cache.get("https://example.com/simple/p4/") is not None
+    assert cache.get("https://example.com/simple/p0/") is None
+
+
+def test_index_cache_scans(tmp_path: Path, monkeypatch):
+    # The cache directory is scanned when the first page is stored and when the cache is full, not on every write.
+    scans = []
+    listdir = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda path: scans.append(path) or listdir(path))
+    cache = IndexCache(str(tmp_path), 100 * 1024, ttl=600)
+    for i in range(50):
+        cache.set("https://example.com/simple/p%d/" % i, {"fetched_at": i}, b"x" * 1000)
+    assert len(scans) == 1
+    for i in range(50, 150):
+        cache.set("https://example.com/simple/p%d/" % i, {"fetched_at": i}, b"x" * 1000)
+    assert 1 < len(scans) < 20
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 100 * 1024
+
+
+def test_json_page(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    files = [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": b"whl", "metadata": "Name: demo\n",
+         "requires_python": ">=3.6"},
+        {"filename": "demo-1.0.tar.gz", "content": b"sdist"},
+    ]
+    write_project(directory, "demo", files, json_page=True)
+    write_project(directory, "other", files)
+    cache = IndexCache(str(tmp_path), 1024 * 1024, ttl=600)
+    index = IndexClient(requests.Session(), base_url + "/simple", cache=cache)
+
+    _, _, content_type = index.open_page("demo")
+    assert content_type == "application/vnd.pypi.simple.v1+json"
+    _, _, content_type = index.open_page("other")
+    assert content_type == "text/html"
+
+    json_links = index.get_links("demo")
+    html_links = index.get_links("other")
+    assert [link.url for link in json_links] == [link.url for link in html_links]
+    for json_link, html_link in zip(json_links, html_links):
+        assert json_link.filename == html_link.filename
+        assert json_link.requires_python == html_link.requires_python
+        assert json_link.metadata == html_link.metadata
+        assert json_link.yanked == html_link.yanked
+
+    # The content type is kept in the cache.
+    offline_index = IndexClient(None, base_url + "/simple", cache=cache, offline=True)
+    assert [link.url for link in offline_index.get_links("demo")] == [link.url for link in json_links]
+
+
+def test_project_index(file_server):
+    directory, base_url = file_server
+    write_project(
+        directory,
+        "demo",
+        [
+            {"filename": "demo-1.0-py3-none-any.whl", "content": b"1.0"},
+            {"filename": "demo-1.0.tar.gz", "content": b"1.0"},
+            {"filename": "demo-2.0.tar.gz", "content": b"2.0"},
+            {"filename": "demo-2.0.exe", "content": b"2.0"},
+        ],
+    )
+    session = requests.Session()
+    requested = []
+    session.hooks["response"].append(lambda response, *args, **kwargs: requested.append(response.url))
+    projects = ProjectIndex(IndexClient(session, base_url + "/simple"))
+
+    assert projects.get_versions("Demo") == ["1.0", "2.0"]
+    assert [link.filename for link in projects.get_links("demo", "1.0")] == [
+        "demo-1.0-py3-none-any.whl", "demo-1.0.tar.gz", "demo-2.0.exe"
+    ]
+    assert [link.filename for link in projects.get_links("demo", "2.0.0")] == ["demo-2.0.tar.gz", "demo-2.0.exe"]
+    assert len(projects.get_links("demo")) == 4
+    assert len(requested) == 1
+
+    # A page looked up by many threads at once is fetched once.
+    requested.clear()
+    projects = ProjectIndex(IndexClient(session, base_url + "/simple"))
+    with ThreadPoolExecutor(8) as executor:
+        results = list(executor.map(projects.get_links, ["demo"] * 16))
+    assert all(links is results[0] for links in results)
+    assert len(requested) == 1
+
+
+def test_offline_index_option(file_server, tmp_path: Path, caplog):
+    directory, base_url = file_server
+    write_project(directory, "cold", [
+        {"filename": "cold-1.0-py3-none-any.whl", "content": b"1.0", "metadata": metadata("cold", "1.0")},
+    ])
+    args = ["cold", "-i", base_url + "/simple", "--offline-index", "--refresh-resolution"]
+    result = CliRunner().invoke(pipdownload, args + ["-d", str(tmp_path / "first")])
+    assert result.exit_code != 0
+    assert "The index pages of cold are not in the index cache" in caplog.text
+    assert list((tmp_path / "first").iterdir()) == []
+
+    result = CliRunner().invoke(pipdownload, ["cold", "-i", base_url + "/simple", "-d", str(tmp_path / "second")])
+    assert result.exit_code == 0, result.output
+    result = CliRunner().invoke(pipdownload, args + ["-d", str(tmp_path / "third"), "--plan", str(tmp_path / "plan.json")])
+    assert result.exit_code == 0, result.output
+    assert [entry["filename"] for entry in read_manifest(str(tmp_path / "plan.json"))] == ["cold-1.0-py3-none-any.whl"]
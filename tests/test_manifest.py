@@ -0,0 +1,86 @@
+import hashlib
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+from pipdownload.cli import pipdownload
+from pipdownload.index import Link
+from pipdownload.manifest import entry_url
+from pipdownload.manifest import make_entry
+from pipdownload.manifest import read_manifest
+from pipdownload.manifest import write_manifest
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_manifest(tmp_path: Path):
+    link = Link(
+        "demo-1.0-py2.py3-none-any.whl",
+        "https://example.com/demo-1.0-py2.py3-none-any.whl#sha256=abc",
+        size=3,
+    )
+    entry = make_entry("demo", "1.0", link)
+    assert entry == {
+        "name": "demo",
+        "version": "1.0",
+        "filename": "demo-1.0-py2.py3-none-any.whl",
+        "url": "https://example.com/demo-1.0-py2.py3-none-any.whl",
+        "hash": "sha256=abc",
+        "sha256": "abc",
+        "size": 3,
+        "tags": ["py2-none-any", "py3-none-any"],
+    }
+    assert entry_url(entry) == link.url
+    sdist_entry = make_entry("demo", "1.0", Link("demo-1.0.tar.gz", "https://example.com/demo-1.0.tar.gz"))
+    assert sdist_entry["tags"] is None and sdist_entry["hash"] is None and sdist_entry["sha256"] is None
+    assert entry_url(sdist_entry) == "https://example.com/demo-1.0.tar.gz"
+    md5_link = Link("demo-1.0.zip", "https://example.com/demo-1.0.zip#md5=def")
+    md5_entry = make_entry("demo", "1.0", md5_link)
+    assert md5_entry["hash"] == "md5=def" and md5_entry["sha256"] is None
+    assert entry_url(md5_entry) == md5_link.url
+
+    for name in ("manifest.json", "manifest.jsonl"):
+        path = str(tmp_path / name)
+        write_manifest(path, iter([entry, sdist_entry, md5_entry]))
+        assert read_manifest(path) == [entry, sdist_entry, md5_entry]
+
+
+def test_plan_and_from_manifest(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    write_project(directory, "demo", [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": b"wheel", "metadata": metadata("demo", "1.0")},
+        {"filename": "demo-1.0.tar.gz", "content": b"sdist"},
+    ], json_page=True)
+    manifest = str(tmp_path / "manifest.jsonl")
+    dest_dir = tmp_path / "dest"
+    runner = CliRunner()
+    result = runner.invoke(pipdownload, ["demo", "-i", base_url + "/simple", "-d", str(dest_dir), "--plan", manifest])
+    assert result.exit_code == 0, result.output
+    assert list(dest_dir.iterdir()) == []
+    entries = read_manifest(manifest)
+    assert sorted(entry["filename"] for entry in entries) == ["demo-1.0-py3-none-any.whl", "demo-1.0.tar.gz"]
+    assert all(entry["sha256"] and entry["name"] == "demo" and entry["version"] == "1.0" for entry in entries)
+
+    result = runner.invoke(pipdownload, ["-d", str(dest_dir), "--from-manifest", manifest])
+    assert result.exit_code == 0, result.output
+    assert sorted(path.name for path in dest_dir.iterdir()) == ["demo-1.0-py3-none-any.whl", "demo-1.0.tar.gz"]
+
+    # Files without a hash, or with one which is not a sha256, are downloaded from a manifest too.
+    contents = {"other-1.0.tar.gz": b"no hash", "other-1.0.zip": b"md5 hash"}
+    for file_name, content in contents.items():
+        (directory / file_name).write_bytes(content)
+    write_manifest(str(tmp_path / "other.json"), [
+        make_entry("other", "1.0", Link("other-1.0.tar.gz", base_url + "/other-1.0.tar.gz")),
+        make_entry("other", "1.0", Link(
+            "other-1.0.zip", base_url + "/other-1.0.zip#md5=" + hashlib.md5(contents["other-1.0.zip"]).hexdigest()
+        )),
+    ])
+    other_dir = tmp_path / "other"
+    result = runner.invoke(pipdownload, ["-d", str(other_dir), "--from-manifest", str(tmp_path / "other.json")])
+    assert result.exit_code == 0, result.output
+    assert {path.name: path.read_bytes() for path in other_dir.iterdir()} == contents
+
+    (tmp_path / "broken.json").write_text(json.dumps({"files": []}))
+    result = runner.invoke(pipdownload, ["-d", str(dest_dir), "--from-manifest", str(tmp_path / "broken.json")])
+    assert result.exit_code != 0
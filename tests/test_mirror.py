@@ -0,0 +1,44 @@
+import hashlib
+import os
+from pathlib import Path
+
+from pipdownload.mirror import MirrorIndex
+from pipdownload.utils import Hashes
+from pipdownload.utils import download_all
+
+
+def test_mirror_index(file_server, tmp_path: Path, monkeypatch):
+    directory, base_url = file_server
+    urls = []
+    for i in range(3):
+        content = str(i).encode() * 1024
+        (directory / ("demo%d-1.0.tar.gz" % i)).write_bytes(content)
+        urls.append("%s/demo%d-1.0.tar.gz#sha256=%s" % (base_url, i, hashlib.sha256(content).hexdigest()))
+    dest_dir = tmp_path / "dest"
+    dest_dir.mkdir()
+
+    mirror_index = MirrorIndex(str(dest_dir))
+    download_all(urls, str(dest_dir), quiet=True, mirror_index=mirror_index)
+    assert mirror_index.added == {"demo0-1.0.tar.gz", "demo1-1.0.tar.gz", "demo2-1.0.tar.gz"}
+
+    # The unchanged files are skipped without being read.
+    hashed = []
+    check_against_path = Hashes.check_against_path
+    monkeypatch.setattr(
+        Hashes, "check_against_path", lambda self, path: hashed.append(path) or check_against_path(self, path)
+    )
+    os.utime(str(dest_dir / "demo1-1.0.tar.gz"), ns=(0, 0))
+    (dest_dir / "demo2-1.0.tar.gz").write_bytes(b"tampered")
+    mirror_index = MirrorIndex(str(dest_dir))
+    download_all(urls[1:], str(dest_dir), quiet=True, mirror_index=mirror_index)
+    # The files are checked by concurrent downloads, in any order.
+    assert sorted(hashed) == [str(dest_dir / "demo1-1.0.tar.gz"), str(dest_dir / "demo2-1.0.tar.gz")]
+    assert mirror_index.unchanged == {"demo1-1.0.tar.gz"}
+    assert mirror_index.added == {"demo2-1.0.tar.gz"}
+    assert mirror_index.removed(["demo1-1.0.tar.gz", "demo2-1.0.tar.gz"]) == {"demo0-1.0.tar.gz"}
+
+    hashed.clear()
+    mirror_index = MirrorIndex(str(dest_dir))
+    download_all(urls, str(dest_dir), quiet=True, mirror_index=mirror_index)
+    assert hashed == []
+    assert len(mirror_index.unchanged) == 3
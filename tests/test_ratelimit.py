@@ -0,0 +1,108 @@
+import hashlib
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+from pipdownload.ratelimit import HostRateLimiter
+from pipdownload.ratelimit import TokenBucket
+from pipdownload.ratelimit import parse_rate
+from pipdownload.ratelimit import parse_retry_after
+from pipdownload.session import make_session
+from pipdownload.utils import download_all
+
+
+def test_parse_rate():
+    assert parse_rate("512") == 512
+    assert parse_rate("500K") == 500 * 1024
+    assert parse_rate("20M") == 20 * 1024 * 1024
+    assert parse_rate("1.5g") == 1.5 * 1024 ** 3
+    assert parse_rate("20MiB") == 20 * 1024 * 1024
+    for text in ("", "M", "0", "20X"):
+        with pytest.raises(ValueError):
+            parse_rate(text)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7
+    assert 25 < parse_retry_after(formatdate(time.time() + 30, usegmt=True)) <= 30
+    assert parse_retry_after(formatdate(time.time() - 30, usegmt=True)) == 0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+
+
+def test_token_bucket():
+    bucket = TokenBucket(1000)
+    assert bucket.reserve(1000) == 0
+    assert 0.4 < bucket.reserve(500) <= 0.5
+    # Chunks larger than the burst are allowed, they are paid back later.
+    assert 1.9 < bucket.reserve(1500) <= 2.0
+
+
+def test_host_rate_limiter():
+    limiter = HostRateLimiter(rate=20)
+    started = time.monotonic()
+    for _ in range(30):
+        limiter.acquire("a.example.com")
+    assert time.monotonic() - started >= 0.4
+    limiter.pause("a.example.com", 0.2)
+    started = time.monotonic()
+    limiter.acquire("b.example.com")
+    assert time.monotonic() - started < 0.1
+    limiter.acquire("a.example.com")
+    assert time.monotonic() - started >= 0.15
+
+
+class RateLimitedHandler(BaseHTTPRequestHandler):
+    """Answer `429 Too Many Requests` to the first request of every path."""
+
+    seen = set()
+    content = b"x" * 1024
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path not in self.seen:
+            self.seen.add(self.path)
+            self.send_response(429)
+            self.send_header("Retry-After", "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(self.content)))
+        self.end_headers()
+        self.wfile.write(self.content)
+
+
+def test_session_retries_429():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RateLimitedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        session = make_session()
+        started = time.monotonic()
+        response = session.get("http://127.0.0.1:%d/simple/" % server.server_address[1])
+        assert response.status_code == 200
+        assert time.monotonic() - started >= 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_download_all_limit_rate(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    content = b"0" * 100 * 1024
+    sha256 = hashlib.sha256(content).hexdigest()
+    urls = []
+    for i in range(2):
+        (directory / ("demo-%d.tar.gz" % i)).write_bytes(content)
+        urls.append("%s/demo-%d.tar.gz#sha256=%s" % (base_url, i, sha256))
+    started = time.monotonic()
+    # The files are downloaded at the same time, but 200 KiB take 0.5 s at 400 KiB/s together.
+    download_all(urls, str(tmp_path), jobs=2, quiet=True, bandwidth=TokenBucket(400 * 1024, burst=1))
+    assert time.monotonic() - started >= 0.45
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["demo-0.tar.gz", "demo-1.tar.gz"]
@@ -0,0 +1,72 @@
+import os
+import time
+from pathlib import Path
+
+from click.testing import CliRunner
+from pipdownload import settings
+from pipdownload.cli import pipdownload
+from pipdownload.resolutions import ResolutionCache
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_resolution_cache(tmp_path: Path):
+    cache = ResolutionCache(str(tmp_path / "resolutions"), ttl=60)
+    key = cache.key(["Flask>=2.0,<3", "requests[socks,security]"], [], "https://pypi.org/simple/")
+    # Equivalent requirements, in any order, share the resolution.
+    assert key == cache.key(["requests[security,socks]", "flask<3,>=2.0"], [], "https://pypi.org/simple")
+    assert key != cache.key(["flask<3,>=2.0"], [], "https://pypi.org/simple")
+    assert key != cache.key(["flask<3,>=2.0", "requests[socks,security]"], ["cp311-win_amd64"], "https://pypi.org/simple")
+    # The resolvers and the options changing the resolution do not share it.
+    requirements = ["flask<3,>=2.0", "requests[socks,security]"]
+    assert key == cache.key(requirements, [], "https://pypi.org/simple", resolver="metadata")
+    assert key != cache.key(requirements, [], "https://pypi.org/simple", resolver="batch")
+    assert key != cache.key(requirements, [], "https://pypi.org/simple", resolver="legacy")
+    assert key != cache.key(requirements, [], "https://pypi.org/simple", options=["--no-deps"])
+
+    assert cache.get(key) is None
+    resolved = [("flask-2.3.3-py3-none-any.whl", None), ("requests-2.31.0-py3-none-any.whl", None)]
+    cache.set(key, resolved, ["flask<3,>=2.0", "requests[socks,security]"])
+    assert cache.get(key) == resolved
+
+    cache.ttl = 0
+    time.sleep(0.01)
+    assert cache.get(key) is None
+    assert cache.get(key, expired=True) == resolved
+    cache.invalidate(key)
+    assert cache.get(key, expired=True) is None
+    assert not os.listdir(cache.directory)
+
+
+def test_resolution_cache_options(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    files = [{"filename": "demo-1.0-py3-none-any.whl", "content": b"1", "metadata": metadata("demo", "1.0")}]
+    write_project(directory, "demo", files)
+    args = ["demo", "-i", base_url + "/simple", "--no-index-cache"]
+    result = CliRunner().invoke(pipdownload, args + ["-d", str(tmp_path / "first")])
+    assert result.exit_code == 0, result.output
+
+    # A new release is not seen while the resolution is cached.
+    files.append({"filename": "demo-2.0-py3-none-any.whl", "content": b"2", "metadata": metadata("demo", "2.0")})
+    write_project(directory, "demo", files)
+    result = CliRunner().invoke(pipdownload, args + ["-d", str(tmp_path / "second"), "--stats"])
+    assert result.exit_code == 0, result.output
+    assert "resolve.cache_hits" in result.output
+    assert os.listdir(str(tmp_path / "second")) == ["demo-1.0-py3-none-any.whl"]
+
+    result = CliRunner().invoke(pipdownload, args + ["-d", str(tmp_path / "third"), "--refresh-resolution"])
+    assert result.exit_code == 0, result.output
+    assert os.listdir(str(tmp_path / "third")) == ["demo-2.0-py3-none-any.whl"]
+
+
+def test_failed_resolution_not_cached(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    write_project(directory, "demo", [])
+    index_url = base_url + "/simple"
+    args = ["demo", "-i", index_url, "--no-index-cache", "--resolver", "legacy", "-d", str(tmp_path)]
+    result = CliRunner().invoke(pipdownload, args)
+    assert result.exit_code != 0
+    assert list(tmp_path.iterdir()) == []
+    cache = ResolutionCache(settings.RESOLUTION_CACHE_DIR, ttl=3600)
+    assert cache.get(cache.key(["demo"], [], index_url, resolver="legacy")) is None
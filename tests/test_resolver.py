@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+import requests
+from pipdownload.exceptions import IndexPageNotCached
+from pipdownload.exceptions import MetadataResolutionError
+from pipdownload.index import IndexCache
+from pipdownload.index import IndexClient
+from pipdownload.resolver import MetadataResolver
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_metadata_resolver(file_server):
+    directory, base_url = file_server
+    write_project(directory, "demo", [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": b"1.0", "metadata": metadata("demo", "1.0")},
+        {"filename": "demo-2.0-py3-none-any.whl", "content": b"2.0",
+         "metadata": metadata("demo", "2.0", "six>=1.0", 'pywin32; sys_platform == "never"', 'extra-dep; extra == "x"')},
+        {"filename": "demo-2.0.tar.gz", "content": b"2.0"},
+    ])
+    write_project(directory, "six", [
+        {"filename": "six-1.16.0-py2.py3-none-any.whl", "content": b"six", "metadata": metadata("six", "1.16.0")},
+    ])
+    write_project(directory, "extra-dep", [
+        {"filename": "extra_dep-0.1-py3-none-any.whl", "content": b"x", "metadata": metadata("extra-dep", "0.1")},
+    ])
+    resolver = MetadataResolver(IndexClient(requests.Session(), base_url + "/simple"))
+    assert resolver.resolve(["demo"]) == ["demo-2.0-py3-none-any.whl", "six-1.16.0-py2.py3-none-any.whl"]
+    assert resolver.resolve(["demo[x]<3"]) == [
+        "demo-2.0-py3-none-any.whl", "six-1.16.0-py2.py3-none-any.whl", "extra_dep-0.1-py3-none-any.whl"
+    ]
+    assert resolver.resolve(["demo==1.0"]) == ["demo-1.0-py3-none-any.whl"]
+    with pytest.raises(MetadataResolutionError):
+        resolver.resolve(["demo", "six<1"])
+
+
+def test_metadata_resolver_without_metadata(file_server):
+    directory, base_url = file_server
+    write_project(directory, "demo", [{"filename": "demo-1.0.tar.gz", "content": b"1.0"}])
+    resolver = MetadataResolver(IndexClient(requests.Session(), base_url + "/simple"))
+    with pytest.raises(MetadataResolutionError):
+        resolver.resolve(["demo"])
+
+
+def test_metadata_resolver_offline(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    write_project(directory, "demo", [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": b"1.0", "metadata": metadata("demo", "1.0", "six")},
+    ])
+    write_project(directory, "six", [
+        {"filename": "six-1.16.0-py2.py3-none-any.whl", "content": b"six", "metadata": metadata("six", "1.16.0")},
+    ])
+    cache = IndexCache(str(tmp_path / "cache"), max_size=2 ** 20, ttl=60)
+    with pytest.raises(IndexPageNotCached):
+        MetadataResolver(IndexClient(None, base_url + "/simple", cache=cache, offline=True)).resolve(["demo"])
+    expected = ["demo-1.0-py3-none-any.whl", "six-1.16.0-py2.py3-none-any.whl"]
+    assert MetadataResolver(IndexClient(requests.Session(), base_url + "/simple", cache=cache)).resolve(["demo"]) == expected
+    # The pages and the metadata are served from the cache only, without a session.
+    assert MetadataResolver(IndexClient(None, base_url + "/simple", cache=cache, offline=True)).resolve(["demo"]) == expected
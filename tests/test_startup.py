@@ -0,0 +1,36 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT_DIR = Path(__file__).parent.parent
+# The modules which take long to import and are only needed by the commands using the index and pip.
+HEAVY_MODULES = ("pip_api", "pip._internal", "distutils.util", "setuptools", "requests", "urllib3", "packaging")
+
+
+def imported_modules(*args) -> set:
+    """Run python with `-X importtime` and return the names of all the modules it has imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", *args], cwd=str(ROOT_DIR), capture_output=True, text=True, check=True
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["-c", "import pipdownload.cli"],
+        ["-m", "pipdownload", "--help"],
+        ["-m", "pipdownload", "verify", "--help"],
+        ["-c", "import pipdownload.client"],
+    ],
+)
+def test_startup_imports(args):
+    imported = imported_modules(*args)
+    assert imported.isdisjoint(HEAVY_MODULES), sorted(imported.intersection(HEAVY_MODULES))
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+from click.testing import CliRunner
+from pipdownload.cli import pipdownload
+from pipdownload.stats import Stats
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_stats(tmp_path: Path):
+    stats = Stats()
+    stats.reset(trace=True)
+    for _ in range(2):
+        with stats.timer("stage"):
+            pass
+    stats.add_time("pieces", 0.5)
+    stats.count("files")
+    stats.count("bytes", 10)
+    data = stats.to_dict()
+    assert data["timers"]["stage"]["calls"] == 2
+    assert data["timers"]["pieces"]["total"] == 0.5
+    assert data["counters"] == {"files": 1, "bytes": 10}
+    assert [line.split()[0] for line in stats.summary()] == ["stage", "stage", "pieces", "files", "bytes"]
+
+    trace = str(tmp_path / "trace.json")
+    stats.write_trace(trace)
+    with open(trace) as f:
+        events = json.load(f)["traceEvents"]
+    # Only the calls with a start time are traced.
+    assert [event["name"] for event in events] == ["stage", "stage"]
+
+
+def test_stats_options(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    write_project(directory, "demo", [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": b"wheel", "metadata": metadata("demo", "1.0")},
+    ])
+    stats_json = str(tmp_path / "stats.json")
+    trace = str(tmp_path / "trace.json")
+    result = CliRunner().invoke(pipdownload, [
+        "demo", "-i", base_url + "/simple", "-d", str(tmp_path / "dest"), "--no-index-cache",
+        "--stats", "--stats-json", stats_json, "--trace", trace,
+    ])
+    assert result.exit_code == 0, result.output
+    assert "download.transfer" in result.output
+    with open(stats_json) as f:
+        data = json.load(f)
+    assert {"resolve", "resolve.metadata", "index.request", "select", "download_all"} <= set(data["timers"])
+    assert data["counters"]["download.bytes"] == len(b"wheel")
+    assert data["counters"]["download.completed"] == 1
+    with open(trace) as f:
+        assert json.load(f)["traceEvents"]
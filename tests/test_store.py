@@ -0,0 +1,33 @@
+import hashlib
+import os
+from pathlib import Path
+
+from pipdownload.store import ArtifactStore
+from pipdownload.utils import download_all
+
+
+def test_artifact_store(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    content = b"demo" * 1024
+    (directory / "demo-1.0.tar.gz").write_bytes(content)
+    sha256 = hashlib.sha256(content).hexdigest()
+    url = "%s/demo-1.0.tar.gz#sha256=%s" % (base_url, sha256)
+    store = ArtifactStore(str(tmp_path / "store"))
+
+    (tmp_path / "a").mkdir()
+    download_all([url], str(tmp_path / "a"), quiet=True, store=store)
+    assert store.contains(sha256)
+
+    # The file is materialized from the store without requesting the server.
+    (directory / "demo-1.0.tar.gz").unlink()
+    (tmp_path / "b").mkdir()
+    download_all([url], str(tmp_path / "b"), quiet=True, store=store)
+    assert (tmp_path / "b" / "demo-1.0.tar.gz").read_bytes() == content
+
+    assert store.gc() == []
+    os.unlink(tmp_path / "a" / "demo-1.0.tar.gz")
+    assert store.gc() == []
+    os.unlink(tmp_path / "b" / "demo-1.0.tar.gz")
+    assert store.gc(max_size=len(content)) == []
+    assert store.gc() == [sha256]
+    assert not store.contains(sha256)
@@ -0,0 +1,27 @@
+from pipdownload.tags import WheelTagMatcher
+
+
+def test_wheel_tag_matcher_python_versions():
+    matcher = WheelTagMatcher(["cp37", "py3"])
+    assert matcher.matches("ujson-5.0.0-cp37-cp37m-win_amd64.whl")
+    assert matcher.matches("beautifulsoup4-4.8.2-py3-none-any.whl")
+    assert not matcher.matches("beautifulsoup4-4.8.2-py2-none-any.whl")
+    assert not WheelTagMatcher(["cp3"]).matches("ujson-5.0.0-cp37-cp37m-win_amd64.whl")
+    assert WheelTagMatcher(["cp37"]).matches("colorama-0.4.6-py2.py3-none-any.whl", any_python=True)
+    assert not WheelTagMatcher(["cp37"]).matches("colorama-0.4.6-py2.py3-none-any.whl")
+
+
+def test_wheel_tag_matcher_platform_tags():
+    matcher = WheelTagMatcher(platform_tags=["manylinux"])
+    assert matcher.matches("ujson-5.0.0-cp37-cp37m-manylinux2014_x86_64.whl")
+    assert matcher.matches("ujson-5.0.0-cp37-cp37m-manylinux_2_17_aarch64.whl")
+    assert matcher.matches("six-1.16.0-py2.py3-none-any.whl")
+    assert not matcher.matches("ujson-5.0.0-cp37-cp37m-win_amd64.whl")
+    assert not matcher.matches("ujson-5.0.0-cp37-cp37m-linux_x86_64.whl")
+
+    matcher = WheelTagMatcher(["cp37"], ["manylinux2014_x86_64"])
+    assert matcher.matches("ujson-5.0.0-cp37-cp37m-manylinux_2_17_x86_64.whl")
+    assert not matcher.matches("ujson-5.0.0-cp38-cp38-manylinux2014_x86_64.whl")
+    assert not matcher.matches("ujson-5.0.0-cp37-cp37m-manylinux2014_aarch64.whl")
+    assert not matcher.matches("protobuf-3.9.2-py2.7.egg")
+    assert WheelTagMatcher().matches("protobuf-3.9.2-py2.7.egg")
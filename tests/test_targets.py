@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+from packaging.tags import Tag
+from pipdownload.targets import Target
+from pipdownload.targets import resolve_target
+from pipdownload.targets import resolve_targets
+from pipdownload.targets import resolve_targets_with_pip
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_target():
+    target = Target("cp311-manylinux2014_x86_64")
+    assert target.python_version == (3, 11)
+    assert target.interpreter == "cp311"
+    platforms = target.platforms()
+    assert platforms[0] == "manylinux_2_17_x86_64"
+    assert "manylinux2014_x86_64" in platforms
+    assert "manylinux1_x86_64" in platforms
+    assert platforms[-1] == "linux_x86_64"
+    assert Tag("cp311", "abi3", "manylinux_2_5_x86_64") in target.tags()
+    assert Tag("py3", "none", "any") in target.tags()
+    assert target.environment()["sys_platform"] == "linux"
+    assert target.environment()["platform_machine"] == "x86_64"
+
+    assert Target("3.10-win_amd64").environment()["sys_platform"] == "win32"
+    assert Target("py38-macosx_11_0_arm64").environment()["platform_machine"] == "arm64"
+    assert "macosx_10_9_universal2" in Target("cp310-macosx_11_0_arm64").platforms()
+    with pytest.raises(ValueError):
+        Target("manylinux2014_x86_64")
+
+
+def test_target_matches():
+    target = Target("cp311-win_amd64")
+    assert target.matches("demo-1.0-cp311-cp311-win_amd64.whl")
+    assert target.matches("demo-1.0-py3-none-any.whl")
+    assert target.matches("demo-1.0-cp37-abi3-win_amd64.whl")
+    assert not target.matches("demo-1.0-cp310-cp310-win_amd64.whl")
+    assert not target.matches("demo-1.0-cp311-cp311-manylinux2014_x86_64.whl")
+    assert not target.matches("demo-1.0.tar.gz")
+
+
+def test_target_pip_options():
+    options = Target("cp39-manylinux_2_28_aarch64").pip_options()
+    assert options[:5] == ["--python-version", "3.9", "--implementation", "cp", "--only-binary=:all:"]
+    assert "manylinux2014_aarch64" in options
+
+
+def test_resolve_targets(file_server):
+    directory, base_url = file_server
+    write_project(
+        directory,
+        "demo",
+        [
+            {
+                "filename": "demo-1.0-py3-none-any.whl",
+                "content": b"demo",
+                "metadata": metadata("demo", "1.0", "winonly; sys_platform == 'win32'", "native"),
+            }
+        ],
+    )
+    write_project(
+        directory,
+        "winonly",
+        [{"filename": "winonly-2.0-py3-none-any.whl", "content": b"win", "metadata": metadata("winonly", "2.0")}],
+    )
+    write_project(
+        directory,
+        "native",
+        [
+            {"filename": "native-1.0-cp310-cp310-win_amd64.whl", "content": b"1",
+             "metadata": metadata("native", "1.0")},
+            {"filename": "native-1.1-cp311-cp311-manylinux2014_x86_64.whl", "content": b"2",
+             "metadata": metadata("native", "1.1")},
+        ],
+    )
+    index_url = base_url + "/simple"
+    assert sorted(resolve_target("cp311-manylinux2014_x86_64", ["demo"], index_url)) == [
+        "demo-1.0-py3-none-any.whl",
+        "native-1.1-cp311-cp311-manylinux2014_x86_64.whl",
+    ]
+
+    targets = [Target("cp310-win_amd64"), Target("cp311-manylinux2014_x86_64"), Target("cp311-win_amd64")]
+    results = resolve_targets(targets, ["demo"], index_url, jobs=2)
+    assert sorted(results[0]) == [
+        "demo-1.0-py3-none-any.whl",
+        "native-1.0-cp310-cp310-win_amd64.whl",
+        "winonly-2.0-py3-none-any.whl",
+    ]
+    assert len(results[1]) == 2
+    # No version of native has a wheel for CPython 3.11 on Windows.
+    assert results[2] is None
+
+
+def test_resolve_targets_with_pip(monkeypatch):
+    targets = [Target("cp310-win_amd64"), Target("cp311-manylinux2014_x86_64"), Target("cp311-win_amd64")]
+    barrier = threading.Barrier(len(targets), timeout=5)
+
+    def resolve_packages(index_url, packages, quiet, options=None):
+        # Every pip invocation waits for the others, so this only passes when they run at the same time.
+        barrier.wait()
+        return options[:2] if "3.10" not in options else None
+
+    monkeypatch.setattr("pipdownload.targets.resolve_packages", resolve_packages)
+    results = resolve_targets_with_pip(targets, ["demo"], "https://index/simple", True)
+    assert results == [None, ["--python-version", "3.11"], ["--python-version", "3.11"]]
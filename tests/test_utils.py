@@ -1,7 +1,54 @@
+import hashlib
+import io
+import json
+import zipfile
 from pathlib import Path
+from types import SimpleNamespace
 
+from click.testing import CliRunner
+from pipdownload import utils
+from pipdownload.cli import pipdownload
+from pipdownload.manifest import write_manifest
+from pipdownload.session import make_session
+from pipdownload.utils import PACKAGE_CACHE_SIZE
+from pipdownload.utils import DownloadProgress
+from pipdownload.utils import FileProgress
 from pipdownload.utils import PythonPackage
+from pipdownload.utils import download
+from pipdownload.utils import download_all
 from pipdownload.utils import get_file_links
+from pipdownload.utils import iter_response_chunks
+from pipdownload.utils import requirement_satisfied
+from pipdownload.utils import resolve_package_file
+from pipdownload.utils import resolve_package_files
+from pipdownload.utils import resolve_packages
+
+from tests.server import metadata
+from tests.server import write_project
+
+
+def test_resolve_package_file():
+    assert resolve_package_file("Click-7.0-py2.py3-none-any.whl") == PythonPackage("click", "7.0")
+    assert resolve_package_file("python-dateutil-2.8.2.tar.gz") == PythonPackage("python-dateutil", "2.8.2")
+    assert resolve_package_file("foo-bar-1.0rc1.tar.bz2") == PythonPackage("foo-bar", "1.0rc1")
+    assert resolve_package_file("demo-1.0.zip") == PythonPackage("demo", "1.0")
+    # A build tag is not a part of the version.
+    assert resolve_package_file("demo-1.0-1-py3-none-any.whl") == PythonPackage("demo", "1.0")
+    assert resolve_package_file("numpy-1.26.0-cp311-cp311-win_amd64.whl") == PythonPackage("numpy", "1.26.0")
+    for name in ("demo-1.0.exe", "demo.tar.gz", "demo-not-a-version-py3-none-any.whl", "demo-1.0-any.whl"):
+        assert resolve_package_file(name) == PythonPackage(None, None)
+    # The cache is bounded, as it lives as long as a daemon.
+    assert resolve_package_file.cache_info().maxsize == PACKAGE_CACHE_SIZE
+
+
+def test_requirement_satisfied():
+    resolved = list(resolve_package_files(["six-1.16.0-py2.py3-none-any.whl", "Click-7.0.tar.gz"]))
+    assert len(set(resolved + [PythonPackage("click", "7.0")])) == 2
+    assert requirement_satisfied("Six>=1.10", resolved)
+    assert requirement_satisfied("click", resolved)
+    assert not requirement_satisfied("six<1.16", resolved)
+    assert not requirement_satisfied("click[dotenv]", resolved)
+    assert not requirement_satisfied("requests", resolved)
 
 
 def test_get_file_links(shared_datadir: Path):
@@ -15,3 +62,230 @@ def test_get_file_links(shared_datadir: Path):
     python_package_local = PythonPackage("click", "6.7")
     res = get_file_links(html_doc, base_url, python_package_local)
     assert len(res) == 2
+
+
+def test_download_all(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    urls = []
+    for i in range(10):
+        content = str(i).encode() * 4096
+        file_name = "demo%d-1.0.tar.gz" % i
+        (directory / file_name).write_bytes(content)
+        urls.append("%s/%s#sha256=%s" % (base_url, file_name, hashlib.sha256(content).hexdigest()))
+    download_all(urls, str(tmp_path), jobs=4, per_host=2, quiet=True)
+    files = sorted(path.name for path in tmp_path.iterdir())
+    assert files == sorted("demo%d-1.0.tar.gz" % i for i in range(10))
+
+
+def make_wheel(name: str, version: str, *requires_dist: str) -> bytes:
+    """Return a wheel of a distribution without any module, which pip can read the metadata of."""
+    dist_info = "%s-%s.dist-info" % (name.replace("-", "_"), version)
+    files = {
+        dist_info + "/METADATA": metadata(name, version, *requires_dist),
+        dist_info + "/WHEEL": "Wheel-Version: 1.0\nGenerator: tests\nRoot-Is-Purelib: true\nTag: py3-none-any\n",
+    }
+    files[dist_info + "/RECORD"] = "".join("%s,,\n" % path for path in list(files) + [dist_info + "/RECORD"])
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as wheel:
+        for path, content in files.items():
+            wheel.writestr(path, content)
+    return buffer.getvalue()
+
+
+def test_resolve_packages(file_server):
+    directory, base_url = file_server
+    write_project(directory, "demo", [
+        {"filename": "demo-1.0-py3-none-any.whl", "content": make_wheel("demo", "1.0")},
+        {"filename": "demo-2.0-py3-none-any.whl", "content": make_wheel("demo", "2.0", "dep>=1.0")},
+    ])
+    write_project(directory, "dep", [
+        {"filename": "dep-1.0-py3-none-any.whl", "content": make_wheel("dep", "1.0")},
+    ])
+    file_names = resolve_packages(base_url + "/simple", ["demo"], True)
+    assert sorted(file_names) == ["demo-2.0-py3-none-any.whl", "dep-1.0-py3-none-any.whl"]
+    names = {python_package.name for python_package in resolve_package_files(file_names)}
+    assert names == {"demo", "dep"}
+    assert resolve_packages(base_url + "/simple", ["missing"], True) is None
+
+
+def test_download_hash_mismatch(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    (directory / "demo-1.0.tar.gz").write_bytes(b"tampered")
+    url = "%s/demo-1.0.tar.gz#sha256=%s" % (base_url, hashlib.sha256(b"original").hexdigest())
+    assert download(url, str(tmp_path), quiet=True) is False
+    assert list(tmp_path.iterdir()) == []
+    (directory / "demo-2.0.tar.gz").write_bytes(b"original")
+    good_url = "%s/demo-2.0.tar.gz#sha256=%s" % (base_url, hashlib.sha256(b"original").hexdigest())
+    assert download_all([url, good_url], str(tmp_path), jobs=2, quiet=True) == [url]
+    assert [path.name for path in tmp_path.iterdir()] == ["demo-2.0.tar.gz"]
+
+    # The command line reports the file and fails.
+    manifest = tmp_path / "manifest.json"
+    write_manifest(str(manifest), [{"url": url}, {"url": good_url}])
+    dest_dir = tmp_path / "dest"
+    result = CliRunner().invoke(pipdownload, ["-d", str(dest_dir), "--from-manifest", str(manifest)])
+    assert result.exit_code != 0
+    assert [path.name for path in dest_dir.iterdir()] == ["demo-2.0.tar.gz"]
+
+
+def test_download_resume(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    content = bytes(range(256)) * 64
+    (directory / "demo-1.0.tar.gz").write_bytes(content)
+    file_url = "%s/demo-1.0.tar.gz" % base_url
+    file_hash = "sha256=%s" % hashlib.sha256(content).hexdigest()
+    # An interrupted download with a half of the file saved.
+    (tmp_path / "demo-1.0.tar.gz.part").write_bytes(content[:8000])
+    with (tmp_path / "demo-1.0.tar.gz.part.json").open("w") as f:
+        json.dump({"url": file_url, "hash": file_hash}, f)
+    download(file_url + "#" + file_hash, str(tmp_path), quiet=True)
+    assert [path.name for path in tmp_path.iterdir()] == ["demo-1.0.tar.gz"]
+    assert (tmp_path / "demo-1.0.tar.gz").read_bytes() == content
+
+
+def test_download_resume_corrupted(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    content = bytes(range(256)) * 64
+    (directory / "demo-1.0.tar.gz").write_bytes(content)
+    file_url = "%s/demo-1.0.tar.gz" % base_url
+    file_hash = "sha256=%s" % hashlib.sha256(content).hexdigest()
+    # An interrupted download whose saved bytes have been corrupted.
+    (tmp_path / "demo-1.0.tar.gz.part").write_bytes(b"\0" * 8000)
+    with (tmp_path / "demo-1.0.tar.gz.part.json").open("w") as f:
+        json.dump({"url": file_url, "hash": file_hash}, f)
+    session = make_session(pool_size=1, retries=0)
+    ranges = []
+    session.hooks["response"].append(lambda response, *args, **kwargs: ranges.append(response.request.headers.get("Range")))
+    assert download(file_url + "#" + file_hash, str(tmp_path), quiet=True, session=session)
+    assert ranges == ["bytes=8000-", None]
+    assert [path.name for path in tmp_path.iterdir()] == ["demo-1.0.tar.gz"]
+    assert (tmp_path / "demo-1.0.tar.gz").read_bytes() == content
+
+
+def test_download_all_with_session(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    urls = []
+    for i in range(4):
+        content = str(i).encode() * 1024
+        (directory / ("demo%d-1.0.tar.gz" % i)).write_bytes(content)
+        urls.append("%s/demo%d-1.0.tar.gz#sha256=%s" % (base_url, i, hashlib.sha256(content).hexdigest()))
+    session = make_session(pool_size=2, timeout=5, retries=0)
+    responses = []
+    session.hooks["response"].append(lambda response, *args, **kwargs: responses.append(response.url))
+    download_all(urls, str(tmp_path), jobs=2, quiet=True, session=session)
+    assert sorted(responses) == sorted(url.split("#")[0] for url in urls)
+    assert len(list(tmp_path.iterdir())) == 4
+
+
+def test_download_all_retries_and_timeout(file_server, tmp_path: Path, monkeypatch):
+    directory, base_url = file_server
+    (directory / "demo-1.0.tar.gz").write_bytes(b"demo")
+    url = "%s/demo-1.0.tar.gz#sha256=%s" % (base_url, hashlib.sha256(b"demo").hexdigest())
+    sessions = []
+
+    def recording_make_session(**kwargs):
+        sessions.append(kwargs)
+        return make_session(**kwargs)
+
+    monkeypatch.setattr(utils, "make_session", recording_make_session)
+    download_all([url], str(tmp_path), jobs=2, quiet=True, retries=1, timeout=5)
+    assert sessions == [{"pool_size": 2, "timeout": 5, "retries": 1}]
+    assert (tmp_path / "demo-1.0.tar.gz").read_bytes() == b"demo"
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeRaw:
+    """The raw stream of a response, whose reads take delay seconds of the clock and are recorded."""
+
+    def __init__(self, content: bytes, clock: FakeClock, delay: float = 0.0) -> None:
+        self.stream = io.BytesIO(content)
+        self.clock = clock
+        self.delay = delay
+        self.sizes = []
+
+    def read(self, size, decode_content=False):
+        self.sizes.append(size)
+        self.clock.now += self.delay
+        return self.stream.read(size)
+
+
+def test_iter_response_chunks(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", clock)
+    kib = 1024
+    content = bytes(16 * 1024 * kib)
+    # Fast chunks double the chunk size from 64 KiB up to 1 MiB.
+    raw = FakeRaw(content, clock)
+    assert b"".join(iter_response_chunks(SimpleNamespace(raw=raw))) == content
+    assert raw.sizes[:6] == [64 * kib, 128 * kib, 256 * kib, 512 * kib, 1024 * kib, 1024 * kib]
+    assert max(raw.sizes) == 1024 * kib
+    # Slow chunks halve it, but not below 64 KiB.
+    raw = FakeRaw(content, clock)
+    chunks = iter_response_chunks(SimpleNamespace(raw=raw))
+    for _ in range(6):
+        next(chunks)
+    raw.delay = 1.0
+    for _ in range(6):
+        next(chunks)
+    assert raw.sizes[6:] == [1024 * kib, 512 * kib, 256 * kib, 128 * kib, 64 * kib, 64 * kib]
+
+
+def test_progress_throttled(monkeypatch, capsys):
+    clock = FakeClock()
+    monkeypatch.setattr(utils.time, "monotonic", clock)
+    for progress in (DownloadProgress(2), FileProgress()):
+        progress.add_total(1000)
+        for _ in range(100):
+            progress.update(1)
+        clock.now += progress.render_interval / 2
+        progress.update(1)
+        assert capsys.readouterr().out.count("\r") == 1
+        clock.now += progress.render_interval
+        progress.update(1)
+        progress.update(1)
+        assert capsys.readouterr().out.count("\r") == 1
+        progress.close()
+        assert capsys.readouterr().out.count("\r") == 1
+        clock.now += progress.render_interval
+
+    progress = DownloadProgress(1, quiet=True)
+    progress.update(1)
+    progress.close()
+    assert capsys.readouterr().out == ""
+
+
+def test_download_resume_rejected(file_server, tmp_path: Path):
+    directory, base_url = file_server
+    content = bytes(range(256)) * 64
+    (directory / "demo-1.0.tar.gz").write_bytes(content)
+    file_url = "%s/demo-1.0.tar.gz" % base_url
+    file_hash = "sha256=%s" % hashlib.sha256(content).hexdigest()
+    responses = []
+
+    def shifted_range(response, *args, **kwargs):
+        # A server which answers a Range request with another range than the one requested.
+        if response.status_code == 206:
+            response.headers["Content-Range"] = "bytes 0-%d/%d" % (len(content) - 1, len(content))
+        responses.append(response)
+
+    session = make_session(pool_size=1, retries=0)
+    session.hooks["response"].append(shifted_range)
+    for saved in (content[:8000], content + b"beyond the end"):
+        # A `.part` file resumed with a range starting elsewhere, then one the server can not resume (416).
+        (tmp_path / "demo-1.0.tar.gz.part").write_bytes(saved)
+        with (tmp_path / "demo-1.0.tar.gz.part.json").open("w") as f:
+            json.dump({"url": file_url, "hash": file_hash}, f)
+        responses.clear()
+        download(file_url + "#" + file_hash, str(tmp_path), quiet=True, session=session)
+        assert [path.name for path in tmp_path.iterdir()] == ["demo-1.0.tar.gz"]
+        assert (tmp_path / "demo-1.0.tar.gz").read_bytes() == content
+        assert [response.status_code for response in responses] == [206 if len(saved) < len(content) else 416, 200]
+        assert responses[0].raw.closed
+        (tmp_path / "demo-1.0.tar.gz").unlink()
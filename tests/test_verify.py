@@ -0,0 +1,50 @@
+import hashlib
+from pathlib import Path
+
+from click.testing import CliRunner
+from pipdownload.cli import verify
+from pipdownload.mirror import MirrorIndex
+from pipdownload.verify import VERIFY_CHUNK_SIZE
+from pipdownload.verify import hash_file
+from pipdownload.verify import verify_files
+
+
+def test_hash_file(tmp_path: Path):
+    for size in (0, 10, VERIFY_CHUNK_SIZE + 10):
+        path = tmp_path / ("file%d" % size)
+        content = b"x" * size
+        path.write_bytes(content)
+        assert hash_file(str(path)) == (str(path), hashlib.sha256(content).hexdigest(), size)
+    assert hash_file(str(tmp_path / "missing"))[1] is None
+
+
+def test_verify_files(tmp_path: Path):
+    expected = {}
+    for i in range(4):
+        path = tmp_path / ("demo%d-1.0.tar.gz" % i)
+        path.write_bytes(str(i).encode() * 1024)
+        expected[str(path)] = hashlib.sha256(path.read_bytes()).hexdigest()
+    (tmp_path / "demo0-1.0.tar.gz").write_bytes(b"tampered")
+    expected[str(tmp_path / "missing-1.0.tar.gz")] = "0" * 64
+    report = verify_files(expected, jobs=2)
+    assert sorted(report.verified) == [str(tmp_path / ("demo%d-1.0.tar.gz" % i)) for i in range(1, 4)]
+    assert report.mismatches == [str(tmp_path / "demo0-1.0.tar.gz")]
+    assert report.missing == [str(tmp_path / "missing-1.0.tar.gz")]
+    assert report.total_bytes == 3 * 1024 + len(b"tampered")
+
+
+def test_verify_command(tmp_path: Path):
+    mirror_index = MirrorIndex(str(tmp_path))
+    for i in range(2):
+        path = tmp_path / ("demo%d-1.0.tar.gz" % i)
+        path.write_bytes(str(i).encode() * 1024)
+        mirror_index.record(str(path), hashlib.sha256(path.read_bytes()).hexdigest())
+    mirror_index.save()
+    (tmp_path / "other-1.0.tar.gz").write_bytes(b"other")
+    runner = CliRunner()
+    result = runner.invoke(verify, [str(tmp_path), "-j", "2"])
+    assert result.exit_code == 0, result.output
+
+    (tmp_path / "demo1-1.0.tar.gz").write_bytes(b"tampered")
+    result = runner.invoke(verify, [str(tmp_path)])
+    assert result.exit_code != 0